@@ -122,7 +122,11 @@ ELASTICSEARCH_DSL = {
         "hosts": "http://elastic:9200",
         "timeout": 60,  # 60 second timeout
         "retry_on_timeout": True,
-        "max_retries": 2
+        "max_retries": 2,
+        # Kept-alive connections per node shared by all threads of a process (webui/clients.py)
+        "connections_per_node": int(os.getenv("ES_CONNECTIONS_PER_NODE", "16")),
+        # gzip request bodies; mostly shrinks bulk requests
+        "http_compress": os.getenv("ES_HTTP_COMPRESS", "false").lower() == "true",
     },
     "analysis": {
         "analyzer": {
@@ -148,6 +152,166 @@ ELASTICSEARCH_SEARCH_PARAMS = {
     "preference": "_local"  # Prefer local shards to reduce network latency
 }
 
+# Mapping layout of the credential `string` field for newly created indices (see
+# webui/documents.py INDEX_LAYOUTS): 'ngram' (text + 3-15 ngram subfield) or
+# 'wildcard' (wildcard-type field + keyword subfield). Must match the live index.
+ELASTICSEARCH_INDEX_LAYOUT = os.getenv("ES_INDEX_LAYOUT", "ngram")
+
+# Storage profile of newly created credential indices (see webui/documents.py
+# STORAGE_PROFILES): 'default', 'compact' (best_compression codec, sorted by the
+# lowercased credential, trimmed norms) or 'compact-domain' (sorted by domain first).
+ELASTICSEARCH_STORAGE_PROFILE = os.getenv("ES_STORAGE_PROFILE", "default")
+
+# Shard layout of newly created credential indices (see webui/sharding.py). 'hash'
+# spreads documents by ID; 'domain' routes them by email domain so domain-scoped
+# searches hit only the owning shard(s). Routing must match the live index.
+ELASTICSEARCH_SHARDING = {
+    "number_of_shards": int(os.getenv("ES_SHARDS", "1")),
+    "routing": os.getenv("ES_ROUTING", "hash"),
+    "routing_partition_size": int(os.getenv("ES_ROUTING_PARTITION_SIZE", "1")),
+}
+
+# Post-ingest maintenance (see webui/maintenance.py): after a bulk load, cold indices with
+# more segments per shard than max_segments_per_shard (or a deleted-docs ratio above
+# max_deleted_ratio) are force-merged one at a time, then caches are warmed.
+ELASTICSEARCH_MAINTENANCE = {
+    "enabled": os.getenv("ES_POST_INGEST_MAINTENANCE", "true").lower() == "true",
+    "max_segments_per_shard": 10,
+    "max_deleted_ratio": 0.1,
+    "max_num_segments": 1,
+    "pause_seconds": 30,
+    "warm_terms": ["admin", "gmail.com", "password"],
+    "probe_repeat": 5,
+}
+
+# Filesystem snapshots of the credential index (see webui/snapshots.py). The location
+# must be listed in the Elasticsearch node's path.repo (see docker-compose.yml).
+ELASTICSEARCH_SNAPSHOTS = {
+    "repository": "credentials_backup",
+    "location": os.getenv("ES_SNAPSHOT_LOCATION", "/usr/share/elasticsearch/snapshots"),
+    "keep": int(os.getenv("ES_SNAPSHOT_KEEP", "7")),
+    "after_ingest": os.getenv("ES_SNAPSHOT_AFTER_INGEST", "false").lower() == "true",
+    "interval_hours": 24,
+}
+
+# Extract the parsed credential fields in an Elasticsearch ingest pipeline instead of in
+# Python (see webui/pipelines.py); writers then only ship the raw lines.
+ELASTICSEARCH_INGEST_PIPELINE = {
+    "enabled": os.getenv("ES_INGEST_PIPELINE", "false").lower() == "true",
+}
+
+# Reader stage of index_breached_credential (see webui/ingest.py): processes parsing
+# byte batches of a MinIO object in parallel, and batches in flight per process
+INGEST_READERS = {
+    "processes": int(os.getenv("INGEST_READER_PROCESSES", "4")),
+    "batch_bytes": 1024 * 1024,
+    "in_flight": 2,
+}
+
+# Shared cache (ingest leases, counts, the search result generation, see webui/search_cache.py).
+# Create the table once with `python manage.py createcachetable`.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "django_cache",
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 20000},
+    }
+}
+
+# Search API pagination (see webui/pagination.py): numbered pages reach shallow_limit
+# hits, deeper pages follow next_cursor (point-in-time + search_after)
+SEARCH_PAGINATION = {
+    "shallow_limit": 1000,
+    "max_per_page": 500,
+    "keep_alive": "2m",
+}
+
+# Async search jobs for slow queries (see webui/async_search.py): how long results are
+# kept, how long a submit waits before returning a job id, and the per-search timeout
+ASYNC_SEARCH = {
+    "keep_alive": os.getenv("ASYNC_SEARCH_KEEP_ALIVE", "1h"),
+    "wait_for_completion": "1s",
+    "search_timeout": "10m",
+}
+
+# Streaming exports (see webui/export.py): parallel PIT slices and hits per slice request
+SEARCH_EXPORT = {
+    "slices": int(os.getenv("SEARCH_EXPORT_SLICES", "4")),
+    "page_size": 5000,
+    "keep_alive": "5m",
+    "queue_pages": 8,
+}
+
+# Bulk lookups (see webui/bulk_lookup.py): values per terms query, queries per multi-search,
+# concurrent multi-searches and credentials returned per input
+BULK_LOOKUP = {
+    "batch_size": 500,
+    "batches_per_request": 8,
+    "concurrency": int(os.getenv("BULK_LOOKUP_CONCURRENCY", "4")),
+    "hits_per_input": 10,
+    "max_inputs": 100000,
+}
+
+# Counts without full table scans (see webui/counting.py): lifetime of cached exact
+# counts, their refresh schedule and the exact-total threshold of search hit counts
+COUNTING = {
+    "exact_ttl": 6 * 3600,
+    "refresh_minutes": int(os.getenv("COUNT_REFRESH_MINUTES", "60")),
+    "track_total_hits": int(os.getenv("SEARCH_TRACK_TOTAL_HITS", "10000")),
+}
+
+# Dashboard rollups (see webui/rollups.py): Elasticsearch cluster stats are cached this many seconds
+ROLLUPS = {
+    "es_stats_ttl": int(os.getenv("DASHBOARD_ES_STATS_TTL", "30")),
+}
+
+# Credential search result cache: TTL and size of the in-process LRU tier. Result pages
+# contain plaintext passwords; `shared_results` also stores them in the shared cache
+# (the database above), so only turn it on with a cache backend trusted with credentials.
+SEARCH_CACHE = {
+    "enabled": os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true",
+    "ttl": int(os.getenv("SEARCH_CACHE_TTL", "300")),
+    "lru_size": 256,
+    "lock_timeout": 30,
+    "shared_results": os.getenv("SEARCH_CACHE_SHARED", "false").lower() == "true",
+}
+
+# Watchlist percolation at ingest time (see webui/watchlist.py). `notifier` is a dotted
+# path to a callable receiving a list of matches; webui.watchlist.webhook_notifier POSTs
+# them to `webhook_url`.
+WATCHLIST = {
+    "enabled": os.getenv("WATCHLIST_ENABLED", "true").lower() == "true",
+    "index": "credential_watchlist",
+    "percolate_batch": 500,
+    "notifier": os.getenv("WATCHLIST_NOTIFIER", "webui.watchlist.log_notifier"),
+    "webhook_url": os.getenv("WATCHLIST_WEBHOOK_URL", ""),
+}
+
+# Per-file count reconciliation between Postgres, Elasticsearch and MinIO (see webui/reconcile.py)
+RECONCILIATION = {
+    "batch_size": int(os.getenv("RECONCILE_BATCH_SIZE", "500")),
+    "interval_minutes": 60,
+    "repair": os.getenv("RECONCILE_REPAIR", "true").lower() == "true",
+}
+
+# Rollover partitioning of the credential index (see webui/partitions.py).
+# 'period' partitions by ingest month, 'source' by top-level MinIO prefix.
+# Searches always go through the 'breached_credentials' read alias.
+ELASTICSEARCH_PARTITIONING = {
+    "enabled": os.getenv("ES_PARTITIONING", "false").lower() == "true",
+    "strategy": os.getenv("ES_PARTITION_STRATEGY", "period"),
+    "period_format": "%Y.%m",
+    "rollover": {"max_docs": 20_000_000, "max_primary_shard_size": "20gb"},
+    "max_num_segments": 1,
+    # Partitions written to within this many seconds are never sealed
+    "ingest_lease": 900,
+}
+# django-elasticsearch-dsl would index saved credentials into the read alias, which spans
+# every partition and has no write index; the ingest task, repairs and the rebuild command
+# write to each file's partition themselves
+ELASTICSEARCH_DSL_AUTOSYNC = not ELASTICSEARCH_PARTITIONING["enabled"]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -187,6 +351,14 @@ AWS_ACCESS_KEY_ID = f"{os.getenv('MINIO_ACCESS_KEY')}"
 AWS_SECRET_ACCESS_KEY = f"{os.getenv('MINIO_SECRET_KEY')}"
 AWS_STORAGE_BUCKET_NAME = "breached-credentials"
 
+# Pool of the shared MinIO client (webui/clients.py)
+MINIO_CLIENT = {
+    "pool_maxsize": int(os.getenv("MINIO_POOL_SIZE", "32")),
+    "connect_timeout": 10,
+    "read_timeout": 300,
+    "retries": 5,
+}
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
@@ -209,6 +381,8 @@ Q_CLUSTER = {
     'retry': 600,    # 10 minut – większe niż timeout
     'queue_limit': 5000,
     'orm': 'default',
+    # Non-daemonic workers may start the reader process pool of index_breached_credential
+    'daemonize_workers': False,
 }
 
 
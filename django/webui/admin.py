@@ -1,15 +1,13 @@
 from django.contrib import admin
 from django.contrib.sessions.models import Session
-from django_elasticsearch_dsl import Document
-from webui.models import BreachedCredential, ScrapFile
+from django.contrib.admin.views.main import ChangeList
+from django.utils.dateparse import parse_date, parse_datetime
+from webui.models import BreachedCredential, ScrapFile, Watch, WatchMatch
 from django_q.models import Task
-from webui.documents import BreachedCredentialDocument
-from elasticsearch_dsl import Q
-from django.db.models import Case, When
-from django.core.paginator import Paginator
-from django.utils import timezone
-from datetime import datetime, timedelta
+from webui import clients, counting, file_cache, pagination
+from webui.queries import build_search
 import logging
+import time
 
 # Configure logging to ensure debug output
 logger = logging.getLogger('webui')
@@ -26,135 +24,136 @@ if not logger.handlers:
 # Register default Django admin models
 admin.site.register(Session)
 
+# Opaque cursor of the next changelist page (see webui/pagination.py)
+CURSOR_VAR = 'cursor'
+
 @admin.register(ScrapFile)
 class ScrapFileAdmin(admin.ModelAdmin):
     list_display = ('name', 'count', 'added_at', 'size', 'sha256')
     search_fields = ('name', 'sha256')
     list_filter = ('added_at', 'count', 'size')
 
+@admin.register(Watch)
+class WatchAdmin(admin.ModelAdmin):
+    list_display = ('name', 'kind', 'value', 'is_active', 'created_at')
+    search_fields = ('name', 'value')
+    list_filter = ('kind', 'is_active')
+
+@admin.register(WatchMatch)
+class WatchMatchAdmin(admin.ModelAdmin):
+    list_display = ('watch', 'string', 'file', 'matched_at', 'notified_at')
+    search_fields = ('string', 'watch__name', 'watch__value')
+    list_filter = ('watch__kind', 'matched_at', 'notified_at')
+    list_select_related = ('watch', 'file')
+    raw_id_fields = ('file',)
+
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'func', 'started', 'stopped', 'success')
     list_filter = ('success', 'started')
     search_fields = ('name', 'func')
 
+class ElasticsearchChangeList(ChangeList):
+    """
+    Credential changelist paged directly over Elasticsearch hits.
+
+    Rows are built from each hit's `_source` as unsaved BreachedCredential instances, so
+    listing and searching never query Postgres; only the change form loads its object.
+    The first pages use from/size and deeper ones a PIT with search_after (see
+    webui/pagination.py), reached through the "next page" cursor link.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        super().__init__(request, *args, **kwargs)
+        # Filter links and the search form start over from the first page
+        self.params.pop(CURSOR_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_search(self):
+        # Without a search term every credential is listed (newest first, see get_results)
+        search, indices, params = build_search(self.query)
+        # Date filter of the sidebar (DateFieldListFilter)
+        bounds = {}
+        for param, bound in (('added_at__gte', 'gte'), ('added_at__lt', 'lt')):
+            value = self.params.get(param)
+            if value:
+                bounds[bound] = parse_datetime(value) or parse_date(value)
+        if bounds:
+            search = search.filter('range', added_at=bounds)
+        return counting.limit_total_hits(search), indices, params
+
+    def get_results(self, request):
+        search, indices, params = self.get_search()
+        sort_order = 'relevance' if self.query else 'date'
+        if sort_order == 'date':
+            search = search.sort('-added_at')
+        es_client = clients.elasticsearch()
+        query_id = pagination.fingerprint(search, indices, sort_order)
+        try:
+            state = pagination.decode_cursor(self.cursor, query_id) if self.cursor else {'offset': 0}
+        except pagination.CursorError:
+            state = {'offset': 0}
+        page_search, page_params, state = pagination.apply(
+            es_client, search, state, self.list_per_page, sort_order, indices, params,
+        )
+        start_time = time.time()
+        response = page_search.params(**page_params).execute()
+        logger.debug(f"Admin changelist page: {len(response.hits)} hits in {time.time() - start_time:.3f} seconds")
+
+        total = response.hits.total
+        hits = list(response)
+        # Warm the file cache for the file_name column with one query
+        file_cache.get_many(getattr(hit, 'file_id', None) for hit in hits)
+        next_state = pagination.next_state(
+            es_client, state, self.list_per_page, len(hits), total.value,
+            list(getattr(hits[-1].meta, 'sort', [])) if hits else None, response.to_dict().get('pit_id'),
+        )
+        self.result_list = [
+            BreachedCredential(
+                id=hit.meta.id,
+                string=hit.string,
+                added_at=getattr(hit, 'added_at', None),
+                file_id=getattr(hit, 'file_id', None),
+            )
+            for hit in hits
+        ]
+        self.result_count = total.value
+        self.result_count_is_lower_bound = total.relation == 'gte'
+        self.next_page_url = (
+            self.get_query_string({CURSOR_VAR: pagination.encode_cursor(next_state, query_id)})
+            if next_state else None
+        )
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = None
+
+
 @admin.register(BreachedCredential)
 class BreachedCredentialAdmin(admin.ModelAdmin):
     list_display = ('string', 'added_at', 'file_name')
     search_fields = ['string']
     list_filter = ('added_at',)
     list_per_page = 50
+    # Hits are ordered by Elasticsearch (relevance, or newest first without a search term)
+    sortable_by = ()
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return ElasticsearchChangeList
 
     def get_search_results(self, request, queryset, search_term):
-        if not search_term:
-            return queryset, False
-
-        print(f"\n[*] DEBUG: Search term: {search_term}")
-        print(f"[*] DEBUG: Initial queryset count: {queryset.count()}")
-
-        # Use Elasticsearch for searching
-        search = BreachedCredentialDocument.search()
-        print(f"[*] DEBUG: Using index: {search._index}")
-        
-        # Use query_string with wildcards
-        query = Q(
-            'query_string',
-            query=f"*{search_term}*",
-            fields=['string', 'string.ngram'],
-            analyze_wildcard=True
-        )
-        search = search.query(query)
-        
-        # Set a larger size for the search results
-        search = search.extra(size=10000)  # Return up to 10k results
-        
-        # Print the actual query being sent to Elasticsearch
-        print(f"[*] DEBUG: Full Elasticsearch query: {search.to_dict()}")
-        
-        # Execute the search without any filters
-        response = search.execute()
-        print(f"[*] DEBUG: Raw Elasticsearch response total: {response.hits.total.value}")
-        print(f"[*] DEBUG: Raw Elasticsearch response hits: {len(response.hits)}")
-        
-        # Print first few hits to verify content and IDs
-        print("\n[*] DEBUG: First 5 hits:")
-        for hit in response.hits[:5]:
-            print(f"  - ID: {hit.meta.id} (type: {type(hit.meta.id)})")
-            print(f"  - String: {hit.string}")
-        
-        # Get the IDs from the search results
-        result_ids = [hit.meta.id for hit in response]
-        
-        # Get the queryset with the results in the same order as the search
-        if result_ids:
-            # Use string IDs directly
-            preserved = Case(*[When(pk=pk, then=pos) for pos, pk in enumerate(result_ids)])
-            queryset = queryset.filter(id__in=result_ids).order_by(preserved)
-            print(f"[*] DEBUG: Final queryset count: {queryset.count()}")
-        else:
-            queryset = queryset.none()
-        
+        # The search term is applied by ElasticsearchChangeList
         return queryset, False
 
-    def get_queryset(self, request):
-        logger.debug('[*] Get queryset was triggered')
-        
-        # If this is a search request, let get_search_results handle it
-        if request.GET.get('q'):
-            return super().get_queryset(request)
-            
-        # Otherwise, handle normal list view with pagination
-        page = int(request.GET.get('p', 1))
-        per_page = self.list_per_page
-        start = (page - 1) * per_page
-        end = start + per_page
-        
-        search = BreachedCredentialDocument.search()
-        
-        # Apply date filters if present
-        date_filter = request.GET.get('added_at__day', None)
-        if date_filter:
-            today = timezone.now().date()
-            start_date = today
-            if date_filter == 'today':
-                end_date = today + timedelta(days=1)
-            elif date_filter == 'past_7_days':
-                start_date = today - timedelta(days=7)
-                end_date = today + timedelta(days=1)
-            elif date_filter == 'this_month':
-                start_date = today.replace(day=1)
-                end_date = (start_date + timedelta(days=32)).replace(day=1)
-            elif date_filter == 'this_year':
-                start_date = today.replace(month=1, day=1)
-                end_date = today.replace(month=12, day=31)
-            search = search.filter('range', added_at={'gte': start_date, 'lte': end_date})
-        
-        # Apply pagination
-        search = search[start:end]
-        es_ids = [hit.meta.id for hit in search]
-        
-        logger.debug("ES IDs retrieved: %d - %s", len(es_ids), es_ids[:10])
-        if not es_ids:
-            return BreachedCredential.objects.none()
-            
-        queryset = BreachedCredential.objects.filter(id__in=es_ids).select_related('file')
-        logger.debug("PSQL found %d records for IDs: %s", queryset.count(), es_ids[:10])
-        return queryset
-
-    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
-        # If this is a search request, use the actual count from the queryset
-        if request.GET.get('q'):
-            total_count = queryset.count()
-        else:
-            # For normal list view, use Elasticsearch count
-            total_count = BreachedCredentialDocument.search().count()
-            
-        paginator = Paginator(queryset, per_page, orphans, allow_empty_first_page)
-        paginator.count = total_count
-        logger.debug("Paginator total_count: %d", total_count)
-        logger.debug("Queryset actual count: %d", queryset.count())
-        return paginator
-
     def file_name(self, obj):
-        return obj.file.name if obj.file else 'No file'
-    file_name.short_description = 'File Name'
\ No newline at end of file
+        file_meta = file_cache.get(obj.file_id)
+        return file_meta['file_name'] if file_meta else 'No file'
+    file_name.short_description = 'File Name'
@@ -0,0 +1,112 @@
+"""
+Background credential searches with the Elasticsearch async search API.
+
+Regexp and wildcard searches can run for several seconds. Submitting them as async
+searches returns a job id after a short wait instead of holding a Django worker for the
+whole query; clients then poll for partial results and progress, or cancel the job.
+Elasticsearch keeps finished results for `keep_alive`, so no job state is stored here.
+"""
+from django.conf import settings
+from webui import clients, file_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'keep_alive': '1h',
+    'wait_for_completion': '1s',
+    'search_timeout': '10m',
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'ASYNC_SEARCH', {})}
+
+
+def submit(search, indices: list[str], params: dict, size: int = 100) -> dict:
+    """Start an async search and return its first status (it may already be complete)."""
+    cfg = config()
+    response = clients.elasticsearch().async_search.submit(
+        index=','.join(indices),
+        # The search timeout goes in the body: next to `body=` a `timeout=` parameter is deprecated
+        body={**search.to_dict(), 'size': size, 'timeout': cfg['search_timeout']},
+        wait_for_completion_timeout=cfg['wait_for_completion'],
+        keep_alive=cfg['keep_alive'],
+        keep_on_completion=True,
+        **{name: value for name, value in params.items() if name in ('routing', 'preference')},
+    )
+    return job_status(response)
+
+
+def get(job_id: str, wait: str = '0s') -> dict:
+    """Current status and (partial) results of a job; raises NotFoundError once it expired."""
+    response = clients.elasticsearch().async_search.get(id=job_id, wait_for_completion_timeout=wait)
+    return job_status(response)
+
+
+def cancel(job_id: str) -> None:
+    """Cancel a running job or delete the stored results of a finished one."""
+    clients.elasticsearch().async_search.delete(id=job_id)
+    logger.info(f"Deleted async search {job_id}")
+
+
+def job_status(response) -> dict:
+    """
+    Turn an async search response into the JSON returned by the API.
+
+    `status` is `running`, `done`, `partial` (finished, but shards failed or timed out,
+    so results may be missing) or `failed` (the search errored; `error` has the reason).
+    """
+    body = response.body if hasattr(response, 'body') else response
+    result = body.get('response', {})
+    shards = result.get('_shards', {})
+    total_shards = shards.get('total') or 0
+    done_shards = shards.get('successful', 0) + shards.get('skipped', 0) + shards.get('failed', 0)
+    hits = result.get('hits', {}).get('hits', [])
+    error = body.get('error')
+    if body.get('is_running'):
+        status = 'running'
+    elif error:
+        status = 'failed'
+    elif body.get('is_partial') or shards.get('failed') or result.get('timed_out'):
+        status = 'partial'
+    else:
+        status = 'done'
+    job = {
+        'job_id': body.get('id'),
+        'status': status,
+        'is_partial': body.get('is_partial', False),
+        'progress': done_shards / total_shards if total_shards else 0.0,
+        'total': result.get('hits', {}).get('total', {}).get('value', 0),
+        'results': result_rows(hits),
+        'started_at': body.get('start_time_in_millis'),
+        'expires_at': body.get('expiration_time_in_millis'),
+    }
+    if error:
+        job['error'] = error.get('reason', error.get('type')) if isinstance(error, dict) else error
+    if shards.get('failures'):
+        job['shard_failures'] = [failure.get('reason', {}).get('reason') for failure in shards['failures']]
+    return job
+
+
+def result_rows(hits: list[dict]) -> list[dict]:
+    """Rows in the format of the search API, with file fields from the file cache."""
+    files = file_cache.get_many(hit['_source'].get('file_id') for hit in hits)
+    rows = []
+    for hit in hits:
+        source = hit['_source']
+        file_meta = files.get(source.get('file_id'), {})
+        rows.append({
+            'id': hit['_id'],
+            'string': source.get('string'),
+            'file_name': file_meta.get('file_name'),
+            'file_size': file_meta.get('file_size'),
+            'file_uploaded_at': file_meta.get('file_uploaded_at'),
+            'created_at': source.get('added_at'),
+            'email': source.get('email'),
+            'username': source.get('username'),
+            'domain': source.get('domain'),
+            'password': source.get('password'),
+            'url_host': source.get('url_host'),
+        })
+    return rows
@@ -0,0 +1,164 @@
+"""
+Shared helpers for the index benchmarks (mapping layouts, storage profiles, shard counts, ...).
+
+Benchmarks load a sample of real credentials from Postgres into throwaway indices named
+`bench-credentials-*` (deliberately outside the `breached_credentials-*` partition
+pattern), then measure index size, indexing rate and query latency percentiles.
+"""
+from elasticsearch.helpers import streaming_bulk
+from webui.indexing import credential_action
+from webui.models import BreachedCredential
+import math
+import random
+import time
+
+BENCH_PREFIX = 'bench-credentials'
+
+
+def bench_index_name(label: str) -> str:
+    return f'{BENCH_PREFIX}-{label}'.lower()
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def sample_credentials(size: int, seed: int | None = None) -> list[tuple]:
+    """
+    Return up to `size` (id, string, file_id, added_at) rows from Postgres.
+
+    Credential IDs are md5 digests, so a keyset scan from a random ID is an unbiased
+    sample that only reads `size` rows through the primary key index.
+    """
+    start = f'{random.Random(seed).getrandbits(128):032x}'
+    columns = ('id', 'string', 'file_id', 'added_at')
+    rows = list(
+        BreachedCredential.objects.filter(id__gte=start).order_by('id').values_list(*columns)[:size]
+    )
+    if len(rows) < size:
+        rows += list(
+            BreachedCredential.objects.filter(id__lt=start).order_by('id').values_list(*columns)[:size - len(rows)]
+        )
+    return rows
+
+
+def sample_actions(rows, index: str, routing: str | None = None, parse: bool | None = None):
+    """Turn sampled rows into bulk actions for a benchmark index."""
+    for cred_id, string, file_id, added_at in rows:
+        yield credential_action(cred_id, string, added_at, file_id, index=index, routing=routing, parse=parse)
+
+
+def create_index(es_client, index: str, body: dict) -> None:
+    """(Re)create a benchmark index tuned for a one-off bulk load."""
+    es_client.indices.delete(index=index, ignore_unavailable=True)
+    settings = dict(body.get('settings', {}))
+    settings.update({'number_of_replicas': 0, 'refresh_interval': '-1'})
+    es_client.indices.create(index=index, settings=settings, mappings=body.get('mappings', {}))
+
+
+def load(es_client, index: str, actions, chunk_size: int = 5000, merge: bool = True, **bulk_kwargs) -> dict:
+    """Bulk load actions and (unless `merge` is False) merge the index down, returning the indexing rate."""
+    start = time.perf_counter()
+    indexed = failed = 0
+    for ok, _ in streaming_bulk(es_client, actions, chunk_size=chunk_size, raise_on_error=False, **bulk_kwargs):
+        if ok:
+            indexed += 1
+        else:
+            failed += 1
+    es_client.indices.refresh(index=index)
+    elapsed = time.perf_counter() - start
+    if merge:
+        # Merge to a single segment so sizes and latencies are comparable between runs
+        es_client.indices.forcemerge(index=index, max_num_segments=1, wait_for_completion=True, request_timeout=3600)
+    return {
+        'indexed': indexed,
+        'failed': failed,
+        'seconds': elapsed,
+        'docs_per_second': indexed / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def index_size(es_client, index: str) -> int:
+    """Primary store size of an index in bytes."""
+    stats = es_client.indices.stats(index=index, metric='store')
+    return stats['_all']['primaries']['store']['size_in_bytes']
+
+
+def node_disk_reads(es_client) -> int:
+    """
+    Total read operations of the data paths across all nodes (Linux io_stats).
+
+    Reads served from the OS page cache never reach the device, so the delta of this
+    counter over a query run is a proxy for page-cache misses.
+    """
+    stats = es_client.nodes.stats(metric='fs')
+    return sum(
+        node.get('fs', {}).get('io_stats', {}).get('total', {}).get('read_operations', 0)
+        for node in stats['nodes'].values()
+    )
+
+
+def node_memory_bytes(es_client) -> int:
+    """Total physical memory of the data nodes, the upper bound of the page cache."""
+    stats = es_client.nodes.stats(metric='os')
+    return sum(node['os']['mem']['total_in_bytes'] for node in stats['nodes'].values())
+
+
+def query_cache_stats(es_client, index: str) -> dict:
+    """Query cache hits, misses and memory of an index."""
+    stats = es_client.indices.stats(index=index, metric='query_cache')['_all']['total']['query_cache']
+    lookups = stats['hit_count'] + stats['miss_count']
+    return {
+        'hit_count': stats['hit_count'],
+        'miss_count': stats['miss_count'],
+        'hit_rate': stats['hit_count'] / lookups if lookups else 0.0,
+        'memory_bytes': stats['memory_size_in_bytes'],
+    }
+
+
+def measure_queries(es_client, index: str, queries: dict, repeat: int = 20, **search_kwargs) -> dict:
+    """
+    Run every query `repeat` times with caches bypassed and return latency percentiles.
+
+    `queries` maps a label to a query dict. Both the server-side `took` and the
+    client-observed wall time are reported, in milliseconds.
+    """
+    results = {}
+    for label, query in queries.items():
+        took, wall, hits = [], [], 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = es_client.search(
+                index=index,
+                query=query,
+                size=10,
+                request_cache=False,
+                track_total_hits=True,
+                **search_kwargs,
+            )
+            wall.append((time.perf_counter() - start) * 1000)
+            took.append(response['took'])
+            hits = response['hits']['total']['value']
+        results[label] = {
+            'hits': hits,
+            'p50': percentile(took, 50),
+            'p99': percentile(took, 99),
+            'wall_p50': percentile(wall, 50),
+            'wall_p99': percentile(wall, 99),
+        }
+    return results
+
+
+def format_table(headers: list[str], rows: list[list]) -> str:
+    """Render rows as a fixed-width text table in the style of the search benchmarks."""
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) if rows else len(str(h)) for i, h in enumerate(headers)]
+    lines = [' '.join(f'{str(h):<{w}}' for h, w in zip(headers, widths))]
+    lines.append('-' * len(lines[0]))
+    for row in rows:
+        lines.append(' '.join(f'{str(c):<{w}}' for c, w in zip(row, widths)))
+    return '\n'.join(lines)
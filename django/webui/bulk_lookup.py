@@ -0,0 +1,208 @@
+"""
+Bulk lookup of credentials for long lists of emails, usernames or domains.
+
+Inputs are normalized and split into batches of `batch_size` values. Each batch is one
+`terms` query with a `terms` aggregation on the looked-up field, so a single search
+returns the match count and the newest `hits_per_input` credentials of every value in
+the batch. `batches_per_request` batches go to Elasticsearch as one multi-search, and
+at most `concurrency` multi-searches are in flight at a time.
+
+Results are yielded in input order as soon as their batch finished: one record per
+input (`type: match`) and one per batch with its latency (`type: batch`).
+
+Used by the `/lookup/` endpoint and the `bulk_lookup` command.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from webui import clients, partitions, sharding
+from webui.export import COLUMNS, hit_rows
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('email', 'username', 'domain')
+# Elasticsearch's default index.max_inner_result_window caps top_hits sizes
+MAX_HITS_PER_INPUT = 100
+DEFAULTS = {
+    'batch_size': 500,
+    'batches_per_request': 8,
+    'concurrency': 4,
+    'hits_per_input': 10,
+    'max_inputs': 100000,
+}
+
+
+class BulkLookupError(ValueError):
+    """An invalid bulk lookup request."""
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'BULK_LOOKUP', {})}
+
+
+class LookupStats:
+    """Totals of a running lookup."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.finished_at: float | None = None
+        self.inputs = 0
+        self.matched_inputs = 0
+        self.credentials = 0
+        self.batches = 0
+        self.errors = 0
+
+    def summary(self) -> dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            'type': 'summary',
+            'inputs': self.inputs,
+            'matched_inputs': self.matched_inputs,
+            'credentials': self.credentials,
+            'batches': self.batches,
+            'errors': self.errors,
+            'elapsed_time': elapsed,
+        }
+
+
+def normalize(values, field: str, max_inputs: int | None = None) -> list[str]:
+    """Strip, lowercase (the fields use a lowercase normalizer) and de-duplicate inputs, keeping their order."""
+    if field not in FIELDS:
+        raise BulkLookupError(f"field must be one of {', '.join(FIELDS)}")
+    limit = max_inputs or config()['max_inputs']
+    seen = {}
+    for value in values:
+        if not isinstance(value, str):
+            raise BulkLookupError("values must be strings")
+        value = value.strip().lower()
+        if value and value not in seen:
+            seen[value] = None
+            if len(seen) > limit:
+                raise BulkLookupError(f"At most {limit} inputs are accepted per lookup")
+    return list(seen)
+
+
+def parse_hits_per_input(value) -> int:
+    """Validate a requested number of credentials per input; None means the configured default."""
+    if value is None:
+        return config()['hits_per_input']
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= MAX_HITS_PER_INPUT:
+        raise BulkLookupError(f"hits_per_input must be an integer from 0 to {MAX_HITS_PER_INPUT}")
+    return value
+
+
+def batch_search(field: str, values: list[str], hits_per_input: int) -> dict:
+    """Search body returning count and newest credentials of every value in one aggregation."""
+    return {
+        'size': 0,
+        'track_total_hits': False,
+        'query': {'bool': {'filter': [{'terms': {field: values}}]}},
+        'aggs': {
+            'inputs': {
+                'terms': {'field': field, 'size': len(values)},
+                'aggs': {
+                    'newest': {
+                        'top_hits': {
+                            'size': hits_per_input,
+                            'sort': [{'added_at': {'order': 'desc'}}],
+                            '_source': [column for column in COLUMNS if column not in ('id', 'file_name')],
+                        },
+                    },
+                },
+            },
+        },
+    }
+
+
+def _msearch(es_client, field: str, batches: list[list[str]], indices: list[str], hits_per_input: int) -> dict:
+    """Run one multi-search of several batches; returns the responses and the request latency."""
+    params = dict(getattr(settings, 'ELASTICSEARCH_SEARCH_PARAMS', {}))
+    timeout = params.pop('timeout', None)
+    searches = []
+    for values in batches:
+        header = {'index': ','.join(indices), **params}
+        if field == 'domain':
+            # Domain-routed indices only need the shards owning the batch's domains
+            routing = [sharding.search_routing(value) for value in values]
+            if all(routing):
+                header['routing'] = ','.join(routing)
+        body = batch_search(field, values, hits_per_input)
+        if timeout:
+            body['timeout'] = timeout
+        searches.extend([header, body])
+    start = time.perf_counter()
+    response = es_client.msearch(searches=searches)
+    return {'responses': response['responses'], 'latency': time.perf_counter() - start}
+
+
+def _records(field: str, values: list[str], response: dict, batch: int, latency: float, stats: LookupStats):
+    """Batch latency record followed by one match record per input of the batch."""
+    stats.batches += 1
+    if 'error' in response:
+        stats.errors += 1
+        reason = response['error'].get('reason') if isinstance(response['error'], dict) else response['error']
+        logger.error(f"Bulk lookup batch {batch} failed: {reason}")
+        yield {'type': 'batch', 'batch': batch, 'inputs': len(values), 'latency_ms': round(latency * 1000, 1),
+               'status': 'error', 'error': reason}
+        for value in values:
+            stats.inputs += 1
+            yield {'type': 'match', 'input': value, 'field': field, 'status': 'error'}
+        return
+
+    yield {'type': 'batch', 'batch': batch, 'inputs': len(values), 'latency_ms': round(latency * 1000, 1),
+           'took_ms': response.get('took'), 'status': 'success'}
+    buckets = {bucket['key']: bucket for bucket in response['aggregations']['inputs']['buckets']}
+    for value in values:
+        bucket = buckets.get(value)
+        stats.inputs += 1
+        if bucket is None:
+            yield {'type': 'match', 'input': value, 'field': field, 'total': 0, 'credentials': []}
+            continue
+        rows = hit_rows(bucket['newest']['hits']['hits'])
+        stats.matched_inputs += 1
+        stats.credentials += bucket['doc_count']
+        yield {'type': 'match', 'input': value, 'field': field, 'total': bucket['doc_count'], 'credentials': rows}
+
+
+def lookup(values, field: str, partition_keys=None, hits_per_input: int | None = None,
+           batch_size: int | None = None, concurrency: int | None = None, stats: LookupStats | None = None):
+    """Yield batch and match records for every (normalized) input value, in input order."""
+    cfg = config()
+    hits_per_input = parse_hits_per_input(hits_per_input)
+    batch_size = max(batch_size or cfg['batch_size'], 1)
+    concurrency = max(concurrency or cfg['concurrency'], 1)
+    stats = stats if stats is not None else LookupStats()
+    values = normalize(values, field)
+    indices = partitions.search_indices(partition_keys)
+    es_client = clients.elasticsearch()
+
+    batches = [values[start:start + batch_size] for start in range(0, len(values), batch_size)]
+    per_request = max(cfg['batches_per_request'], 1)
+    requests = [batches[start:start + per_request] for start in range(0, len(batches), per_request)]
+    logger.info(f"Bulk {field} lookup of {len(values)} inputs in {len(batches)} batches ({len(requests)} requests)")
+
+    batch_number = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = []
+        next_request = 0
+        try:
+            while pending or next_request < len(requests):
+                # Keep at most `concurrency` multi-searches in flight
+                while next_request < len(requests) and len(pending) < concurrency:
+                    request = requests[next_request]
+                    pending.append((request, executor.submit(
+                        _msearch, es_client, field, request, indices, hits_per_input,
+                    )))
+                    next_request += 1
+                request, future = pending.pop(0)
+                result = future.result()
+                for values_of_batch, response in zip(request, result['responses']):
+                    batch_number += 1
+                    yield from _records(field, values_of_batch, response, batch_number, result['latency'], stats)
+        finally:
+            for _, future in pending:
+                future.cancel()
+            stats.finished_at = time.time()
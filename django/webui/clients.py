@@ -0,0 +1,86 @@
+"""
+Process-wide MinIO and Elasticsearch clients.
+
+Both clients are created lazily on first use and then shared by every thread of the
+process, so commands and tasks reuse kept-alive pooled connections instead of opening
+new ones per call. Pool sizes come from `MINIO_CLIENT` and `ELASTICSEARCH_DSL['default']`
+(`connections_per_node`, `http_compress`).
+
+Connection pools must not be shared across `fork()`: django-q forks its workers from the
+cluster process, so the clients are dropped in the child and rebuilt on first use there.
+"""
+from django.conf import settings
+from elasticsearch_dsl import connections
+from minio import Minio
+from threading import Lock
+import logging
+import os
+import urllib3
+
+logger = logging.getLogger(__name__)
+
+MINIO_DEFAULTS = {
+    'pool_maxsize': 32,
+    'connect_timeout': 10,
+    'read_timeout': 300,
+    'retries': 5,
+}
+
+_minio: Minio | None = None
+_lock = Lock()
+
+
+def minio_config() -> dict:
+    return {**MINIO_DEFAULTS, **getattr(settings, 'MINIO_CLIENT', {})}
+
+
+def _build_minio() -> Minio:
+    cfg = minio_config()
+    http_client = urllib3.PoolManager(
+        maxsize=cfg['pool_maxsize'],
+        timeout=urllib3.Timeout(connect=cfg['connect_timeout'], read=cfg['read_timeout']),
+        retries=urllib3.Retry(
+            total=cfg['retries'],
+            backoff_factor=0.2,
+            status_forcelist=[500, 502, 503, 504],
+        ),
+    )
+    return Minio(
+        settings.AWS_S3_ENDPOINT_URL,
+        access_key=settings.AWS_ACCESS_KEY_ID,
+        secret_key=settings.AWS_SECRET_ACCESS_KEY,
+        secure=False,
+        http_client=http_client,
+    )
+
+
+def minio() -> Minio:
+    """The shared MinIO client. Release streamed responses with `close()` and `release_conn()`."""
+    global _minio
+    if _minio is None:
+        with _lock:
+            if _minio is None:
+                _minio = _build_minio()
+    return _minio
+
+
+def elasticsearch():
+    """
+    The shared Elasticsearch client, i.e. the 'default' elasticsearch-dsl connection.
+
+    Document classes, searches and raw API calls all go through this one client.
+    """
+    return connections.get_connection()
+
+
+def reset() -> None:
+    """Drop the cached clients so the next call builds fresh connection pools."""
+    global _minio, _lock
+    _minio = None
+    _lock = Lock()
+    if settings.configured and 'default' in getattr(settings, 'ELASTICSEARCH_DSL', {}):
+        # create_connection replaces the cached client for the alias; it connects lazily
+        connections.create_connection('default', **settings.ELASTICSEARCH_DSL['default'])
+
+
+os.register_at_fork(after_in_child=reset)
@@ -1,11 +1,6 @@
-from minio import Minio
 from minio.error import S3Error
-from core.settings import (
-    AWS_ACCESS_KEY_ID,
-    AWS_SECRET_ACCESS_KEY,
-    AWS_STORAGE_BUCKET_NAME,
-    AWS_S3_ENDPOINT_URL,
-)
+from core.settings import AWS_STORAGE_BUCKET_NAME
+from webui import clients
 import os
 import hashlib
 import json
@@ -16,14 +11,6 @@ import traceback
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Initialize MinIO Client
-minio_client = Minio(
-    AWS_S3_ENDPOINT_URL,
-    access_key=AWS_ACCESS_KEY_ID,
-    secret_key=AWS_SECRET_ACCESS_KEY,
-    secure=False,
-)
-
 # Define paths
 TARGET_PATHS = ["/usr/share/Telegram-Files/", "/usr/share/combos"]
 HASH_CACHE_FILE = "/usr/src/app/file_hashes.json"
@@ -74,8 +61,8 @@ def collect_and_upload_files(
 
     try:
         # Check if the bucket exists, create if it doesn't
-        if not minio_client.bucket_exists(bucket_name):
-            minio_client.make_bucket(bucket_name)
+        if not clients.minio().bucket_exists(bucket_name):
+            clients.minio().make_bucket(bucket_name)
             logger.info(f"Created bucket: {bucket_name}")
         else:
             logger.info(f"Bucket {bucket_name} already exists")
@@ -130,7 +117,7 @@ def collect_and_upload_files(
                         # Upload the file to MinIO
                         try:
                             with open(file_path, "rb") as data:
-                                minio_client.put_object(
+                                clients.minio().put_object(
                                     bucket_name,
                                     object_name,
                                     data,
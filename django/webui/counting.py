@@ -0,0 +1,152 @@
+"""
+Row and hit counts without full table scans.
+
+`COUNT(*)` over the credentials table reads every row, which takes seconds at the
+table's size. Counts are therefore served in one of three modes:
+
+- `estimate`: the planner's row estimate from `pg_class.reltuples`, kept current by
+  autovacuum/ANALYZE. Free, and typically within a few percent.
+- `cached`: an exact count computed in the background and kept in the shared cache.
+  Until one exists the estimate is returned and a django-q refresh is queued.
+- `exact`: run `COUNT(*)` now (and refresh the cache with the result).
+
+Only `exact` ever scans the table. A never-analyzed table has no estimate, so the
+other modes report the count as unknown (`value` None) until ANALYZE or the queued
+refresh has run.
+
+Search counts use Elasticsearch's `track_total_hits` threshold: totals are exact up
+to `track_total_hits` and reported as a lower bound beyond it.
+"""
+from datetime import timedelta
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+from django_q.models import Schedule
+from django_q.tasks import async_task
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+MODES = ('estimate', 'cached', 'exact')
+KEY_PREFIX = 'count'
+DEFAULTS = {
+    'cache': 'default',
+    'exact_ttl': 6 * 3600,
+    'refresh_minutes': 60,
+    'lock_timeout': 1800,
+    'track_total_hits': 10000,
+    # Models counted by the scheduled refresh
+    'models': ['webui.BreachedCredential'],
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'COUNTING', {})}
+
+
+def _cache():
+    return caches[config()['cache']]
+
+
+def _label(model) -> str:
+    return model if isinstance(model, str) else model._meta.label
+
+
+def estimate(model) -> int | None:
+    """Planner row estimate of the model's table, or None if it was never analyzed."""
+    table = apps.get_model(_label(model))._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        row = cursor.fetchone()
+    # reltuples is -1 before the first VACUUM/ANALYZE
+    if not row or row[0] < 0:
+        return None
+    return row[0]
+
+
+def exact(model) -> dict:
+    """Run COUNT(*) now and cache the result."""
+    label = _label(model)
+    start = time.time()
+    value = apps.get_model(label).objects.count()
+    result = {'value': value, 'exact': True, 'counted_at': timezone.now().isoformat()}
+    _cache().set(f"{KEY_PREFIX}:{label}", result, timeout=config()['exact_ttl'])
+    logger.info(f"Counted {value:,} {label} rows in {time.time() - start:.1f} s")
+    return result
+
+
+def refresh(label: str) -> int:
+    """django-q task: recount one model and release its refresh lock."""
+    try:
+        return exact(label)['value']
+    finally:
+        _cache().delete(f"{KEY_PREFIX}:{label}:refreshing")
+
+
+def queue_refresh(model) -> bool:
+    """Queue a background recount unless one is already pending; returns whether one was queued."""
+    label = _label(model)
+    if not _cache().add(f"{KEY_PREFIX}:{label}:refreshing", 1, timeout=config()['lock_timeout']):
+        return False
+    async_task('webui.counting.refresh', label, group='counting')
+    return True
+
+
+def count(model, mode: str = 'cached') -> dict:
+    """
+    Return `{'value', 'exact', 'counted_at'}` for the model's table in the given mode.
+
+    `cached` falls back to the estimate (queuing a refresh) when no exact count is
+    cached. `value` is None when neither exists (a never-analyzed table).
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    if mode == 'exact':
+        return exact(model)
+    if mode == 'cached':
+        cached = _cache().get(f"{KEY_PREFIX}:{_label(model)}")
+        if cached is not None:
+            return cached
+        queue_refresh(model)
+    return {'value': estimate(model), 'exact': False, 'counted_at': None}
+
+
+def indexed_total() -> int:
+    """
+    Sum of the per-file `ScrapFile.count` values.
+
+    The processor sets them to the lines it read and indexing replaces them with the
+    rows stored, so this tracks ingest progress rather than distinct credentials.
+    """
+    ScrapFile = apps.get_model('webui.ScrapFile')
+    return ScrapFile.objects.aggregate(total=Sum('count'))['total'] or 0
+
+
+def limit_total_hits(search):
+    """Count hits exactly only up to the configured threshold; beyond it totals are lower bounds."""
+    return search.extra(track_total_hits=config()['track_total_hits'])
+
+
+def scheduled_refresh() -> dict:
+    """django-q task: recount every configured model."""
+    return {label: refresh(label) for label in config()['models']}
+
+
+def schedule_refresh(minutes: int | None = None):
+    """Install (or update) the django-q schedule that runs `scheduled_refresh`."""
+    minutes = minutes or config()['refresh_minutes']
+    schedule, _ = Schedule.objects.update_or_create(
+        name='count-refresh',
+        defaults={
+            'func': 'webui.counting.scheduled_refresh',
+            'schedule_type': Schedule.MINUTES,
+            'minutes': minutes,
+            'repeats': -1,
+            'next_run': timezone.now() + timedelta(minutes=1),
+        },
+    )
+    return schedule
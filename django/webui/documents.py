@@ -1,7 +1,11 @@
 from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
-from webui.models import BreachedCredential, ScrapFile
+from webui.models import BreachedCredential
+from webui.parsing import parse_credential
+from webui import sharding
 from datetime import datetime
+from django.conf import settings
+import copy
 from elasticsearch_dsl import Text, Date, Long, Keyword
 from elasticsearch_dsl.analysis import analyzer, tokenizer, token_filter
 
@@ -29,14 +33,21 @@ credential_analyzer = analyzer(
 class BreachedCredentialDocument(Document):
     string = fields.TextField(
         fields={
-            'ngram': fields.TextField(analyzer='ngram_analyzer')
+            'ngram': fields.TextField(analyzer='ngram_analyzer'),
+            'lower': fields.KeywordField(normalizer='lowercase_normalizer', ignore_above=1024),
+            'reversed': fields.TextField(analyzer='reverse_analyzer', norms=False, index_options='docs'),
         }
     )
+    # Structured credential fields parsed at index time; used for term/exists filters
+    email = fields.KeywordField(normalizer='lowercase_normalizer')
+    username = fields.KeywordField(normalizer='lowercase_normalizer', ignore_above=256)
+    domain = fields.KeywordField(normalizer='lowercase_normalizer')
+    password = fields.KeywordField(ignore_above=256)
+    url_host = fields.KeywordField(normalizer='lowercase_normalizer')
     added_at = fields.DateField()
+    # File name, size and upload date are not denormalized onto credentials; search
+    # results are hydrated from webui.file_cache, so renaming a file needs no reindex.
     file_id = fields.IntegerField()
-    file_name = fields.TextField()
-    file_size = fields.FloatField()
-    file_uploaded_at = fields.DateField()
 
     class Index:
         name = 'breached_credentials'
@@ -49,6 +60,17 @@ class BreachedCredentialDocument(Document):
                     'ngram_analyzer': {
                         'tokenizer': 'ngram_tokenizer',
                         'filter': ['lowercase']
+                    },
+                    # Whole value, lowercased and reversed: suffix patterns become prefix queries
+                    'reverse_analyzer': {
+                        'tokenizer': 'keyword',
+                        'filter': ['lowercase', 'reverse']
+                    }
+                },
+                'normalizer': {
+                    'lowercase_normalizer': {
+                        'type': 'custom',
+                        'filter': ['lowercase']
                     }
                 },
                 'tokenizer': {
@@ -67,26 +89,167 @@ class BreachedCredentialDocument(Document):
         fields = [
             'id',
         ]
-        related_models = [ScrapFile]
 
     def get_queryset(self):
-        return self.django.model.objects.all().select_related('file')
+        return self.django.model.objects.all()
+
+    def _prepare_action(self, object_instance, action):
+        # Route like the bulk writers in webui.indexing so both paths address the same shard
+        prepared = super()._prepare_action(object_instance, action)
+        source = prepared['_source'] or parse_credential(object_instance.string)
+        routing = sharding.document_routing(prepared['_id'], source)
+        if routing:
+            prepared['_routing'] = routing
+        return prepared
 
     def prepare_id(self, instance):
         return str(instance.id)  # Ensure ID is always a string
 
-    def prepare_file(self, instance):
-        if instance.file:
-            return {'name': instance.file.name}
-        return None
-
     def prepare_indexed_at(self, instance):
         return datetime.now()
 
     def prepare_string(self, instance):
         return instance.string
 
-    def get_instances_from_related(self, instance):
-        if isinstance(instance, ScrapFile):
-            return BreachedCredential.objects.filter(file=instance)
-        return None
\ No newline at end of file
+    def prepare_email(self, instance):
+        return parse_credential(instance.string).get('email')
+
+    def prepare_username(self, instance):
+        return parse_credential(instance.string).get('username')
+
+    def prepare_domain(self, instance):
+        return parse_credential(instance.string).get('domain')
+
+    def prepare_password(self, instance):
+        return parse_credential(instance.string).get('password')
+
+    def prepare_url_host(self, instance):
+        return parse_credential(instance.string).get('url_host')
+
+
+# Subfields shared by every layout: the lowercased value as a keyword for case-insensitive
+# exact and prefix matches, and the lowercased value reversed for suffix matches.
+COMMON_STRING_FIELDS = {
+    'lower': {'type': 'keyword', 'normalizer': 'lowercase_normalizer', 'ignore_above': 1024},
+    'reversed': {'type': 'text', 'analyzer': 'reverse_analyzer', 'norms': False, 'index_options': 'docs'},
+}
+
+# Mapping layouts of the `string` field. The document class above declares the default
+# `ngram` layout; `wildcard` replaces the ngram subfield with a wildcard-type field, which
+# indexes a compact set of 3-grams plus the whole value and answers infix, wildcard and
+# regexp queries without the term explosion of a 3-15 gram tokenizer. The layout used by
+# an index is recorded in its mapping `_meta`, so it can be chosen per index version.
+INDEX_LAYOUTS = {
+    'ngram': {
+        'string': {
+            'type': 'text',
+            'fields': {
+                'ngram': {'type': 'text', 'analyzer': 'ngram_analyzer'},
+                **COMMON_STRING_FIELDS,
+            },
+        },
+    },
+    'wildcard': {
+        'string': {
+            'type': 'wildcard',
+            'fields': {
+                'keyword': {'type': 'keyword', 'ignore_above': 1024},
+                **COMMON_STRING_FIELDS,
+            },
+        },
+    },
+}
+DEFAULT_LAYOUT = 'ngram'
+
+
+def active_layout() -> str:
+    """Return the mapping layout new indices are created with and queries are built for."""
+    layout = getattr(settings, 'ELASTICSEARCH_INDEX_LAYOUT', DEFAULT_LAYOUT)
+    if layout not in INDEX_LAYOUTS:
+        raise ValueError(f"Unknown ELASTICSEARCH_INDEX_LAYOUT '{layout}', expected one of {list(INDEX_LAYOUTS)}")
+    return layout
+
+
+# Storage profiles: static index settings and mapping trims applied on top of a layout.
+# `compact` stores segments with the best_compression (DEFLATE) codec, sorts documents by
+# the lowercased credential so similar values share blocks (better compression, early
+# termination for prefix lookups) and drops norms, frequencies and positions on fields
+# that are only matched, never scored. `compact-domain` sorts by email domain first, which
+# keeps the documents of one domain together for domain-filtered searches.
+# Index sorting and the codec can only be set when an index is created.
+_COMPACT_MAPPING = {
+    'string': {'index_options': 'freqs'},
+    'string.ngram': {'norms': False, 'index_options': 'docs'},
+    'password': {'doc_values': False},
+}
+STORAGE_PROFILES = {
+    'default': {'settings': {}, 'mappings': {}},
+    'compact': {
+        'settings': {
+            'index.codec': 'best_compression',
+            'index.sort.field': ['string.lower'],
+            'index.sort.order': ['asc'],
+        },
+        'mappings': _COMPACT_MAPPING,
+    },
+    'compact-domain': {
+        'settings': {
+            'index.codec': 'best_compression',
+            'index.sort.field': ['domain', 'string.lower'],
+            'index.sort.order': ['asc', 'asc'],
+            'index.sort.missing': ['_last', '_last'],
+        },
+        'mappings': _COMPACT_MAPPING,
+    },
+}
+DEFAULT_STORAGE_PROFILE = 'default'
+
+
+def active_storage_profile() -> str:
+    """Return the storage profile new indices are created with."""
+    profile = getattr(settings, 'ELASTICSEARCH_STORAGE_PROFILE', DEFAULT_STORAGE_PROFILE)
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown ELASTICSEARCH_STORAGE_PROFILE '{profile}', expected one of {list(STORAGE_PROFILES)}")
+    return profile
+
+
+def _mapping_field(properties: dict, path: str) -> dict | None:
+    """Resolve a dotted field path (`string.ngram`) to its mapping dict, following multi-fields."""
+    name, _, subfield = path.partition('.')
+    field_mapping = properties.get(name)
+    if field_mapping is None or not subfield:
+        return field_mapping
+    return field_mapping.get('fields', {}).get(subfield)
+
+
+def index_body(layout: str | None = None, profile: str | None = None,
+               shards: int | None = None, routing: str | None = None) -> dict:
+    """
+    Settings and mappings of the credential index, for indices created outside the DSL (partitions, rebuilds).
+
+    The shard count and routing mode default to ELASTICSEARCH_SHARDING (see webui.sharding).
+    """
+    layout = layout or active_layout()
+    profile = profile or active_storage_profile()
+    routing = sharding.routing_mode(routing)
+    body = copy.deepcopy(BreachedCredentialDocument._index.to_dict())
+    mappings = body.setdefault('mappings', {})
+    properties = mappings.setdefault('properties', {})
+    properties.update(copy.deepcopy(INDEX_LAYOUTS[layout]))
+    mappings.update(sharding.mapping_options(shards, routing))
+    mappings['_meta'] = {'layout': layout, 'storage_profile': profile, 'routing': routing}
+
+    body.setdefault('settings', {}).update(sharding.index_settings(shards, routing))
+    body['settings'].update(copy.deepcopy(STORAGE_PROFILES[profile]['settings']))
+    for path, overrides in STORAGE_PROFILES[profile]['mappings'].items():
+        field_mapping = _mapping_field(properties, path)
+        # Skip trims that do not apply to the layout (e.g. `index_options` on a wildcard field)
+        if field_mapping is not None and field_mapping.get('type') in ('text', 'keyword'):
+            field_mapping.update(overrides)
+    if layout != 'ngram':
+        # The ngram tokenizer and its max_ngram_diff are only needed by the ngram subfield
+        analysis = body['settings'].get('analysis', {})
+        body['settings'].pop('index.max_ngram_diff', None)
+        analysis.get('analyzer', {}).pop('ngram_analyzer', None)
+        analysis.pop('tokenizer', None)
+    return body
@@ -0,0 +1,196 @@
+"""
+Streaming export of complete search results.
+
+An export opens a point-in-time over the searched indices and reads it with sliced
+parallel readers: each slice pages through its share of the hits with `search_after` on
+`_shard_doc`, and pages are handed to the consumer through a small bounded queue. Rows
+are rendered as NDJSON or CSV and optionally gzip-compressed on the fly, so memory stays
+constant no matter how many hits are exported.
+
+Used by the `/export/` endpoint (a StreamingHttpResponse) and the `export_credentials`
+command.
+"""
+from django.conf import settings
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+from webui import clients, file_cache
+import csv
+import io
+import json
+import logging
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('ndjson', 'csv')
+COLUMNS = ('id', 'string', 'email', 'username', 'domain', 'password', 'url_host', 'added_at', 'file_id', 'file_name')
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+DEFAULTS = {
+    'slices': 4,
+    'page_size': 5000,
+    'keep_alive': '5m',
+    'queue_pages': 8,
+}
+# Search parameters Elasticsearch rejects together with a PIT; they are applied when opening it
+PIT_PARAMS = ('routing', 'preference')
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'SEARCH_EXPORT', {})}
+
+
+class ExportStats:
+    """Progress of a running export, readable from the consumer thread."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.finished_at: float | None = None
+        self.docs = 0
+
+    def rate(self) -> float:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.docs / elapsed if elapsed > 0 else 0.0
+
+
+def hit_rows(hits: list[dict]) -> list[dict]:
+    """Export rows of raw hits, with the file name from the file cache."""
+    files = file_cache.get_many(hit['_source'].get('file_id') for hit in hits)
+    rows = []
+    for hit in hits:
+        source = hit['_source']
+        row = {column: source.get(column) for column in COLUMNS}
+        row['id'] = hit['_id']
+        row['file_name'] = files.get(source.get('file_id'), {}).get('file_name')
+        rows.append(row)
+    return rows
+
+
+def _read_slice(es_client, body: dict, pit_id: str, slice_id: int, slices: int, cfg: dict, pages: Queue,
+                stop: Event, errors: list) -> None:
+    """Page one PIT slice with search_after and put every page of hits into `pages`."""
+    after = None
+    try:
+        while not stop.is_set():
+            request = {
+                **body,
+                'pit': {'id': pit_id, 'keep_alive': cfg['keep_alive']},
+                'sort': [{'_shard_doc': 'asc'}],
+                'size': cfg['page_size'],
+                'track_total_hits': False,
+            }
+            if slices > 1:
+                request['slice'] = {'id': slice_id, 'max': slices}
+            if after is not None:
+                request['search_after'] = after
+            hits = es_client.search(**request)['hits']['hits']
+            if not hits:
+                break
+            while not stop.is_set():
+                try:
+                    pages.put(hits, timeout=1)
+                    break
+                except Full:
+                    continue
+            if len(hits) < cfg['page_size']:
+                break
+            after = hits[-1]['sort']
+    except Exception as e:
+        logger.error(f"Export slice {slice_id} failed: {e}")
+        errors.append(e)
+        stop.set()
+    finally:
+        pages.put(None)
+
+
+def iter_hits(search, indices: list[str], params: dict | None = None, slices: int | None = None,
+              page_size: int | None = None, stats: ExportStats | None = None):
+    """Yield pages of rows for every hit of `search`, read from a PIT with parallel slices."""
+    cfg = {**config(), **({'page_size': page_size} if page_size else {})}
+    slices = max(slices or cfg['slices'], 1)
+    params = params or {}
+    es_client = clients.elasticsearch()
+    body = {key: value for key, value in search.to_dict().items() if key in ('query', 'post_filter', '_source')}
+    pit_id = es_client.open_point_in_time(
+        index=','.join(indices),
+        keep_alive=cfg['keep_alive'],
+        **{name: params[name] for name in PIT_PARAMS if name in params},
+    )['id']
+
+    pages: Queue = Queue(maxsize=cfg['queue_pages'])
+    stop = Event()
+    errors: list[Exception] = []
+    readers = [
+        Thread(target=_read_slice, args=(es_client, body, pit_id, n, slices, cfg, pages, stop, errors), daemon=True)
+        for n in range(slices)
+    ]
+    for reader in readers:
+        reader.start()
+    try:
+        running = slices
+        while running:
+            try:
+                hits = pages.get(timeout=1)
+            except Empty:
+                continue
+            if hits is None:
+                running -= 1
+                continue
+            rows = hit_rows(hits)
+            if stats is not None:
+                stats.docs += len(rows)
+            yield rows
+        if errors:
+            raise errors[0]
+    finally:
+        stop.set()
+        # Unblock readers waiting on a full queue
+        while any(reader.is_alive() for reader in readers):
+            try:
+                pages.get(timeout=0.1)
+            except Empty:
+                pass
+        if stats is not None:
+            stats.finished_at = time.time()
+        try:
+            es_client.close_point_in_time(id=pit_id)
+        except Exception as e:
+            logger.debug(f"Could not close point in time: {e}")
+
+
+def render(pages, fmt: str = 'ndjson'):
+    """Encode pages of rows as NDJSON lines or CSV (with a header row), one bytes chunk per page."""
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+        writer.writeheader()
+        yield buffer.getvalue().encode()
+        for rows in pages:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(rows)
+            yield buffer.getvalue().encode()
+    else:
+        for rows in pages:
+            yield ''.join(json.dumps(row, default=str) + '\n' for row in rows).encode()
+
+
+def gzip_chunks(chunks, level: int = 6):
+    """Gzip a stream of bytes chunks on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream(search, indices: list[str], params: dict | None = None, fmt: str = 'ndjson', compress: bool = False,
+           slices: int | None = None, page_size: int | None = None, stats: ExportStats | None = None):
+    """Bytes chunks of a complete export of `search`."""
+    chunks = render(iter_hits(search, indices, params, slices, page_size, stats), fmt)
+    return gzip_chunks(chunks) if compress else chunks
+
+
+def filename(fmt: str, compress: bool) -> str:
+    return f"credentials-{time.strftime('%Y%m%d-%H%M%S')}.{fmt}{'.gz' if compress else ''}"
@@ -0,0 +1,64 @@
+"""
+In-process cache of ScrapFile metadata used to hydrate search hits.
+
+Credential documents only carry `file_id`; the file name, size and upload date are
+looked up here at result time. Entries expire after `CACHE_TTL` seconds and are dropped
+immediately when a ScrapFile is saved or deleted in this process (see webui.models).
+"""
+from threading import Lock
+from webui.models import ScrapFile
+import time
+
+CACHE_TTL = 300  # seconds
+
+_cache: dict[int, tuple[float, dict]] = {}
+_lock = Lock()
+
+
+def file_metadata(scrap_file: ScrapFile) -> dict:
+    """Return the file fields shown next to a credential."""
+    return {
+        'file_id': scrap_file.id,
+        'file_name': scrap_file.name,
+        'file_size': float(scrap_file.size),
+        'file_uploaded_at': scrap_file.added_at.isoformat(),
+    }
+
+
+def get_many(file_ids) -> dict[int, dict]:
+    """Return metadata for the given file IDs, loading the missing ones with a single query."""
+    now = time.monotonic()
+    found, missing = {}, set()
+    with _lock:
+        for file_id in set(file_ids):
+            if file_id is None:
+                continue
+            entry = _cache.get(file_id)
+            if entry and entry[0] > now:
+                found[file_id] = entry[1]
+            else:
+                missing.add(file_id)
+
+    if missing:
+        loaded = {
+            sf.id: file_metadata(sf)
+            for sf in ScrapFile.objects.filter(id__in=missing).only('id', 'name', 'size', 'added_at')
+        }
+        with _lock:
+            for file_id, meta in loaded.items():
+                _cache[file_id] = (now + CACHE_TTL, meta)
+        found.update(loaded)
+    return found
+
+
+def get(file_id) -> dict | None:
+    return get_many([file_id]).get(file_id)
+
+
+def invalidate(file_id=None) -> None:
+    """Drop one file from the cache, or everything when no ID is given."""
+    with _lock:
+        if file_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(file_id, None)
@@ -0,0 +1,61 @@
+"""
+Helpers shared by every code path that writes credential documents to Elasticsearch.
+
+The indexing task, the Postgres rebuild command and any future writer build their
+bulk actions here so the document layout is defined in exactly one place.
+"""
+from webui.parsing import parse_credential
+from webui import pipelines, sharding
+
+INDEX_NAME = 'breached_credentials'
+
+
+def credential_source(string: str, added_at, file_id: int | None, parse: bool | None = None) -> dict:
+    """
+    Build the `_source` body of a credential document, including the parsed credential fields.
+
+    Only `file_id` links the document to its file; name, size and upload date are hydrated
+    from `webui.file_cache` at search time so they are not repeated on every credential.
+    The parsed fields are left out when the ingest pipeline extracts them (`parse` defaults
+    to True unless ELASTICSEARCH_INGEST_PIPELINE is enabled).
+    """
+    if parse is None:
+        parse = not pipelines.is_enabled()
+    source = {
+        'string': string,
+        'added_at': added_at if isinstance(added_at, str) else added_at.isoformat(),
+        'file_id': file_id,
+    }
+    if parse:
+        source.update(parse_credential(string))
+    return source
+
+
+def credential_action(cred_id: str, string: str, added_at, file_id: int | None, index: str = INDEX_NAME,
+                      routing: str | None = None, parse: bool | None = None, op_type: str = 'index') -> dict:
+    """
+    Build a bulk action in the format accepted by `elasticsearch.helpers`.
+
+    `index` actions overwrite an existing document (rebuilds and repairs). The ingest writer
+    uses `op_type='create'`, which keeps the first file's document for a duplicate line like
+    Postgres keeps its row; Elasticsearch answers the duplicates with a 409, which
+    `tasks.bulk_failures` skips. `routing` overrides the configured routing mode (`hash` or
+    `domain`), e.g. for benchmark indices.
+    """
+    if parse is None:
+        parse = not pipelines.is_enabled()
+    source = credential_source(string, added_at, file_id, parse=parse)
+    action = {
+        '_op_type': op_type,
+        '_index': index,
+        '_id': cred_id,
+        '_source': source,
+    }
+    routing_source = source
+    if not parse and sharding.routing_mode(routing) == 'domain':
+        # Domain routing is decided client-side even when the pipeline extracts the fields
+        routing_source = parse_credential(string)
+    shard_routing = sharding.document_routing(cred_id, routing_source, routing)
+    if shard_routing:
+        action['_routing'] = shard_routing
+    return action
@@ -0,0 +1,143 @@
+"""
+Reader stage of `index_breached_credential`: raw MinIO bytes to credential batches.
+
+The object stream is cut into large byte batches at line boundaries and every batch is
+decoded, cleaned and hashed in a process pool, so the CPU-bound parsing scales across
+cores instead of contending for the GIL. At most `in_flight` batches per reader are
+submitted at a time and results are yielded in submission order, so memory stays flat
+however large the file is and the writer sees the lines in file order.
+
+The pool is started with `start_readers` before the task starts its writer thread: the
+workers are forked, and a process forked while other threads run can inherit locks they
+hold (logging, connection pools) in a locked state.
+
+Worker processes cannot be started from a daemonic process. django-q workers are
+daemonic unless `Q_CLUSTER['daemonize_workers']` is False; in that case the readers
+fall back to threads.
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from datetime import datetime
+from django.conf import settings
+from django.utils import timezone
+from webui.parsing import clean_string
+import hashlib
+import logging
+import multiprocessing
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'processes': 4,
+    'batch_bytes': 1024 * 1024,
+    'in_flight': 2,
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'INGEST_READERS', {})}
+
+
+@dataclass(slots=True)
+class CredentialBatch:
+    """
+    Credentials of one file in flight between the readers and the writer.
+
+    Lines are held as columns: the md5 digests packed into one bytearray (16 bytes per
+    line) and the cleaned strings, with one file id, target index and timestamp for the
+    whole batch. Model instances and bulk actions are only built by `process_chunk`.
+    """
+    file_id: int
+    index: str
+    added_at: datetime
+    digests: bytearray = field(default_factory=bytearray)
+    strings: list[str] = field(default_factory=list)
+
+    def append(self, line: str) -> None:
+        self.digests += hashlib.md5(line.encode()).digest()
+        self.strings.append(line)
+
+    def ids(self):
+        """Credential IDs (md5 hex digests) in line order."""
+        view = memoryview(self.digests)
+        return (view[n:n + 16].hex() for n in range(0, len(view), 16))
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+def parse_block(data: bytes, file_id: int, index: str, added_at: datetime) -> CredentialBatch:
+    """Decode, validate and clean one byte batch of whole lines (runs in a reader process)."""
+    batch = CredentialBatch(file_id=file_id, index=index, added_at=added_at)
+    for line in data.decode('utf-8', errors='replace').splitlines():
+        line = line.strip()
+        if ':' in line:  # Basic validation
+            line = clean_string(line)
+            if line:
+                batch.append(line)
+    return batch
+
+
+def byte_batches(stream, batch_bytes: int):
+    """Regroup stream chunks into batches of about `batch_bytes` that end on a newline."""
+    pending = bytearray()
+    for chunk in stream:
+        pending += chunk
+        if len(pending) < batch_bytes:
+            continue
+        cut = pending.rfind(b'\n')
+        if cut < 0:
+            # One huge line; keep reading until it ends
+            continue
+        yield bytes(pending[:cut + 1])
+        del pending[:cut + 1]
+    if pending:
+        # The last line has no trailing newline
+        yield bytes(pending)
+
+
+def reader_executor(workers: int):
+    """A process pool, or a thread pool where this process cannot have children."""
+    if multiprocessing.current_process().daemon:
+        logger.warning(
+            "Reading with threads: daemonic processes cannot start a process pool "
+            "(set Q_CLUSTER['daemonize_workers'] to False)"
+        )
+        return ThreadPoolExecutor(max_workers=workers)
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def start_readers(workers: int | None = None):
+    """Create the reader pool and fork its workers now, while the caller has no other threads."""
+    executor = reader_executor(workers or config()['processes'])
+    # A fork-based ProcessPoolExecutor starts all of its workers on the first submit
+    executor.submit(int).result()
+    return executor
+
+
+def read_batches(stream, file_id: int, index: str, workers: int | None = None, batch_bytes: int | None = None,
+                 executor=None):
+    """
+    Parse an object stream in parallel and yield its CredentialBatches in file order.
+
+    `stream` yields raw byte chunks, e.g. `response.stream(...)` of a MinIO object. Pass
+    the pool from `start_readers` as `executor` (it is left running, and `workers` should
+    match its size); without one a pool is created for this stream.
+    """
+    cfg = config()
+    workers = workers or cfg['processes']
+    max_pending = workers * cfg['in_flight']
+    with nullcontext(executor) if executor is not None else reader_executor(workers) as executor:
+        futures = deque()
+        try:
+            for data in byte_batches(stream, batch_bytes or cfg['batch_bytes']):
+                futures.append(executor.submit(parse_block, data, file_id, index, timezone.now()))
+                while len(futures) >= max_pending:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,245 @@
+"""
+Post-ingest maintenance of the credential index.
+
+A bulk load (`index_existing_scrap`) leaves the index with many small segments and
+latency stays poor until background merges catch up. When the last indexing task of a
+bulk load finishes, `bulk_load_hook` starts `post_ingest_maintenance`, which:
+
+1. measures baseline latency of a few probe queries,
+2. force-merges cold indices (sealed or rolled-over partitions, or the single index
+   while no ingest holds its lease) that have too many segments per shard, and expunges
+   deletes from indices with a high deleted-docs ratio (the only optimization partition
+   write indices get),
+3. warms the file-system cache with representative queries, and
+4. measures latency again and logs the before/after report.
+
+Merges run one index at a time. Every step is a short django-q task that reschedules
+itself, so a long merge never holds a worker past the cluster timeout.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from django_q.models import OrmQ
+from django_q.tasks import async_task, count_group, schedule
+from elasticsearch_dsl import connections
+from webui import benchmark, partitions
+from webui.queries import build_query
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+GROUP_PREFIX = 'bulk-load'
+DEFAULTS = {
+    'enabled': True,
+    'max_segments_per_shard': 10,
+    'max_deleted_ratio': 0.1,
+    'max_num_segments': 1,
+    'pause_seconds': 30,
+    'warm_terms': ['admin', 'gmail.com', 'password'],
+    'probe_repeat': 5,
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'ELASTICSEARCH_MAINTENANCE', {})}
+
+
+def bulk_load_group(total: int) -> str:
+    """Name of the django-q group of a bulk load; it encodes the number of queued tasks."""
+    return f"{GROUP_PREFIX}-{timezone.now():%Y%m%d%H%M%S}-{total}"
+
+
+def bulk_load_hook(task) -> None:
+    """django-q hook of bulk-load indexing tasks: start maintenance after the last one."""
+    group = task.group or ''
+    if not group.startswith(GROUP_PREFIX) or not config()['enabled']:
+        return
+    total = int(group.rsplit('-', 1)[1])
+    done = count_group(group)
+    if done >= total:
+        logger.info(f"Bulk load {group} finished ({done} tasks), starting index maintenance")
+        async_task('webui.maintenance.post_ingest_maintenance', group=f'{group}-maintenance')
+
+
+def ingest_pending(own_tasks: int = 0) -> bool:
+    """
+    True while django-q has queued or running tasks other than `own_tasks` (indexing may still be writing).
+
+    With the ORM broker a task's row stays in the queue table until it is acknowledged,
+    so a maintenance step running as a task passes `own_tasks=1` to ignore itself.
+    """
+    return OrmQ.objects.count() > own_tasks
+
+
+def merges_running(es_client) -> bool:
+    """True while a segment merge or force-merge runs on one of the credential indices."""
+    if not es_client.indices.exists(index=partitions.READ_ALIAS):
+        return False
+    stats = es_client.indices.stats(index=partitions.READ_ALIAS, metric='merge')
+    if stats['_all']['total']['merges']['current']:
+        return True
+    # A force-merge waiting for the force_merge thread pool has no running merge yet;
+    # its task description lists the indices it was started on
+    indices = set(stats['indices'])
+    tasks = es_client.tasks.list(actions='indices:admin/forcemerge', detailed=True)
+    for node in tasks.get('nodes', {}).values():
+        for task in node.get('tasks', {}).values():
+            described = re.search(r'\[([^\]]*)\]', task.get('description', ''))
+            if not described or indices & {name.strip() for name in described.group(1).split(',')}:
+                return True
+    return False
+
+
+def index_health(es_client) -> list[dict]:
+    """Segment count, segments per shard and deleted-docs ratio of every credential index."""
+    if not es_client.indices.exists(index=partitions.READ_ALIAS):
+        return []
+    stats = es_client.indices.stats(index=partitions.READ_ALIAS, metric=['segments', 'docs'])['indices']
+    index_settings = es_client.indices.get_settings(index=partitions.READ_ALIAS)
+    hot = set()
+    if partitions.is_enabled():
+        for indices in partitions.list_partitions(es_client).values():
+            hot.update(i['index'] for i in indices if i['is_write_index'])
+    elif partitions.ingesting_keys([partitions.INDEX_NAME]):
+        # Without partitioning the single index is only hot while an ingest holds its lease
+        hot.update(stats)
+
+    health = []
+    for index, index_stats in sorted(stats.items()):
+        primaries = index_stats['primaries']
+        docs, deleted = primaries['docs']['count'], primaries['docs']['deleted']
+        settings_ = index_settings[index]['settings']['index']
+        shards = int(settings_.get('number_of_shards', 1))
+        segments = primaries['segments']['count']
+        health.append({
+            'index': index,
+            'docs': docs,
+            'deleted': deleted,
+            'deleted_ratio': deleted / (docs + deleted) if docs + deleted else 0.0,
+            'segments': segments,
+            'segments_per_shard': segments / shards,
+            'hot': index in hot,
+            'sealed': str(settings_.get('blocks', {}).get('write')).lower() == 'true',
+        })
+    return health
+
+
+def plan(health: list[dict]) -> list[dict]:
+    """
+    Decide which indices to optimize.
+
+    Cold indices with too many segments are merged down to `max_num_segments`: sealed or
+    rolled-over partitions, and the single index of an unpartitioned setup while no ingest
+    holds its lease (see `index_health`). Partition write indices are never merged to one
+    segment (that would leave a huge segment the merge policy ignores once writes resume);
+    they only get deletes expunged.
+    """
+    cfg = config()
+    steps = []
+    for info in health:
+        cold = info['sealed'] or not info['hot']
+        if cold and info['segments_per_shard'] > cfg['max_num_segments']:
+            if info['segments_per_shard'] > cfg['max_segments_per_shard'] or info['deleted_ratio'] > cfg['max_deleted_ratio']:
+                steps.append({'index': info['index'], 'action': 'merge'})
+        elif info['deleted_ratio'] > cfg['max_deleted_ratio']:
+            steps.append({'index': info['index'], 'action': 'expunge'})
+    return steps
+
+
+def force_merge(es_client, step: dict, wait: bool = False):
+    """Start (or run, with `wait`) the force-merge of one planned step."""
+    kwargs = {'index': step['index'], 'wait_for_completion': wait}
+    if step['action'] == 'merge':
+        kwargs['max_num_segments'] = config()['max_num_segments']
+    else:
+        kwargs['only_expunge_deletes'] = True
+    if wait:
+        kwargs['request_timeout'] = 24 * 3600
+    logger.info(f"Force-merging {step['index']} ({step['action']})")
+    return es_client.indices.forcemerge(**kwargs)
+
+
+def probe_queries() -> dict:
+    """The queries used to warm caches and compare latency before and after maintenance."""
+    queries = {}
+    for term in config()['warm_terms']:
+        queries[f'case_insensitive:{term}'] = build_query(term, 'case_insensitive').to_dict()
+        queries[f'iexact:{term}'] = build_query(term, 'iexact').to_dict()
+        queries[f'prefix:{term}*'] = build_query(f'{term}*', 'wildcard').to_dict()
+    return queries
+
+
+def measure(es_client) -> dict:
+    return benchmark.measure_queries(
+        es_client, partitions.READ_ALIAS, probe_queries(), repeat=config()['probe_repeat']
+    )
+
+
+def warm_up(es_client) -> None:
+    """
+    Pull the term dictionaries, postings and doc values searches touch into the page cache.
+
+    Runs every probe query once plus a sort on `added_at` and an aggregation on `file_id`,
+    which read the doc values of the date sort and the per-file statistics.
+    """
+    for query in probe_queries().values():
+        es_client.search(index=partitions.READ_ALIAS, query=query, size=20, request_cache=False)
+    es_client.search(index=partitions.READ_ALIAS, size=20, sort=[{'added_at': 'desc'}], request_cache=False)
+    es_client.search(
+        index=partitions.READ_ALIAS, size=0, request_cache=False,
+        aggs={'files': {'terms': {'field': 'file_id', 'size': 100}}},
+    )
+
+
+def format_report(before: dict, after: dict) -> str:
+    rows = []
+    for label, result in after.items():
+        prev = before.get(label, {})
+        rows.append([
+            label,
+            f"{prev.get('p50', 0):.0f}/{prev.get('p99', 0):.0f}",
+            f"{result['p50']:.0f}/{result['p99']:.0f}",
+        ])
+    return benchmark.format_table(['Query', 'Before p50/p99 (ms)', 'After p50/p99 (ms)'], rows)
+
+
+def post_ingest_maintenance(baseline: dict | None = None, merged: list | None = None) -> dict:
+    """
+    One step of post-ingest maintenance, run as a django-q task.
+
+    Each call starts at most one force-merge and reschedules itself until every planned
+    merge is done; the final call warms the caches and logs the latency report.
+    """
+    cfg = config()
+    es_client = connections.get_connection()
+    merged = merged or []
+    if baseline is None:
+        baseline = measure(es_client)
+        logger.info(f"Maintenance baseline measured for {len(baseline)} probe queries")
+
+    def reschedule():
+        schedule(
+            'webui.maintenance.post_ingest_maintenance',
+            baseline=baseline,
+            merged=merged,
+            next_run=timezone.now() + timedelta(seconds=cfg['pause_seconds']),
+        )
+        return {'status': 'rescheduled', 'merged': merged}
+
+    if ingest_pending(own_tasks=1) or merges_running(es_client):
+        return reschedule()
+
+    steps = [s for s in plan(index_health(es_client)) if s['index'] not in merged]
+    if steps:
+        force_merge(es_client, steps[0])
+        merged.append(steps[0]['index'])
+        return reschedule()
+
+    warm_up(es_client)
+    after = measure(es_client)
+    logger.info(f"Index maintenance finished, merged {len(merged)} indices:\n{format_report(baseline, after)}")
+    if getattr(settings, 'ELASTICSEARCH_SNAPSHOTS', {}).get('after_ingest'):
+        # Snapshot the freshly merged segments so the next restore needs no re-indexing
+        async_task('webui.snapshots.scheduled_snapshot')
+    return {'status': 'done', 'merged': merged, 'before': baseline, 'after': after}
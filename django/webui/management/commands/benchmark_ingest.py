@@ -0,0 +1,108 @@
+from django.core.management.base import BaseCommand
+from elasticsearch_dsl import connections
+from datetime import datetime
+from webui import benchmark, pipelines
+from webui.documents import index_body
+import json
+import time
+
+MODES = ['python', 'pipeline']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare credential field extraction in Python (parse_credential) with the Elasticsearch ingest "
+        "pipeline on a sample from Postgres: end-to-end docs/s and the CPU split between client and cluster."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=1_000_000, help='Credentials to load per mode (default: 1M)')
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Documents per bulk request (default: 5000)')
+        parser.add_argument('--check', type=int, default=1000,
+                            help='Lines to compare between pipeline and Python parsing first (default: 1000, 0 to skip)')
+        parser.add_argument('--seed', type=int, help='Random seed for the sample')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark indices afterwards')
+        parser.add_argument('--output', help='Write the raw results to this JSON file')
+
+    def handle(self, *args, **options):
+        es_client = connections.get_connection()
+        pipelines.ensure_pipeline(es_client, force=True)
+
+        self.stdout.write(f"[*] Sampling {options['sample']:,} credentials from Postgres")
+        rows = benchmark.sample_credentials(options['sample'], seed=options['seed'])
+        self.stdout.write(f"[*] Sampled {len(rows):,} credentials")
+
+        if options['check']:
+            lines = [row[1] for row in rows[:options['check']]]
+            mismatches = pipelines.parity(es_client, lines)
+            style = self.style.SUCCESS if not mismatches else self.style.WARNING
+            self.stdout.write(style(f"[*] Pipeline parity: {len(lines) - len(mismatches):,}/{len(lines):,} lines identical"))
+            for mismatch in mismatches[:5]:
+                self.stdout.write(f"    {mismatch['string'][:80]!r}: python={mismatch['python']} pipeline={mismatch['pipeline']}")
+
+        results = {}
+        for mode in options['modes']:
+            index = benchmark.bench_index_name(f'ingest-{mode}')
+            self.stdout.write(self.style.NOTICE(f"\n[*] Mode '{mode}' -> {index}"))
+            benchmark.create_index(es_client, index, index_body())
+            try:
+                parse = mode == 'python'
+                bulk_kwargs = {} if parse else {'pipeline': pipelines.PIPELINE_NAME}
+                cluster_before = self.cluster_cpu(es_client)
+                client_before = time.process_time()
+                load = benchmark.load(
+                    es_client, index, benchmark.sample_actions(rows, index, parse=parse),
+                    chunk_size=options['chunk_size'], merge=False, **bulk_kwargs,
+                )
+                client_cpu = time.process_time() - client_before
+                cluster_after = self.cluster_cpu(es_client)
+                results[mode] = {
+                    'load': load,
+                    'client_cpu_seconds': client_cpu,
+                    'cluster_cpu_seconds': (cluster_after['process_ms'] - cluster_before['process_ms']) / 1000,
+                    'pipeline_seconds': (cluster_after['pipeline_ms'] - cluster_before['pipeline_ms']) / 1000,
+                    'with_email': es_client.count(index=index, query={'exists': {'field': 'email'}})['count'],
+                }
+                self.stdout.write(
+                    f"    indexed {load['indexed']:,} docs at {load['docs_per_second']:,.0f} docs/s, "
+                    f"client CPU {client_cpu:.1f} s"
+                )
+            finally:
+                if not options['keep']:
+                    es_client.indices.delete(index=index, ignore_unavailable=True)
+
+        self.print_report(results)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({'date': datetime.now().isoformat(), 'sample': len(rows), 'results': results}, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"[+] Results saved to {options['output']}"))
+
+    def cluster_cpu(self, es_client) -> dict:
+        """Cumulative CPU time of the Elasticsearch processes and of the credential pipeline."""
+        stats = es_client.nodes.stats(metric=['process', 'ingest'])['nodes'].values()
+        return {
+            'process_ms': sum(node['process']['cpu']['total_in_millis'] for node in stats),
+            'pipeline_ms': sum(
+                node['ingest']['pipelines'].get(pipelines.PIPELINE_NAME, {}).get('time_in_millis', 0) for node in stats
+            ),
+        }
+
+    def print_report(self, results):
+        self.stdout.write(self.style.SUCCESS("\n[*] INGEST THROUGHPUT AND CPU SPLIT"))
+        rows = []
+        for mode, result in results.items():
+            docs = max(result['load']['indexed'], 1)
+            client, cluster = result['client_cpu_seconds'], result['cluster_cpu_seconds']
+            rows.append([
+                mode,
+                f"{result['load']['docs_per_second']:,.0f}",
+                f"{client:.1f}",
+                f"{cluster:.1f}",
+                f"{result['pipeline_seconds']:.1f}",
+                f"{(client + cluster) / docs * 1e6:.0f}",
+                f"{result['with_email']:,}",
+            ])
+        headers = ['Mode', 'Docs/s', 'Client CPU s', 'ES CPU s', 'Pipeline s', 'CPU us/doc', 'Docs with email']
+        self.stdout.write(benchmark.format_table(headers, rows))
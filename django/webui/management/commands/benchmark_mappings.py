@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand
+from elasticsearch_dsl import connections
+from datetime import datetime
+from webui import benchmark
+from webui.documents import INDEX_LAYOUTS, index_body
+from webui.queries import build_query
+import json
+
+DEFAULT_TERMS = ['frost', 'gmail', 'admin']
+QUERY_TYPES = ['exact', 'iexact', 'wildcard', 'regexp', 'case_insensitive']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare credential index mapping layouts (ngram vs wildcard) on a sample from Postgres: "
+        "index size, indexing rate and p50/p99 query latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=1_000_000, help='Credentials to load per layout (default: 1M)')
+        parser.add_argument('--layouts', nargs='+', choices=sorted(INDEX_LAYOUTS), default=sorted(INDEX_LAYOUTS))
+        parser.add_argument('--terms', nargs='+', default=DEFAULT_TERMS, help='Search terms to benchmark')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query (default: 20)')
+        parser.add_argument('--seed', type=int, help='Random seed for the sample')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark indices afterwards')
+        parser.add_argument('--output', help='Write the raw results to this JSON file')
+
+    def handle(self, *args, **options):
+        es_client = connections.get_connection()
+
+        self.stdout.write(f"[*] Sampling {options['sample']:,} credentials from Postgres")
+        rows = benchmark.sample_credentials(options['sample'], seed=options['seed'])
+        self.stdout.write(f"[*] Sampled {len(rows):,} credentials")
+
+        results = {}
+        for layout in options['layouts']:
+            index = benchmark.bench_index_name(f'layout-{layout}')
+            self.stdout.write(self.style.NOTICE(f"\n[*] Layout '{layout}' -> {index}"))
+            benchmark.create_index(es_client, index, index_body(layout))
+            try:
+                load = benchmark.load(es_client, index, benchmark.sample_actions(rows, index))
+                size = benchmark.index_size(es_client, index)
+                self.stdout.write(
+                    f"    indexed {load['indexed']:,} docs at {load['docs_per_second']:,.0f} docs/s, "
+                    f"size {size / (1024 ** 2):.1f} MB"
+                )
+                queries = {
+                    f'{search_type}:{term}': build_query(term, search_type, layout=layout).to_dict()
+                    for search_type in QUERY_TYPES
+                    for term in options['terms']
+                }
+                latencies = benchmark.measure_queries(es_client, index, queries, repeat=options['repeat'])
+                results[layout] = {'load': load, 'size_bytes': size, 'queries': latencies}
+            finally:
+                if not options['keep']:
+                    es_client.indices.delete(index=index, ignore_unavailable=True)
+
+        self.print_report(results, options['terms'])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'date': datetime.now().isoformat(),
+                    'sample': len(rows),
+                    'terms': options['terms'],
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"[+] Results saved to {options['output']}"))
+
+    def print_report(self, results, terms):
+        self.stdout.write(self.style.SUCCESS("\n[*] INDEX SUMMARY"))
+        rows = []
+        for layout, result in results.items():
+            load = result['load']
+            rows.append([
+                layout,
+                f"{load['indexed']:,}",
+                f"{result['size_bytes'] / (1024 ** 2):.1f}",
+                f"{result['size_bytes'] / max(load['indexed'], 1):.0f}",
+                f"{load['docs_per_second']:,.0f}",
+            ])
+        self.stdout.write(benchmark.format_table(['Layout', 'Docs', 'Size (MB)', 'Bytes/doc', 'Docs/s'], rows))
+
+        self.stdout.write(self.style.SUCCESS("\n[*] QUERY LATENCY (server took, ms)"))
+        rows = []
+        for search_type in QUERY_TYPES:
+            for term in terms:
+                label = f'{search_type}:{term}'
+                row = [search_type, term]
+                for layout, result in results.items():
+                    q = result['queries'][label]
+                    row.append(f"{q['p50']:.0f}/{q['p99']:.0f} ({q['hits']:,})")
+                rows.append(row)
+        headers = ['Query Type', 'Term'] + [f'{layout} p50/p99 (hits)' for layout in results]
+        self.stdout.write(benchmark.format_table(headers, rows))
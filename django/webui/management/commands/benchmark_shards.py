@@ -0,0 +1,148 @@
+from django.core.management.base import BaseCommand
+from elasticsearch_dsl import connections
+from datetime import datetime
+from statistics import mean
+from webui import benchmark, sharding
+from webui.documents import INDEX_LAYOUTS, active_layout, index_body
+from webui.queries import build_filters, build_query
+import json
+
+DEFAULT_SHARDS = [1, 2, 4, 8]
+DEFAULT_TERMS = ['admin', 'frost']
+DEFAULT_DOMAINS = ['gmail.com', 'yahoo.com', 'mail.ru']
+TARGET_DOCS = 120_000_000
+# Elasticsearch guidance: keep shards between ~10 and ~50 GB
+MAX_SHARD_BYTES = 50 * 1024 ** 3
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare shard counts and document routing (hash vs domain) of the credential index on a sample "
+        "from Postgres: p50/p99 of global and domain-scoped searches, and shard size projected to the full index."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=1_000_000, help='Credentials to load per layout (default: 1M)')
+        parser.add_argument('--shards', nargs='+', type=int, default=DEFAULT_SHARDS, help='Shard counts to compare')
+        parser.add_argument('--routing', nargs='+', choices=sharding.ROUTING_MODES, default=list(sharding.ROUTING_MODES))
+        parser.add_argument('--layout', choices=sorted(INDEX_LAYOUTS), help='Mapping layout (default: ELASTICSEARCH_INDEX_LAYOUT)')
+        parser.add_argument('--terms', nargs='+', default=DEFAULT_TERMS, help='Terms for the global searches')
+        parser.add_argument('--domains', nargs='+', default=DEFAULT_DOMAINS, help='Domains for the domain-scoped searches')
+        parser.add_argument('--target-docs', type=int, default=TARGET_DOCS,
+                            help=f'Document count to project shard sizes to (default: {TARGET_DOCS:,})')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query (default: 20)')
+        parser.add_argument('--seed', type=int, help='Random seed for the sample')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark indices afterwards')
+        parser.add_argument('--output', help='Write the raw results to this JSON file')
+
+    def handle(self, *args, **options):
+        es_client = connections.get_connection()
+        layout = options['layout'] or active_layout()
+
+        processors = sum(
+            node['os'].get('allocated_processors', node['os'].get('available_processors', 0))
+            for node in es_client.nodes.info(metric='os')['nodes'].values()
+        )
+        self.stdout.write(f"[*] Cluster has {processors} allocated processors")
+
+        self.stdout.write(f"[*] Sampling {options['sample']:,} credentials from Postgres")
+        rows = benchmark.sample_credentials(options['sample'], seed=options['seed'])
+        self.stdout.write(f"[*] Sampled {len(rows):,} credentials, layout '{layout}'")
+
+        global_queries = {}
+        for term in options['terms']:
+            global_queries[f'case_insensitive:{term}'] = build_query(term, 'case_insensitive', layout=layout).to_dict()
+            global_queries[f'iexact:{term}'] = build_query(term, 'iexact', layout=layout).to_dict()
+            global_queries[f'prefix:{term}*'] = build_query(f'{term}*', 'wildcard', layout=layout).to_dict()
+
+        results = {}
+        for routing in options['routing']:
+            for shards in options['shards']:
+                label = f'{shards}x{routing}'
+                index = benchmark.bench_index_name(f'shards-{label}')
+                self.stdout.write(self.style.NOTICE(f"\n[*] {shards} shard(s), {routing} routing -> {index}"))
+                benchmark.create_index(es_client, index, index_body(layout, shards=shards, routing=routing))
+                try:
+                    load = benchmark.load(es_client, index, benchmark.sample_actions(rows, index, routing=routing))
+                    size = benchmark.index_size(es_client, index)
+                    self.stdout.write(
+                        f"    indexed {load['indexed']:,} docs at {load['docs_per_second']:,.0f} docs/s, "
+                        f"size {size / (1024 ** 2):.1f} MB"
+                    )
+                    latencies = benchmark.measure_queries(es_client, index, global_queries, repeat=options['repeat'])
+                    for domain in options['domains']:
+                        # Domain-scoped searches carry the routing value the search API would send
+                        query = {'bool': {'filter': [f.to_dict() for f in build_filters(domain=domain)]}}
+                        search_routing = sharding.search_routing(domain, routing)
+                        kwargs = {'routing': search_routing} if search_routing else {}
+                        latencies.update(benchmark.measure_queries(
+                            es_client, index, {f'domain:{domain}': query}, repeat=options['repeat'], **kwargs
+                        ))
+                    projected = size / max(load['indexed'], 1) * options['target_docs'] / shards
+                    results[label] = {
+                        'shards': shards,
+                        'routing': routing,
+                        'load': load,
+                        'size_bytes': size,
+                        'projected_shard_bytes': projected,
+                        'queries': latencies,
+                    }
+                finally:
+                    if not options['keep']:
+                        es_client.indices.delete(index=index, ignore_unavailable=True)
+
+        self.print_report(results, list(global_queries), [f'domain:{d}' for d in options['domains']], options['target_docs'])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'date': datetime.now().isoformat(),
+                    'sample': len(rows),
+                    'layout': layout,
+                    'processors': processors,
+                    'target_docs': options['target_docs'],
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"[+] Results saved to {options['output']}"))
+
+    def print_report(self, results, global_labels, domain_labels, target_docs):
+        self.stdout.write(self.style.SUCCESS("\n[*] SHARD LAYOUT SUMMARY (server took, ms)"))
+        rows = []
+        for label, result in results.items():
+            queries = result['queries']
+            rows.append([
+                label,
+                f"{result['load']['docs_per_second']:,.0f}",
+                f"{result['projected_shard_bytes'] / 1024 ** 3:.1f}",
+                f"{mean(queries[q]['p50'] for q in global_labels):.0f}/{mean(queries[q]['p99'] for q in global_labels):.0f}",
+                f"{mean(queries[q]['p50'] for q in domain_labels):.0f}/{mean(queries[q]['p99'] for q in domain_labels):.0f}",
+            ])
+        headers = ['Layout', 'Docs/s', f'GB/shard @ {target_docs / 1e6:.0f}M', 'Global p50/p99', 'Domain p50/p99']
+        self.stdout.write(benchmark.format_table(headers, rows))
+
+        self.stdout.write(self.style.SUCCESS("\n[*] QUERY LATENCY (server took, ms)"))
+        rows = []
+        for query_label in global_labels + domain_labels:
+            row = [query_label]
+            for result in results.values():
+                q = result['queries'][query_label]
+                row.append(f"{q['p50']:.0f}/{q['p99']:.0f}")
+            rows.append(row)
+        self.stdout.write(benchmark.format_table(['Query'] + list(results), rows))
+
+        # Recommend the fastest layout whose shards stay within the recommended size
+        candidates = {
+            label: mean(r['queries'][q]['p99'] for q in global_labels + domain_labels)
+            for label, r in results.items()
+            if r['projected_shard_bytes'] <= MAX_SHARD_BYTES
+        }
+        if candidates:
+            best = min(candidates, key=candidates.get)
+            self.stdout.write(self.style.SUCCESS(
+                f"\n[+] Recommended: {results[best]['shards']} shard(s) with {results[best]['routing']} routing "
+                f"(ES_SHARDS={results[best]['shards']} ES_ROUTING={results[best]['routing']})"
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"\n[!] Every layout exceeds {MAX_SHARD_BYTES / 1024 ** 3:.0f} GB per shard at {target_docs:,} docs; try more shards"
+            ))
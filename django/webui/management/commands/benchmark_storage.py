@@ -0,0 +1,150 @@
+from django.core.management.base import BaseCommand
+from elasticsearch_dsl import connections
+from datetime import datetime
+from webui import benchmark, partitions
+from webui.documents import INDEX_LAYOUTS, STORAGE_PROFILES, active_layout, index_body
+from webui.queries import build_filters, build_query
+import json
+
+DEFAULT_TERMS = ['admin', 'frost', 'gmail.com']
+DEFAULT_DOMAINS = ['gmail.com', 'yahoo.com']
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare storage profiles of the credential index (codec, index sorting, trimmed norms) on a "
+        "sample from Postgres: disk footprint, page-cache misses and term/prefix query latency. "
+        "With --live, report the footprint of the current credential indices instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample', type=int, default=1_000_000, help='Credentials to load per profile (default: 1M)')
+        parser.add_argument('--profiles', nargs='+', choices=sorted(STORAGE_PROFILES), default=sorted(STORAGE_PROFILES))
+        parser.add_argument('--layout', choices=sorted(INDEX_LAYOUTS), help='Mapping layout (default: ELASTICSEARCH_INDEX_LAYOUT)')
+        parser.add_argument('--terms', nargs='+', default=DEFAULT_TERMS, help='Terms for exact/prefix/suffix queries')
+        parser.add_argument('--domains', nargs='+', default=DEFAULT_DOMAINS, help='Domains for the domain filter')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query (default: 20)')
+        parser.add_argument('--seed', type=int, help='Random seed for the sample')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark indices afterwards')
+        parser.add_argument('--output', help='Write the raw results to this JSON file')
+        parser.add_argument('--live', action='store_true', help='Only report the footprint of the live credential indices')
+
+    def handle(self, *args, **options):
+        es_client = connections.get_connection()
+        if options['live']:
+            self.report_live(es_client)
+            return
+
+        layout = options['layout'] or active_layout()
+        self.stdout.write(f"[*] Sampling {options['sample']:,} credentials from Postgres")
+        rows = benchmark.sample_credentials(options['sample'], seed=options['seed'])
+        self.stdout.write(f"[*] Sampled {len(rows):,} credentials, layout '{layout}'")
+
+        queries = {}
+        for term in options['terms']:
+            queries[f'iexact:{term}'] = build_query(term, 'iexact', layout=layout).to_dict()
+            queries[f'prefix:{term}*'] = build_query(f'{term}*', 'wildcard', layout=layout).to_dict()
+            queries[f'suffix:*{term}'] = build_query(f'*{term}', 'wildcard', layout=layout).to_dict()
+        for domain in options['domains']:
+            queries[f'domain:{domain}'] = {'bool': {'filter': [f.to_dict() for f in build_filters(domain=domain)]}}
+
+        memory = benchmark.node_memory_bytes(es_client)
+        results = {}
+        for profile in options['profiles']:
+            index = benchmark.bench_index_name(f'storage-{profile}')
+            self.stdout.write(self.style.NOTICE(f"\n[*] Profile '{profile}' -> {index}"))
+            benchmark.create_index(es_client, index, index_body(layout, profile))
+            try:
+                load = benchmark.load(es_client, index, benchmark.sample_actions(rows, index))
+                size = benchmark.index_size(es_client, index)
+                self.stdout.write(
+                    f"    indexed {load['indexed']:,} docs at {load['docs_per_second']:,.0f} docs/s, "
+                    f"size {size / (1024 ** 2):.1f} MB"
+                )
+                reads_before = benchmark.node_disk_reads(es_client)
+                latencies = benchmark.measure_queries(es_client, index, queries, repeat=options['repeat'])
+                disk_reads = benchmark.node_disk_reads(es_client) - reads_before
+                results[profile] = {
+                    'load': load,
+                    'size_bytes': size,
+                    'memory_share': size / memory if memory else None,
+                    'disk_reads_per_query': disk_reads / max(len(queries) * options['repeat'], 1),
+                    'query_cache': benchmark.query_cache_stats(es_client, index),
+                    'queries': latencies,
+                }
+            finally:
+                if not options['keep']:
+                    es_client.indices.delete(index=index, ignore_unavailable=True)
+
+        self.print_report(results, list(queries))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'date': datetime.now().isoformat(),
+                    'sample': len(rows),
+                    'layout': layout,
+                    'node_memory_bytes': memory,
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"[+] Results saved to {options['output']}"))
+
+    def print_report(self, results, labels):
+        self.stdout.write(self.style.SUCCESS("\n[*] STORAGE SUMMARY"))
+        rows = []
+        for profile, result in results.items():
+            docs = max(result['load']['indexed'], 1)
+            share = result['memory_share']
+            rows.append([
+                profile,
+                f"{result['size_bytes'] / (1024 ** 2):.1f}",
+                f"{result['size_bytes'] / docs:.0f}",
+                f"{share:.1%}" if share is not None else '-',
+                f"{result['disk_reads_per_query']:.2f}",
+                f"{result['query_cache']['hit_rate']:.0%}",
+            ])
+        headers = ['Profile', 'Size (MB)', 'Bytes/doc', 'Of node RAM', 'Disk reads/query', 'Query cache hits']
+        self.stdout.write(benchmark.format_table(headers, rows))
+        self.stdout.write("    Disk reads/query near 0 means the index is served from the page cache.")
+
+        self.stdout.write(self.style.SUCCESS("\n[*] QUERY LATENCY (server took, ms)"))
+        rows = []
+        for label in labels:
+            row = [label]
+            for result in results.values():
+                q = result['queries'][label]
+                row.append(f"{q['p50']:.0f}/{q['p99']:.0f} ({q['hits']:,})")
+            rows.append(row)
+        headers = ['Query'] + [f'{profile} p50/p99 (hits)' for profile in results]
+        self.stdout.write(benchmark.format_table(headers, rows))
+
+    def report_live(self, es_client):
+        # The read alias resolves to the single index or to every partition
+        pattern = partitions.READ_ALIAS
+        index_settings = es_client.indices.get_settings(index=pattern)
+        stats = es_client.indices.stats(index=pattern, metric=['store', 'docs'])['indices']
+        memory = benchmark.node_memory_bytes(es_client)
+
+        rows = []
+        total = 0
+        for index in sorted(stats):
+            primaries = stats[index]['primaries']
+            size = primaries['store']['size_in_bytes']
+            docs = primaries['docs']['count']
+            settings = index_settings[index]['settings']['index']
+            sort_fields = settings.get('sort', {}).get('field', [])
+            if isinstance(sort_fields, str):
+                sort_fields = [sort_fields]
+            total += size
+            rows.append([
+                index,
+                f"{docs:,}",
+                f"{size / (1024 ** 2):,.1f}",
+                f"{size / docs:.0f}" if docs else '-',
+                settings.get('codec', 'default'),
+                ','.join(sort_fields) or '-',
+            ])
+        self.stdout.write(self.style.SUCCESS("[*] LIVE CREDENTIAL INDICES"))
+        self.stdout.write(benchmark.format_table(['Index', 'Docs', 'Size (MB)', 'Bytes/doc', 'Codec', 'Sort'], rows))
+        if memory:
+            self.stdout.write(f"[*] Total {total / (1024 ** 3):.2f} GB = {total / memory:.1%} of node RAM")
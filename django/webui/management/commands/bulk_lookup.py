@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from webui import bulk_lookup
+import json
+import sys
+
+
+class Command(BaseCommand):
+    help = (
+        "Look up a list of emails, usernames or domains (one per line) with batched terms queries "
+        "and multi-searches, writing one NDJSON record per input."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help="File with one value per line, '-' for stdin")
+        parser.add_argument('--field', choices=bulk_lookup.FIELDS, default='email', help='Field to look up (default: email)')
+        parser.add_argument('--partition', action='append', dest='partitions',
+                            help='Only search this index partition (can be repeated)')
+        parser.add_argument('--hits-per-input', type=int, help='Credentials returned per input (default: BULK_LOOKUP hits_per_input)')
+        parser.add_argument('--batch-size', type=int, help='Values per terms query (default: BULK_LOOKUP batch_size)')
+        parser.add_argument('--concurrency', type=int, help='Concurrent multi-searches (default: BULK_LOOKUP concurrency)')
+        parser.add_argument('--output', default='-', help="Output file, '-' for stdout (default: -)")
+
+    def handle(self, *args, **options):
+        source = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8', errors='replace')
+        with source:
+            try:
+                values = bulk_lookup.normalize(source, options['field'])
+                bulk_lookup.parse_hits_per_input(options['hits_per_input'])
+            except bulk_lookup.BulkLookupError as e:
+                raise CommandError(str(e))
+
+        to_stdout = options['output'] == '-'
+        # Progress goes to stderr when the matches themselves are written to stdout
+        log = self.stderr if to_stdout else self.stdout
+        log.write(f"[*] Looking up {len(values):,} {options['field']} values")
+
+        stats = bulk_lookup.LookupStats()
+        out = sys.stdout if to_stdout else open(options['output'], 'w', encoding='utf-8')
+        try:
+            for record in bulk_lookup.lookup(
+                values, options['field'], options['partitions'], hits_per_input=options['hits_per_input'],
+                batch_size=options['batch_size'], concurrency=options['concurrency'], stats=stats,
+            ):
+                if record['type'] == 'batch':
+                    status = f"took {record['took_ms']} ms" if record['status'] == 'success' else f"failed: {record['error']}"
+                    log.write(f"    batch {record['batch']}: {record['inputs']} inputs, "
+                              f"{record['latency_ms']} ms request latency, {status}")
+                    continue
+                out.write(json.dumps(record, default=str) + '\n')
+        finally:
+            if not to_stdout:
+                out.close()
+            else:
+                out.flush()
+
+        summary = stats.summary()
+        style = self.style.SUCCESS if not summary['errors'] else self.style.WARNING
+        log.write(style(
+            f"[+] {summary['matched_inputs']:,} of {summary['inputs']:,} inputs matched "
+            f"({summary['credentials']:,} credentials) in {summary['batches']} batches, "
+            f"{summary['errors']} failed, {summary['elapsed_time']:.1f} s"
+        ))
@@ -1,6 +1,7 @@
 from django.core.management.base import BaseCommand
 from webui.models import BreachedCredential, ScrapFile
 from elasticsearch_dsl import connections
+from webui import partitions
 from django.db import connection
 import time
 
@@ -40,7 +41,7 @@ class Command(BaseCommand):
         es_client = connections.get_connection()
         index_name = "breached_credentials"
         try:
-            if es_client.indices.exists(index=index_name):
+            if es_client.indices.exists(index=index_name) and not es_client.indices.exists_alias(name=index_name):
                 es_client.indices.delete(index=index_name)
                 self.stdout.write(
                     self.style.WARNING(f"✅ Deleted Elasticsearch index '{index_name}'.")
@@ -49,7 +50,13 @@ class Command(BaseCommand):
                 self.stdout.write(
                     self.style.WARNING(f"ℹ️ Index '{index_name}' did not exist.")
                 )
-            es_client.indices.create(index=index_name)
+            if partitions.is_enabled():
+                # Partition indices are recreated lazily on the next ingest
+                for key in partitions.list_partitions(es_client):
+                    dropped = partitions.drop_partition(es_client, key)
+                    self.stdout.write(self.style.WARNING(f"✅ Dropped partition '{key}' ({len(dropped)} indices)."))
+            else:
+                es_client.indices.create(index=index_name)
             elapsed = time.time() - start_time
             self.stdout.write(
                 self.style.SUCCESS(
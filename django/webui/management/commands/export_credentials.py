@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from webui import export
+from webui.parsing import CREDENTIAL_FIELDS
+from webui.queries import SEARCH_TYPES, build_search
+import sys
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Export every credential matching a search to NDJSON or CSV, reading a point-in-time "
+        "with parallel slices in constant memory."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('search_term', help='Term to search for')
+        parser.add_argument('--search-type', choices=SEARCH_TYPES, default='case_insensitive')
+        parser.add_argument('--field', choices=('string',) + CREDENTIAL_FIELDS, default='string',
+                            help='Field to search in (default: string)')
+        parser.add_argument('--email-only', action='store_true', help='Only credentials with an email address')
+        parser.add_argument('--domain', help='Only credentials of this email domain')
+        parser.add_argument('--partition', action='append', dest='partitions',
+                            help='Only export this index partition (can be repeated)')
+        parser.add_argument('--format', choices=export.FORMATS, default='ndjson', help='Output format (default: ndjson)')
+        parser.add_argument('--gzip', action='store_true', help='gzip the output')
+        parser.add_argument('--output', default='-', help="Output file, '-' for stdout (default: -)")
+        parser.add_argument('--slices', type=int, help='Parallel PIT slices (default: SEARCH_EXPORT slices)')
+        parser.add_argument('--page-size', type=int, help='Hits per slice request (default: SEARCH_EXPORT page_size)')
+
+    def handle(self, *args, **options):
+        search, indices, params = build_search(
+            options['search_term'], options['search_type'], options['field'],
+            options['email_only'], options['domain'], options['partitions'],
+        )
+        to_stdout = options['output'] == '-'
+        # Progress goes to stderr when the export itself is written to stdout
+        log = self.stderr if to_stdout else self.stdout
+        log.write(f"[*] Exporting '{options['search_term']}' from {', '.join(indices)} as {options['format']}")
+
+        stats = export.ExportStats()
+        chunks = export.stream(
+            search, indices, params, fmt=options['format'], compress=options['gzip'],
+            slices=options['slices'], page_size=options['page_size'], stats=stats,
+        )
+        out = sys.stdout.buffer if to_stdout else open(options['output'], 'wb')
+        last_report = time.time()
+        try:
+            for chunk in chunks:
+                out.write(chunk)
+                if time.time() - last_report >= 10:
+                    log.write(f"    {stats.docs:,} documents ({stats.rate():,.0f} docs/s)")
+                    last_report = time.time()
+        finally:
+            if not to_stdout:
+                out.close()
+            else:
+                out.flush()
+
+        target = 'stdout' if to_stdout else options['output']
+        log.write(self.style.SUCCESS(
+            f"[+] Exported {stats.docs:,} documents to {target} in {stats.finished_at - stats.started_at:.1f} s "
+            f"({stats.rate():,.0f} docs/s)"
+        ))
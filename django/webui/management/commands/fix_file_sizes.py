@@ -1,8 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.db import transaction
 from webui.models import ScrapFile
-from minio import Minio
 from django.conf import settings
+from webui import clients
 import logging
 
 class Command(BaseCommand):
@@ -17,12 +17,7 @@ class Command(BaseCommand):
         logger = logging.getLogger('fix_file_sizes')
         
         # Connect to MinIO
-        client = Minio(
-            'minio:9000',
-            access_key=settings.AWS_ACCESS_KEY_ID,
-            secret_key=settings.AWS_SECRET_ACCESS_KEY,
-            secure=False
-        )
+        client = clients.minio()
         
         # Count total files to process - only process likely incorrect files by default
         process_all = options.get('all', False)
@@ -50,7 +45,7 @@ class Command(BaseCommand):
         for i, scrap_file in enumerate(files, 1):
             try:
                 # Get stats from MinIO
-                stats = client.stat_object('breached-credentials', scrap_file.name)
+                stats = client.stat_object(settings.AWS_STORAGE_BUCKET_NAME, scrap_file.name)
                 
                 # Calculate size in MB (correctly)
                 size_in_mb = stats.size / (1024 * 1024)
@@ -1,18 +1,22 @@
 from django.core.management.base import BaseCommand
 from webui.models import ScrapFile
 from django_q.tasks import async_task
+from webui.maintenance import bulk_load_group
 
 class Command(BaseCommand):
     help = "Indexes all existing ScrapFile records to Elasticsearch."
 
     def handle(self, *args, **kwargs):
         self.stdout.write(self.style.NOTICE("Starting indexing of existing ScrapFiles..."))
-        scrap_files = ScrapFile.objects.filter(count__gt=0)  # Tylko z credentialami
-        total = scrap_files.count()
+        scrap_files = list(ScrapFile.objects.filter(count__gt=0).only('id', 'count'))  # Tylko z credentialami
+        total = len(scrap_files)
         self.stdout.write(self.style.NOTICE(f"Found {total} ScrapFiles to index"))
 
+        # The last task of the group triggers segment merging and cache warm-up (webui.maintenance)
+        group = bulk_load_group(total)
         for sf in scrap_files:
-            async_task('webui.tasks.index_breached_credential', sf.id)
+            async_task('webui.tasks.index_breached_credential', sf.id,
+                       group=group, hook='webui.maintenance.bulk_load_hook')
             self.stdout.write(self.style.SUCCESS(f"Queued ScrapFile {sf.id} with count {sf.count}"))
 
-        self.stdout.write(self.style.SUCCESS(f"Finished queuing {total} ScrapFiles for indexing"))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f"Finished queuing {total} ScrapFiles for indexing (group {group})"))
\ No newline at end of file
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
-from minio import Minio
 from django.conf import settings
+from webui import clients
 from webui.models import ScrapFile
 from webui.tasks import index_breached_credential
 import logging
@@ -17,15 +17,10 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         # Initialize MinIO client
-        client = Minio(
-            'minio:9000',
-            access_key=settings.AWS_ACCESS_KEY_ID,
-            secret_key=settings.AWS_SECRET_ACCESS_KEY,
-            secure=False
-        )
+        client = clients.minio()
 
         # Get list of directories
-        directories = [obj.object_name for obj in client.list_objects('breached-credentials')]
+        directories = [obj.object_name for obj in client.list_objects(settings.AWS_STORAGE_BUCKET_NAME)]
         
         # If specific directory is provided, only process that one
         if options['directory']:
@@ -40,7 +35,7 @@ class Command(BaseCommand):
             start_time = time.time()
             
             # Get all files in the directory
-            files = list(client.list_objects('breached-credentials', prefix=directory))
+            files = list(client.list_objects(settings.AWS_STORAGE_BUCKET_NAME, prefix=directory))
             total_files = len(files)
             logger.info(f"Found {total_files} files in {directory}")
             
@@ -0,0 +1,114 @@
+from django.core.management.base import BaseCommand, CommandError
+from elasticsearch_dsl import connections
+from webui import partitions
+
+
+class Command(BaseCommand):
+    help = "Manage rollover partitions of the credential index (list, rollover, seal, drop, retention)."
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        subparsers.add_parser('list', help='List partitions and their indices')
+        subparsers.add_parser('init', help='Install the partition index template')
+        subparsers.add_parser('adopt-legacy', help="Turn the concrete 'breached_credentials' index into a sealed partition")
+
+        rollover = subparsers.add_parser('rollover', help='Roll partitions over when their hot index is full')
+        rollover.add_argument('keys', nargs='*', help='Partition keys (default: all)')
+        rollover.add_argument('--max-docs', type=int, help='Override the max_docs condition')
+        rollover.add_argument('--max-size', help="Override the max_primary_shard_size condition (e.g. '20gb')")
+        rollover.add_argument('--force', action='store_true', help='Roll over unconditionally')
+        rollover.add_argument('--dry-run', action='store_true')
+
+        seal = subparsers.add_parser('seal', help='Make cold partition indices read-only and force-merge them')
+        seal.add_argument('--wait', action='store_true', help='Wait for force-merges to complete')
+
+        drop = subparsers.add_parser('drop', help='Delete all indices of a partition')
+        drop.add_argument('keys', nargs='+')
+
+        retention = subparsers.add_parser('retention', help='Keep only the newest N partitions')
+        retention.add_argument('--keep', type=int, required=True)
+        retention.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        if not partitions.is_enabled():
+            self.stdout.write(self.style.WARNING(
+                "[!] ELASTICSEARCH_PARTITIONING is disabled; ingest still writes to the single index"
+            ))
+        es_client = connections.get_connection()
+        getattr(self, f"handle_{options['action'].replace('-', '_')}")(es_client, options)
+
+    def handle_list(self, es_client, options):
+        found = partitions.list_partitions(es_client)
+        if not found:
+            self.stdout.write("[*] No partitions found")
+            return
+        for key, indices in sorted(found.items()):
+            total_docs = sum(i['docs'] for i in indices)
+            total_size = sum(i['size'] for i in indices) / (1024 ** 3)
+            self.stdout.write(self.style.NOTICE(f"{key}: {total_docs:,} docs, {total_size:.2f} GB"))
+            for info in indices:
+                flags = ', '.join(f for f, on in (('write', info['is_write_index']), ('sealed', info['sealed'])) if on)
+                self.stdout.write(
+                    f"  - {info['index']}: {info['docs']:,} docs, {info['size'] / (1024 ** 2):.1f} MB"
+                    + (f" [{flags}]" if flags else '')
+                )
+
+    def handle_init(self, es_client, options):
+        partitions.ensure_template(es_client)
+        self.stdout.write(self.style.SUCCESS(f"[+] Installed index template '{partitions.TEMPLATE_NAME}'"))
+
+    def handle_adopt_legacy(self, es_client, options):
+        try:
+            target = partitions.adopt_legacy_index(es_client)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"[+] Legacy index adopted as {target}"))
+
+    def handle_rollover(self, es_client, options):
+        keys = options['keys'] or sorted(partitions.list_partitions(es_client))
+        if options['force']:
+            conditions = {}
+        else:
+            conditions = dict(partitions.config()['rollover'])
+            if options['max_docs']:
+                conditions['max_docs'] = options['max_docs']
+            if options['max_size']:
+                conditions['max_primary_shard_size'] = options['max_size']
+        for key in keys:
+            response = partitions.rollover(es_client, key, conditions, dry_run=options['dry_run'])
+            if response.get('rolled_over') or (options['dry_run'] and any(response.get('conditions', {}).values())):
+                self.stdout.write(self.style.SUCCESS(
+                    f"[+] {key}: {response['old_index']} -> {response['new_index']}"
+                    + (' (dry run)' if options['dry_run'] else '')
+                ))
+            else:
+                self.stdout.write(f"[*] {key}: conditions not met, kept {response['old_index']}")
+
+    def handle_seal(self, es_client, options):
+        sealed = partitions.seal_cold(es_client, wait=options['wait'])
+        for index in sealed:
+            self.stdout.write(self.style.SUCCESS(f"[+] Sealed {index}"))
+        if not sealed:
+            self.stdout.write("[*] Nothing to seal")
+
+    def handle_drop(self, es_client, options):
+        for key in options['keys']:
+            dropped = partitions.drop_partition(es_client, key)
+            if dropped:
+                self.stdout.write(self.style.WARNING(f"[+] Dropped {key}: {', '.join(dropped)}"))
+            else:
+                self.stdout.write(f"[*] Partition {key} not found")
+
+    def handle_retention(self, es_client, options):
+        keys = sorted(k for k in partitions.list_partitions(es_client) if k != partitions.LEGACY_PARTITION)
+        expired = keys[:-options['keep']] if options['keep'] > 0 else keys
+        for key in expired:
+            if options['dry_run']:
+                self.stdout.write(f"[*] Would drop {key}")
+            else:
+                partitions.drop_partition(es_client, key)
+                self.stdout.write(self.style.WARNING(f"[+] Dropped {key}"))
+        if not expired:
+            self.stdout.write("[*] No partitions past retention")
+
@@ -0,0 +1,69 @@
+from django.core.management.base import BaseCommand
+from django_q.tasks import async_task
+from elasticsearch_dsl import connections
+from webui import benchmark, maintenance
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Show segment counts and deleted-doc ratios of the credential indices, force-merge the cold ones "
+        "one at a time, warm the caches and report query latency before and after."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only show index health and the merge plan')
+        parser.add_argument('--no-probe', action='store_true', help='Skip the before/after latency measurement')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Queue the throttled maintenance on the django-q cluster instead of running it here')
+
+    def handle(self, *args, **options):
+        es_client = connections.get_connection()
+
+        health = maintenance.index_health(es_client)
+        if not health:
+            self.stdout.write(self.style.WARNING("[!] No credential indices found"))
+            return
+        self.print_health(health)
+
+        steps = maintenance.plan(health)
+        if not steps:
+            self.stdout.write(self.style.SUCCESS("[+] Nothing to merge"))
+        for step in steps:
+            self.stdout.write(f"[*] Plan: {step['action']} {step['index']}")
+
+        if options['dry_run']:
+            return
+        if options['schedule']:
+            async_task('webui.maintenance.post_ingest_maintenance')
+            self.stdout.write(self.style.SUCCESS("[+] Queued post-ingest maintenance"))
+            return
+
+        before = {} if options['no_probe'] else maintenance.measure(es_client)
+        for step in steps:
+            start = time.time()
+            maintenance.force_merge(es_client, step, wait=True)
+            self.stdout.write(self.style.SUCCESS(f"[+] {step['action'].capitalize()} of {step['index']} took {time.time() - start:.0f} s"))
+
+        self.stdout.write("[*] Warming caches")
+        maintenance.warm_up(es_client)
+        self.print_health(maintenance.index_health(es_client))
+
+        if not options['no_probe']:
+            self.stdout.write(self.style.SUCCESS("\n[*] QUERY LATENCY"))
+            self.stdout.write(maintenance.format_report(before, maintenance.measure(es_client)))
+
+    def print_health(self, health):
+        rows = [
+            [
+                info['index'],
+                f"{info['docs']:,}",
+                f"{info['segments']:,}",
+                f"{info['segments_per_shard']:.1f}",
+                f"{info['deleted_ratio']:.1%}",
+                'sealed' if info['sealed'] else ('hot' if info['hot'] else ''),
+            ]
+            for info in health
+        ]
+        self.stdout.write(self.style.SUCCESS("\n[*] INDEX HEALTH"))
+        self.stdout.write(benchmark.format_table(['Index', 'Docs', 'Segments', 'Per shard', 'Deleted', 'State'], rows))
@@ -1,26 +1,29 @@
 from django.core.management.base import BaseCommand
-from webui.processor import process_scrap_files, BreachedCredential
+from webui import counting
+from webui.processor import process_scrap_files
 
 
 class Command(BaseCommand):
     help = "Process scrap files from MinIO and populate the database."
 
     def handle(self, *args, **kwargs):
-        initial_count = BreachedCredential.objects.count()
+        # Per-file line counts kept by the processor instead of COUNT(*) over the
+        # credentials table; they count lines read, not distinct stored credentials
+        initial_count = counting.indexed_total()
         self.stdout.write(
-            f"[*] Initial number of records in the database: {initial_count}"
+            f"[*] Initial number of lines processed across scrap files: {initial_count}"
         )
 
         self.stdout.write("[*] Starting to process scrap files...")
         process_scrap_files(force_reprocess=False)
         self.stdout.write(self.style.SUCCESS("[*] Scrap file processing completed."))
 
-        # Get the final count of records
-        final_count = BreachedCredential.objects.count()
-        self.stdout.write(f"[*] Final number of records in the database: {final_count}")
+        # Get the final line count
+        final_count = counting.indexed_total()
+        self.stdout.write(f"[*] Final number of lines processed across scrap files: {final_count}")
 
         # Print the difference
-        added_records = final_count - initial_count
+        added_lines = final_count - initial_count
         self.stdout.write(
-            self.style.SUCCESS(f"[*] Number of records added: {added_records}")
+            self.style.SUCCESS(f"[*] Number of lines processed in this run: {added_lines}")
         )
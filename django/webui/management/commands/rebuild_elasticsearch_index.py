@@ -0,0 +1,277 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from elasticsearch.helpers import streaming_bulk
+from elasticsearch_dsl import connections as es_connections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from dataclasses import dataclass, field
+from threading import Event
+from webui.documents import INDEX_LAYOUTS, STORAGE_PROFILES, active_layout, active_storage_profile, index_body
+from webui.indexing import INDEX_NAME, credential_action
+from webui import partitions, pipelines, search_cache, sharding
+from webui.models import BreachedCredential, ScrapFile
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Credential IDs are md5 hex digests, so their first four hex digits are uniformly
+# distributed and make good keyset slice boundaries.
+KEY_PREFIX_LEN = 4
+KEY_SPACE = 16 ** KEY_PREFIX_LEN
+
+
+def slice_bounds(slices: int) -> list[tuple[str | None, str | None]]:
+    """Split the md5 key space into `slices` contiguous [lo, hi) ranges."""
+    step = KEY_SPACE / slices
+    bounds = []
+    for n in range(slices):
+        lo = None if n == 0 else f"{int(n * step):0{KEY_PREFIX_LEN}x}"
+        hi = None if n == slices - 1 else f"{int((n + 1) * step):0{KEY_PREFIX_LEN}x}"
+        bounds.append((lo, hi))
+    return bounds
+
+
+def format_eta(seconds: float) -> str:
+    if seconds <= 0 or seconds == float('inf'):
+        return '--:--'
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{secs:02d}s" if hours else f"{minutes}m{secs:02d}s"
+
+
+@dataclass
+class SliceProgress:
+    number: int
+    lo: str | None
+    hi: str | None
+    expected: int
+    indexed: int = 0
+    failed: int = 0
+    last_id: str | None = None
+    started_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+
+    @property
+    def done(self) -> int:
+        return self.indexed + self.failed
+
+    def rate(self) -> float:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def eta(self) -> float:
+        if self.finished_at:
+            return 0
+        rate = self.rate()
+        remaining = max(self.expected - self.done, 0)
+        return remaining / rate if rate > 0 else float('inf')
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the Elasticsearch credential index from Postgres using parallel keyset slices. "
+        "Does not touch MinIO."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slices', type=int, default=4, help='Number of parallel keyset slices (default: 4)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Documents per bulk request (default: 5000)')
+        parser.add_argument('--fetch-size', type=int, default=10000,
+                            help='Rows fetched per round trip of the server-side cursor (default: 10000)')
+        parser.add_argument('--index',
+                            help=f"Target index (default: {INDEX_NAME}, or each file's partition when partitioning is enabled)")
+        parser.add_argument('--file-id', type=int, action='append', dest='file_ids',
+                            help='Only rebuild credentials of this ScrapFile (can be repeated)')
+        parser.add_argument('--recreate', action='store_true',
+                            help='Delete and recreate the target index with the current mapping first')
+        parser.add_argument('--layout', choices=sorted(INDEX_LAYOUTS),
+                            help='Mapping layout for a recreated index (default: ELASTICSEARCH_INDEX_LAYOUT)')
+        parser.add_argument('--storage-profile', choices=sorted(STORAGE_PROFILES),
+                            help='Storage profile for a recreated index (default: ELASTICSEARCH_STORAGE_PROFILE)')
+        parser.add_argument('--shards', type=int,
+                            help='Primary shards of a recreated index (default: ELASTICSEARCH_SHARDING)')
+        parser.add_argument('--routing', choices=sharding.ROUTING_MODES,
+                            help='Document routing, must match the index (default: ELASTICSEARCH_SHARDING)')
+        parser.add_argument('--progress-interval', type=float, default=10.0,
+                            help='Seconds between progress reports (default: 10)')
+
+    def handle(self, *args, **options):
+        slices = options['slices']
+        if slices < 1:
+            raise CommandError('--slices must be at least 1')
+
+        es_client = es_connections.get_connection()
+        index = options['index']
+        file_ids = options['file_ids']
+
+        # With partitioning, every file's credentials go to the write alias of its partition
+        targets = {}
+        if index is None and partitions.is_enabled():
+            if options['recreate']:
+                raise CommandError('--recreate cannot be used with partitioning; drop partitions with manage_partitions')
+            targets = self.partition_targets(es_client, file_ids)
+            index = partitions.READ_ALIAS
+        index = index or INDEX_NAME
+
+        if options['recreate']:
+            layout = options['layout'] or active_layout()
+            profile = options['storage_profile'] or active_storage_profile()
+            self.stdout.write(self.style.WARNING(
+                f"[*] Recreating index '{index}' with the '{layout}' layout and '{profile}' storage profile"
+            ))
+            es_client.indices.delete(index=index, ignore_unavailable=True)
+            es_client.indices.create(
+                index=index, **index_body(layout, profile, shards=options['shards'], routing=options['routing'])
+            )
+            if layout != active_layout():
+                self.stdout.write(self.style.WARNING(
+                    f"[!] Set ELASTICSEARCH_INDEX_LAYOUT='{layout}' before searching this index"
+                ))
+
+        expected_total = self.expected_rows(file_ids)
+        progress = [
+            SliceProgress(number=n + 1, lo=lo, hi=hi, expected=expected_total // slices)
+            for n, (lo, hi) in enumerate(slice_bounds(slices))
+        ]
+        self.stdout.write(
+            f"[*] Rebuilding '{index}' from Postgres: ~{expected_total:,} rows in {slices} slices"
+        )
+
+        # Installs the ingest pipeline once, before the slices start
+        options['bulk_params'] = pipelines.bulk_params(es_client)
+        original_settings = self.prepare_index(es_client, index)
+        stop = Event()
+        start_time = time.time()
+        try:
+            with ThreadPoolExecutor(max_workers=slices) as executor:
+                futures = [
+                    executor.submit(self.index_slice, es_client, index, targets, p, file_ids, options, stop)
+                    for p in progress
+                ]
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, timeout=options['progress_interval'], return_when=FIRST_EXCEPTION)
+                    self.report(progress, start_time)
+                    for future in done:
+                        if future.exception():
+                            stop.set()
+                            raise future.exception()
+        finally:
+            self.restore_index(es_client, index, original_settings)
+            search_cache.bump_generation()
+
+        indexed = sum(p.indexed for p in progress)
+        failed = sum(p.failed for p in progress)
+        elapsed = time.time() - start_time
+        rate = indexed / elapsed if elapsed > 0 else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"[+] Rebuilt '{index}': {indexed:,} documents indexed, {failed:,} failed "
+            f"in {format_eta(elapsed)} ({rate:,.0f} docs/s)"
+        ))
+
+    def partition_targets(self, es_client, file_ids) -> dict[int, str]:
+        """Map each file to the write alias of its partition, ensuring every partition once."""
+        files = ScrapFile.objects.only('id', 'name', 'added_at')
+        if file_ids:
+            files = files.filter(id__in=file_ids)
+        keys = {sf.id: partitions.partition_key(sf) for sf in files.iterator()}
+        aliases = {key: partitions.ensure_partition(es_client, key) for key in sorted(set(keys.values()))}
+        return {file_id: aliases[key] for file_id, key in keys.items()}
+
+    def expected_rows(self, file_ids) -> int:
+        """Cheap row estimate used for ETA; avoids a COUNT(*) over the whole table."""
+        if file_ids:
+            return sum(ScrapFile.objects.filter(id__in=file_ids).values_list('count', flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [BreachedCredential._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return max(row[0], 0) if row else 0
+
+    def prepare_index(self, es_client, index) -> dict:
+        """Disable refresh for the duration of the rebuild, returning the settings to restore."""
+        try:
+            current = es_client.indices.get_settings(index=index, name='index.refresh_interval')
+            original = {
+                name: body['settings'].get('index', {}).get('refresh_interval')
+                for name, body in current.items()
+            }
+            es_client.indices.put_settings(index=index, settings={'index': {'refresh_interval': '-1'}})
+            return original
+        except Exception as e:
+            logger.warning(f"Could not disable refresh on {index}: {e}")
+            return {}
+
+    def restore_index(self, es_client, index, original_settings):
+        for name, refresh_interval in original_settings.items():
+            try:
+                es_client.indices.put_settings(index=name, settings={'index': {'refresh_interval': refresh_interval}})
+            except Exception as e:
+                logger.warning(f"Could not restore refresh_interval on {name}: {e}")
+        try:
+            es_client.indices.refresh(index=index)
+        except Exception as e:
+            logger.warning(f"Could not refresh {index}: {e}")
+
+    def index_slice(self, es_client, index, targets, progress: SliceProgress, file_ids, options, stop: Event):
+        """Stream one keyset slice through a server-side cursor into the bulk indexer."""
+        queryset = BreachedCredential.objects.all()
+        if progress.lo is not None:
+            queryset = queryset.filter(id__gte=progress.lo)
+        if progress.hi is not None:
+            queryset = queryset.filter(id__lt=progress.hi)
+        if file_ids:
+            queryset = queryset.filter(file_id__in=file_ids)
+        rows = (
+            queryset.order_by('id')
+            .values_list('id', 'string', 'file_id', 'added_at')
+            .iterator(chunk_size=options['fetch_size'])
+        )
+
+        def actions():
+            for cred_id, string, file_id, added_at in rows:
+                if stop.is_set():
+                    return
+                progress.last_id = cred_id
+                yield credential_action(
+                    cred_id, string, added_at, file_id, index=targets.get(file_id, index), routing=options['routing']
+                )
+
+        try:
+            for ok, item in streaming_bulk(
+                es_client,
+                actions(),
+                chunk_size=options['chunk_size'],
+                raise_on_error=False,
+                raise_on_exception=False,
+                max_retries=3,
+                **options['bulk_params'],
+            ):
+                if ok:
+                    progress.indexed += 1
+                else:
+                    progress.failed += 1
+                    if progress.failed <= 10:
+                        logger.error(f"Slice {progress.number}: failed to index document: {item}")
+        finally:
+            progress.finished_at = time.time()
+            # Each worker thread holds its own database connection
+            connections.close_all()
+
+    def report(self, progress: list[SliceProgress], start_time: float):
+        for p in progress:
+            status = 'done' if p.finished_at else f"ETA {format_eta(p.eta())}"
+            self.stdout.write(
+                f"    slice {p.number}/{len(progress)} [{p.lo or '0000'}..{p.hi or 'ffff'}): "
+                f"{p.done:,}/~{p.expected:,} ({p.rate():,.0f} docs/s, {status})"
+            )
+        done = sum(p.done for p in progress)
+        expected = sum(p.expected for p in progress)
+        elapsed = time.time() - start_time
+        rate = done / elapsed if elapsed > 0 else 0
+        eta = (expected - done) / rate if rate > 0 else float('inf')
+        self.stdout.write(
+            f"[*] Total: {done:,}/~{expected:,} ({rate:,.0f} docs/s, ETA {format_eta(eta)})"
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from webui import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard's per-file, daily and per-source statistics rollups for every file."
+
+    def handle(self, *args, **options):
+        self.stdout.write("[*] Rebuilding statistics rollups...")
+
+        def progress(done, total):
+            if done % 100 == 0 or done == total:
+                self.stdout.write(f"    {done:,}/{total:,} files")
+
+        files = rollups.rebuild(progress)
+        self.stdout.write(self.style.SUCCESS(f"[+] Rebuilt rollups of {files:,} files"))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from webui import clients, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-file credential counts between ScrapFile.count, Postgres, Elasticsearch and MinIO, "
+        "starting with the files checked longest ago, and queue targeted repairs for the divergent ones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Files to check (default: RECONCILIATION batch_size)')
+        parser.add_argument('--file-id', type=int, action='append', dest='file_ids',
+                            help='Only check this ScrapFile (can be repeated)')
+        parser.add_argument('--repair', action='store_true', help='Queue repair tasks for divergent files')
+        parser.add_argument('--no-minio', action='store_true', help='Skip listing the MinIO bucket')
+        parser.add_argument('--schedule', action='store_true',
+                            help='Install the django-q schedule that reconciles one batch at a time')
+        parser.add_argument('--minutes', type=int, help='Schedule interval (default: RECONCILIATION interval_minutes)')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            schedule = reconcile.schedule_reconcile(options['minutes'])
+            self.stdout.write(self.style.SUCCESS(
+                f"[+] Reconciliation scheduled every {schedule.minutes} min, next run {schedule.next_run:%Y-%m-%d %H:%M}"
+            ))
+            return
+
+        result = reconcile.reconcile(
+            clients.elasticsearch(),
+            batch_size=options['batch_size'],
+            file_ids=options['file_ids'],
+            repair=options['repair'],
+            check_minio=not options['no_minio'],
+        )
+        divergent = result['divergent']
+        self.stdout.write(f"[*] Checked {result['checked']:,} files")
+        for file_id, report in sorted(divergent.items())[:50]:
+            self.stdout.write(
+                f"  - file {file_id} ({report['name']}): stored {report['stored']:,}, postgres {report['postgres']:,}, "
+                f"elasticsearch {report['elasticsearch']:,} -> {', '.join(report['problems'])}"
+            )
+        if len(divergent) > 50:
+            self.stdout.write(f"  ... and {len(divergent) - 50:,} more")
+
+        unregistered = result['unregistered']
+        if unregistered:
+            self.stdout.write(self.style.WARNING(
+                f"[!] {len(unregistered):,} MinIO objects have no ScrapFile (run process_scrap), e.g. {unregistered[0]}"
+            ))
+
+        if not divergent:
+            self.stdout.write(self.style.SUCCESS("[+] Every checked file is consistent"))
+        elif options['repair']:
+            self.stdout.write(self.style.SUCCESS(f"[+] Queued {result['queued']:,} repair tasks ({reconcile.REPAIR_GROUP})"))
+        else:
+            self.stdout.write(self.style.WARNING(f"[!] {len(divergent):,} files diverge; run again with --repair"))
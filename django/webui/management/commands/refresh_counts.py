@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from webui import counting
+
+
+class Command(BaseCommand):
+    help = "Recount the configured tables with COUNT(*) and cache the exact counts served to the dashboard and show_stats."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schedule', action='store_true',
+                            help='Install the django-q schedule that refreshes the counts in the background')
+        parser.add_argument('--minutes', type=int, help='Schedule interval (default: COUNTING refresh_minutes)')
+
+    def handle(self, *args, **options):
+        if options['schedule']:
+            schedule = counting.schedule_refresh(options['minutes'])
+            self.stdout.write(self.style.SUCCESS(
+                f"[+] Count refresh scheduled every {schedule.minutes} min, next run {schedule.next_run:%Y-%m-%d %H:%M}"
+            ))
+            return
+
+        for label in counting.config()['models']:
+            estimate = counting.estimate(label)
+            result = counting.exact(label)
+            estimated = f" (planner estimate {estimate:,})" if estimate is not None else ''
+            self.stdout.write(self.style.SUCCESS(f"[+] {label}: {result['value']:,} rows{estimated}"))
@@ -7,6 +7,8 @@ import requests
 import logging
 import csv
 import os
+from webui import partitions
+from webui.queries import build_filters, build_query, case_insensitive_pattern
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -23,6 +25,7 @@ class Command(BaseCommand):
         parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="Number of results to return")
         parser.add_argument("--all", action="store_true", help="Run all query types")
         parser.add_argument("--term", action="store_true", help="Run term query (exact match)")
+        parser.add_argument("--iexact", action="store_true", help="Run case-insensitive exact query")
         parser.add_argument("--wildcard", action="store_true", help="Run wildcard query")
         parser.add_argument("--regexp", action="store_true", help="Run regexp query")
         parser.add_argument("--match", action="store_true", help="Run match query")
@@ -30,17 +33,19 @@ class Command(BaseCommand):
         parser.add_argument("--output", help="Save results to file")
         parser.add_argument("--format", choices=["txt", "csv", "json", "md"], default="txt", 
                            help="Output format (default: txt)")
-        parser.add_argument("--field", choices=["string", "username", "password", "both"], default="string",
+        parser.add_argument("--field", choices=["string", "email", "username", "domain", "password", "url_host", "both"], default="string",
                            help="Field to search in (default: string, searches whole credential)")
         parser.add_argument("--email-only", action="store_true", help="Search only for email addresses")
         parser.add_argument("--sort", choices=["relevance", "date"], default="relevance",
                            help="Sort order for results (default: relevance)")
         parser.add_argument("--verbose", action="store_true", help="Show verbose output including query details")
         parser.add_argument("--save-results", action="store_true", help="Save actual results, not just statistics")
+        parser.add_argument("--partition", action="append", dest="partitions",
+                           help="Only search this index partition (can be repeated)")
 
     def handle(self, *args, **options):
         # If no specific query types are selected, default to --all
-        if not (options.get('all') or options.get('term') or options.get('wildcard') or 
+        if not (options.get('all') or options.get('term') or options.get('iexact') or options.get('wildcard') or 
                 options.get('regexp') or options.get('match') or options.get('case_insensitive')):
             options['all'] = True
         
@@ -54,7 +59,8 @@ class Command(BaseCommand):
         self.stdout.write(
             self.style.SUCCESS(f"[*] Starting search for '{search_term}' at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         )
-        self.stdout.write(f"[*] Index: {ELASTIC_INDEX}")
+        index = ",".join(partitions.search_indices(options.get('partitions')))
+        self.stdout.write(f"[*] Index: {index}")
         
         if verbose:
             self.stdout.write(f"[*] Search field: {field}")
@@ -62,7 +68,7 @@ class Command(BaseCommand):
             self.stdout.write(f"[*] Sort order: {sort_order}")
         
         # Get Elasticsearch URL from settings
-        es_url = f"{settings.ELASTICSEARCH_DSL['default']['hosts']}/{ELASTIC_INDEX}/_search"
+        es_url = f"{settings.ELASTICSEARCH_DSL['default']['hosts']}/{index}/_search"
         
         results = []
         all_hits = {}
@@ -76,28 +82,28 @@ class Command(BaseCommand):
             results.append(("Term", count, elapsed))
             all_hits["Term"] = hits
         
+        if options['all'] or options['iexact']:
+            count, elapsed, hits = self.run_query(
+                es_url, self.iexact_query(search_term, size, field, email_only, sort_order),
+                "IEXACT QUERY (case-insensitive exact match)",
+                verbose
+            )
+            results.append(("Iexact", count, elapsed))
+            all_hits["Iexact"] = hits
+        
         if options['all'] or options['wildcard']:
             count, elapsed, hits = self.run_query(
-                es_url, self.wildcard_query(f"*{search_term}*", size, field, email_only, sort_order), 
-                "WILDCARD QUERY (*term*)",
+                es_url, self.wildcard_query(search_term, size, field, email_only, sort_order), 
+                "WILDCARD QUERY (*term*, or the given pattern)",
                 verbose
             )
             results.append(("Wildcard", count, elapsed))
             all_hits["Wildcard"] = hits
         
         if options['all'] or options['regexp']:
-            # Create a case-insensitive regexp pattern
-            pattern = ".*"
-            for char in search_term:
-                if char.isalpha():
-                    pattern += f"[{char.lower()}{char.upper()}]"
-                else:
-                    pattern += char
-            pattern += ".*"
-            
             count, elapsed, hits = self.run_query(
-                es_url, self.regexp_query(pattern, size, field, email_only, sort_order),
-                f"REGEXP QUERY (case-insensitive: {pattern})",
+                es_url, self.regexp_query(search_term, size, field, email_only, sort_order),
+                f"REGEXP QUERY (case-insensitive: {case_insensitive_pattern(search_term)})",
                 verbose
             )
             results.append(("Regexp", count, elapsed))
@@ -115,7 +121,7 @@ class Command(BaseCommand):
         if options['all'] or options['case_insensitive']:
             count, elapsed, hits = self.run_query(
                 es_url, self.case_insensitive_query(search_term, size, field, email_only, sort_order),
-                "CASE-INSENSITIVE QUERY (bool/should with wildcards)",
+                "CASE-INSENSITIVE QUERY (ngram match, prefix/suffix patterns rewritten)",
                 verbose
             )
             results.append(("Case-insensitive", count, elapsed))
@@ -311,24 +317,10 @@ class Command(BaseCommand):
         # Start with the base query
         query_dict = {"size": size, "track_total_hits": True}
         
-        # Add field-specific filtering if needed
-        if field != "string" or email_only:
-            # If we're searching a specific part of the credential
-            if field == "username":
-                base_query = {"bool": {"must": [base_query], "filter": {"regexp": {"string": "^[^:]+:"}}}}
-            elif field == "password":
-                base_query = {"bool": {"must": [base_query], "filter": {"regexp": {"string": ":.+"}}}}
-            
-            # Add email filter if requested
-            if email_only:
-                email_filter = {"regexp": {"string": "[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}"}}
-                if "bool" in base_query:
-                    if "filter" in base_query["bool"]:
-                        base_query["bool"]["filter"] = [base_query["bool"]["filter"], email_filter]
-                    else:
-                        base_query["bool"]["filter"] = email_filter
-                else:
-                    base_query = {"bool": {"must": [base_query], "filter": email_filter}}
+        # Field and email filters are exists filters on the parsed credential fields
+        filters = [f.to_dict() for f in build_filters(field, email_only)]
+        if filters:
+            base_query = {"bool": {"must": [base_query], "filter": filters}}
         
         # Add the query to the query dictionary
         query_dict["query"] = base_query
@@ -340,30 +332,31 @@ class Command(BaseCommand):
         return json.dumps(query_dict)
 
     def term_query(self, term, size=DEFAULT_SIZE, field="string", email_only=False, sort_order="relevance"):
-        """Create term query using keyword field for exact matches."""
-        base_query = {"term": {"string.keyword": term}}
+        """Create term query for exact matches."""
+        base_query = build_query(term, "exact", field=field).to_dict()
+        return self._build_query_with_options(base_query, size, field, email_only, sort_order)
+
+    def iexact_query(self, term, size=DEFAULT_SIZE, field="string", email_only=False, sort_order="relevance"):
+        """Create case-insensitive exact query: a term query on the lowercase keyword subfield."""
+        base_query = build_query(term, "iexact", field=field).to_dict()
         return self._build_query_with_options(base_query, size, field, email_only, sort_order)
 
     def wildcard_query(self, pattern, size=DEFAULT_SIZE, field="string", email_only=False, sort_order="relevance"):
-        """Create wildcard query with caching for improved performance."""
-        query_dict = {
-            "wildcard": {"string.keyword": pattern},
-            "_cache": True
-        }
-        return self._build_query_with_options(query_dict, size, field, email_only, sort_order)
+        """Create wildcard query; prefix and suffix patterns are rewritten to prefix queries."""
+        base_query = build_query(pattern, "wildcard", field=field).to_dict()
+        return self._build_query_with_options(base_query, size, field, email_only, sort_order)
 
-    def regexp_query(self, pattern, size=DEFAULT_SIZE, field="string", email_only=False, sort_order="relevance"):
-        """Create regexp query - if possible, prefer using analyzed fields instead."""
-        base_query = {"regexp": {"string.keyword": pattern}}
+    def regexp_query(self, term, size=DEFAULT_SIZE, field="string", email_only=False, sort_order="relevance"):
+        """Create case-insensitive regexp query matching the term anywhere in the credential."""
+        base_query = build_query(term, "regexp", field=field).to_dict()
         return self._build_query_with_options(base_query, size, field, email_only, sort_order)
 
     def match_query(self, text, size=DEFAULT_SIZE, field="string", email_only=False, sort_order="relevance"):
-        """Create match query using the analyzed field for better performance."""
-        base_query = {"match": {"string.analyzed": text}}
+        """Create match query on the analyzed field."""
+        base_query = build_query(text, "match", field=field).to_dict()
         return self._build_query_with_options(base_query, size, field, email_only, sort_order)
 
     def case_insensitive_query(self, term, size=DEFAULT_SIZE, field="string", email_only=False, sort_order="relevance"):
-        """Create case-insensitive query using the optimized analyzed field."""
-        # Using the string.analyzed field with the credential_analyzer for better performance
-        base_query = {"match": {"string.analyzed": term}}
+        """Create the default case-insensitive query used by the search API."""
+        base_query = build_query(term, "case_insensitive", field=field).to_dict()
         return self._build_query_with_options(base_query, size, field, email_only, sort_order)
@@ -2,31 +2,28 @@ from django.core.management.base import BaseCommand
 from django.db.models import Count, Sum, Avg
 from django.db.models.functions import TruncDate
 from webui.models import BreachedCredential, ScrapFile
-from elasticsearch import Elasticsearch
-from minio import Minio
+from webui import clients, counting
 from django.conf import settings
 import re
 
 class Command(BaseCommand):
     help = 'Show statistics about indexed credentials and files'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--count', choices=counting.MODES, default='cached',
+                            help="Credential count: planner estimate, cached exact count (default) or COUNT(*) now")
+
     def get_minio_size(self, file_name):
         try:
-            client = Minio(
-                'minio:9000',
-                access_key=settings.AWS_ACCESS_KEY_ID,
-                secret_key=settings.AWS_SECRET_ACCESS_KEY,
-                secure=False
-            )
             # Get the size in bytes and convert to MB
-            obj = client.stat_object('breached-credentials', file_name)
+            obj = clients.minio().stat_object(settings.AWS_STORAGE_BUCKET_NAME, file_name)
             return obj.size / (1024 * 1024)  # Convert bytes to MB
         except Exception as e:
             return 0
 
     def handle(self, *args, **options):
         # Database stats
-        total_credentials = BreachedCredential.objects.count()
+        credentials = counting.count(BreachedCredential, options['count'])
         total_files = ScrapFile.objects.count()
         active_files = ScrapFile.objects.filter(is_active=True).count()
         
@@ -41,7 +38,12 @@ class Command(BaseCommand):
 
         # Output statistics
         self.stdout.write('\n=== CTI Statistics ===')
-        self.stdout.write(f'Total credentials in DB: {total_credentials:,}')
+        if credentials['exact']:
+            self.stdout.write(f"Total credentials in DB: {credentials['value']:,} (counted {credentials['counted_at']})")
+        elif credentials['value'] is None:
+            self.stdout.write("Total credentials in DB: unknown (table not analyzed yet, use --count exact)")
+        else:
+            self.stdout.write(f"Total credentials in DB: ~{credentials['value']:,} (planner estimate)")
         self.stdout.write(f'Total files: {total_files:,} (Active: {active_files:,})')
         
         self.stdout.write('\nMost recent files:')
@@ -56,7 +58,7 @@ class Command(BaseCommand):
 
         # Elasticsearch stats
         try:
-            es = Elasticsearch('http://elastic:9200')
+            es = clients.elasticsearch()
             es_stats = es.indices.stats()
             total_indexed = es_stats['_all']['total']['docs']['count'] if es.indices.exists(index='credentials') else 0
             self.stdout.write(f'\nTotal documents indexed in Elasticsearch: {total_indexed:,}')
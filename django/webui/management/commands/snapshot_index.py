@@ -0,0 +1,121 @@
+from django.core.management.base import BaseCommand, CommandError
+from elasticsearch_dsl import connections
+from webui import partitions, snapshots
+import time
+
+
+class Command(BaseCommand):
+    help = "Snapshot and restore the credential index through a shared-filesystem repository."
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        register = subparsers.add_parser('register', help='Register the fs snapshot repository')
+        register.add_argument('--location', help='Repository directory, must be in path.repo (default: ELASTICSEARCH_SNAPSHOTS)')
+
+        create = subparsers.add_parser('create', help='Take an (incremental) snapshot now')
+        create.add_argument('--name', help='Snapshot name (default: credentials-<timestamp>)')
+        create.add_argument('--wait', action='store_true', help='Wait for the snapshot to complete')
+
+        subparsers.add_parser('list', help='List snapshots of the credential index')
+
+        prune = subparsers.add_parser('prune', help='Keep only the newest N successful snapshots')
+        prune.add_argument('--keep', type=int, help='Snapshots to keep (default: ELASTICSEARCH_SNAPSHOTS keep)')
+        prune.add_argument('--dry-run', action='store_true')
+
+        schedule = subparsers.add_parser('schedule', help='Install the django-q schedule for incremental snapshots')
+        schedule.add_argument('--hours', type=int, help='Interval in hours (default: ELASTICSEARCH_SNAPSHOTS interval_hours)')
+
+        restore = subparsers.add_parser('restore', help='Restore a snapshot and verify it against Postgres')
+        restore.add_argument('name', nargs='?', help='Snapshot to restore (default: the latest successful one)')
+        restore.add_argument('--replace', action='store_true', help='Delete existing credential indices first')
+        restore.add_argument('--no-verify', action='store_true', help='Skip the per-file doc count check')
+
+        subparsers.add_parser('verify', help='Compare per-file doc counts in Elasticsearch with Postgres')
+
+    def handle(self, *args, **options):
+        es_client = connections.get_connection()
+        getattr(self, f"handle_{options['action']}")(es_client, options)
+
+    def handle_register(self, es_client, options):
+        repository = snapshots.register_repository(es_client, location=options['location'])
+        self.stdout.write(self.style.SUCCESS(
+            f"[+] Registered repository '{snapshots.config()['repository']}' at {repository['settings']['location']}"
+        ))
+
+    def handle_create(self, es_client, options):
+        start = time.time()
+        snapshot = snapshots.create_snapshot(es_client, name=options['name'], wait=options['wait'])
+        if not options['wait']:
+            self.stdout.write(self.style.SUCCESS(f"[+] Started snapshot {snapshot['snapshot']}"))
+            return
+        shards = snapshot.get('shards', {})
+        self.stdout.write(self.style.SUCCESS(
+            f"[+] Snapshot {snapshot['snapshot']} {snapshot.get('state', '')} in {time.time() - start:.0f} s "
+            f"({shards.get('successful', 0)}/{shards.get('total', 0)} shards)"
+        ))
+
+    def handle_list(self, es_client, options):
+        found = snapshots.list_snapshots(es_client)
+        if not found:
+            self.stdout.write("[*] No snapshots found")
+            return
+        for snap in found:
+            postgres = snap.get('metadata', {}).get('postgres', {})
+            duration = snap.get('duration_in_millis', 0) / 1000
+            self.stdout.write(
+                f"  - {snap['snapshot']}: {snap['state']}, {len(snap.get('indices', []))} indices, "
+                f"{duration:.0f} s, {postgres.get('credentials', 0):,} credentials in Postgres"
+            )
+
+    def handle_prune(self, es_client, options):
+        doomed = snapshots.prune(es_client, keep=options['keep'], dry_run=options['dry_run'])
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        for name in doomed:
+            self.stdout.write(f"[*] {verb} {name}")
+        self.stdout.write(self.style.SUCCESS(f"[+] {verb} {len(doomed)} snapshots"))
+
+    def handle_schedule(self, es_client, options):
+        schedule = snapshots.schedule_snapshots(options['hours'])
+        self.stdout.write(self.style.SUCCESS(
+            f"[+] Snapshots scheduled every {schedule.minutes // 60} h, next run {schedule.next_run:%Y-%m-%d %H:%M}"
+        ))
+
+    def handle_restore(self, es_client, options):
+        name = options['name']
+        if name is None:
+            latest = snapshots.latest_snapshot(es_client)
+            if latest is None:
+                raise CommandError('No successful snapshot to restore')
+            name = latest['snapshot']
+
+        self.stdout.write(self.style.WARNING(f"[*] Restoring {name}"))
+        start = time.time()
+        try:
+            result = snapshots.restore(es_client, name, replace=options['replace'])
+        except Exception as e:
+            raise CommandError(f"Restore failed: {e} (use --replace to overwrite existing indices)")
+        shards = result.get('shards', {})
+        self.stdout.write(self.style.SUCCESS(
+            f"[+] Restored {len(result.get('indices', []))} indices in {time.time() - start:.0f} s "
+            f"({shards.get('successful', 0)}/{shards.get('total', 0)} shards)"
+        ))
+        if not options['no_verify']:
+            self.handle_verify(es_client, options)
+
+    def handle_verify(self, es_client, options):
+        es_client.indices.refresh(index=partitions.READ_ALIAS)
+        report = snapshots.verify(es_client)
+        self.stdout.write(
+            f"[*] Postgres: {report['postgres']:,} credentials in {report['files']:,} files, "
+            f"Elasticsearch: {report['elasticsearch']:,}"
+        )
+        mismatched = report['mismatched']
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS("[+] Every file matches Postgres"))
+            return
+        self.stdout.write(self.style.WARNING(f"[!] {len(mismatched):,} files differ from Postgres:"))
+        for file_id, counts in sorted(mismatched.items())[:50]:
+            self.stdout.write(f"  - file {file_id}: postgres {counts['postgres']:,}, elasticsearch {counts['elasticsearch']:,}")
+        file_args = ' '.join(f'--file-id {file_id}' for file_id in sorted(mismatched)[:50])
+        self.stdout.write(f"[*] Re-index them with: python manage.py rebuild_elasticsearch_index {file_args}")
@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from webui import clients, watchlist
+from webui.models import Watch, WatchMatch
+import sys
+
+
+class Command(BaseCommand):
+    help = "Manage watchlist entries matched against new credentials at ingest time (add, remove, list, sync, test, notify)."
+
+    def add_arguments(self, parser):
+        subparsers = parser.add_subparsers(dest='action', required=True)
+
+        add = subparsers.add_parser('add', help='Watch a domain, email, URL host or keyword pattern')
+        add.add_argument('name', help='Customer or label of the watch')
+        add.add_argument('kind', choices=[kind for kind, _ in Watch.KINDS])
+        add.add_argument('values', nargs='+')
+
+        remove = subparsers.add_parser('remove', help='Delete watches by id')
+        remove.add_argument('ids', nargs='+', type=int)
+
+        subparsers.add_parser('list', help='List watches and their match counts')
+        subparsers.add_parser('sync', help='Rebuild the percolator index from the active watches')
+
+        test = subparsers.add_parser('test', help='Percolate sample lines and send any matches to the notifier')
+        test.add_argument('lines', nargs='*', help="Credential lines (default: read from stdin)")
+
+        subparsers.add_parser('notify', help='Send pending matches to the notifier')
+
+    def handle(self, *args, **options):
+        getattr(self, f"handle_{options['action']}")(options)
+
+    def handle_add(self, options):
+        for value in options['values']:
+            watch, created = Watch.objects.get_or_create(name=options['name'], kind=options['kind'], value=value.strip())
+            if not created and not watch.is_active:
+                watch.is_active = True
+                watch.save()
+            self.stdout.write(self.style.SUCCESS(f"[+] Watch {watch.pk}: {watch}"))
+
+    def handle_remove(self, options):
+        for watch in Watch.objects.filter(pk__in=options['ids']):
+            watch.delete()
+            self.stdout.write(self.style.SUCCESS(f"[+] Removed watch {watch}"))
+
+    def handle_list(self, options):
+        watches = Watch.objects.order_by('name', 'kind', 'value')
+        if not watches:
+            self.stdout.write("[*] No watches")
+            return
+        for watch in watches:
+            matches = WatchMatch.objects.filter(watch=watch)
+            pending = matches.filter(notified_at__isnull=True).count()
+            flags = '' if watch.is_active else ' [inactive]'
+            self.stdout.write(f"  {watch.pk}: {watch}{flags} - {matches.count():,} matches, {pending:,} pending")
+
+    def handle_sync(self, options):
+        count = watchlist.sync_all(clients.elasticsearch())
+        self.stdout.write(self.style.SUCCESS(f"[+] Registered {count} active watches in '{watchlist.config()['index']}'"))
+
+    def handle_test(self, options):
+        lines = options['lines'] or [line.rstrip('\n') for line in sys.stdin if line.strip()]
+        if not lines:
+            raise CommandError("No lines to test")
+        matches = watchlist.percolate(clients.elasticsearch(), lines)
+        if not matches:
+            self.stdout.write("[*] No watch matches these lines")
+            return
+        watches = Watch.objects.in_bulk(list(matches))
+        payload = [
+            {'watch': watches[watch_id].name, 'kind': watches[watch_id].kind, 'value': watches[watch_id].value,
+             'credential_id': None, 'string': lines[slot], 'file_id': None, 'matched_at': None}
+            for watch_id, slots in matches.items() if watch_id in watches
+            for slot in slots
+        ]
+        notifier = watchlist.config()['notifier']
+        import_string(notifier)(payload)
+        self.stdout.write(self.style.SUCCESS(f"[+] Sent {len(payload)} test matches to {notifier}"))
+
+    def handle_notify(self, options):
+        sent = watchlist.notify_pending()
+        self.stdout.write(self.style.SUCCESS(f"[+] Sent {sent} pending matches"))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.20 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("webui", "0007_alter_breachedcredential_id"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scrapfile",
+            name="reconciled_at",
+            field=models.DateTimeField(
+                blank=True,
+                db_index=True,
+                help_text="When the counts in Postgres, Elasticsearch and MinIO last matched (see webui/reconcile.py)",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-19 02:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0008_scrapfile_reconciled_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Watch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='Customer or label the watch belongs to', max_length=128)),
+                ('kind', models.CharField(choices=[('domain', 'Email domain'), ('email', 'Email address'), ('url_host', 'URL host'), ('keyword', 'Keyword pattern')], max_length=16)),
+                ('value', models.CharField(help_text='Matched case-insensitively; keywords match anywhere in the line and may use * and ?', max_length=256)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WatchMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('credential_id', models.CharField(max_length=32)),
+                ('string', models.CharField(max_length=1024)),
+                ('matched_at', models.DateTimeField(auto_now_add=True)),
+                ('notified_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('file', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='watch_matches', to='webui.scrapfile')),
+                ('watch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='webui.watch')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='watch',
+            constraint=models.UniqueConstraint(fields=('kind', 'value', 'name'), name='unique_watch'),
+        ),
+        migrations.AddConstraint(
+            model_name='watchmatch',
+            constraint=models.UniqueConstraint(fields=('watch', 'credential_id'), name='unique_watch_match'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-19 03:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('webui', '0009_watch_watchmatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('credentials', models.BigIntegerField(default=0)),
+                ('files', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SourceStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=256, unique=True)),
+                ('files', models.IntegerField(default=0)),
+                ('credentials', models.BigIntegerField(default=0)),
+                ('last_added_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FileDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('credentials', models.BigIntegerField(default=0)),
+                ('file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='webui.scrapfile')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='filedailystat',
+            constraint=models.UniqueConstraint(fields=('file', 'day'), name='unique_file_day'),
+        ),
+    ]
@@ -2,13 +2,13 @@ import hashlib
 from django.db import models, transaction
 from django.conf import settings
 from django.core.validators import MinValueValidator
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save, pre_delete
 from django.dispatch import receiver
 from django.db.models import ProtectedError, QuerySet
 from django.utils.functional import cached_property
 from typing import Optional
-from minio import Minio
-from core.settings import AWS_S3_ENDPOINT_URL, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_STORAGE_BUCKET_NAME
+from core.settings import AWS_STORAGE_BUCKET_NAME
+from webui import clients
 import logging
 import time
 
@@ -40,15 +40,16 @@ class ScrapFile(models.Model):
     )
     count = models.IntegerField(default=0, help_text="Number of associated BreachedCredentials")
     is_active = models.BooleanField(default=True)
+    reconciled_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        db_index=True,
+        help_text="When the counts in Postgres, Elasticsearch and MinIO last matched (see webui/reconcile.py)",
+    )
 
     def _calculate_sha256(self) -> str:
         """Calculate the SHA-256 hash of the file content by streaming from MinIO."""
-        client = Minio(
-            AWS_S3_ENDPOINT_URL,
-            access_key=AWS_ACCESS_KEY_ID,
-            secret_key=AWS_SECRET_ACCESS_KEY,
-            secure=False,
-        )
+        client = clients.minio()
         try:
             response = client.get_object(AWS_STORAGE_BUCKET_NAME, self.name)
             # Get file size in MB
@@ -60,6 +61,7 @@ class ScrapFile(models.Model):
                 sha256_hash.update(chunk)
             hash_value = sha256_hash.hexdigest()
             response.close()
+            response.release_conn()
             return hash_value
         except Exception as e:
             logger.error(f"Error calculating SHA-256 for {self.name} from MinIO: {e}")
@@ -127,6 +129,11 @@ def calculate_sha256(sender, instance, created, **kwargs):
             instance.sha256 = "hash_calculation_failed"  # Placeholder
             instance.save(update_fields=["sha256"])
 
+@receiver([post_save, post_delete], sender=ScrapFile)
+def invalidate_file_cache(sender, instance, **kwargs):
+    from webui import file_cache
+    file_cache.invalidate(instance.pk)
+
 class BreachedCredential(models.Model):
     """
     Main model of the CTI. Records of the breaches are stored here.
@@ -165,4 +172,120 @@ class BreachedCredential(models.Model):
         return self.string  # Display email:password in admin
 
     class Meta:
-        pass
\ No newline at end of file
+        pass
+
+class Watch(models.Model):
+    """
+    A watchlist entry: a domain, email, URL host or keyword pattern to alert on.
+
+    Active watches are stored as percolator queries (see webui/watchlist.py), so every
+    newly indexed credential is matched against them at ingest time.
+
+    Example:
+        Watch.objects.create(name="ACME", kind=Watch.DOMAIN, value="acme.com")
+    """
+
+    DOMAIN = "domain"
+    EMAIL = "email"
+    URL_HOST = "url_host"
+    KEYWORD = "keyword"
+    KINDS = [
+        (DOMAIN, "Email domain"),
+        (EMAIL, "Email address"),
+        (URL_HOST, "URL host"),
+        (KEYWORD, "Keyword pattern"),
+    ]
+
+    name = models.CharField(max_length=128, help_text="Customer or label the watch belongs to")
+    kind = models.CharField(max_length=16, choices=KINDS)
+    value = models.CharField(
+        max_length=256,
+        help_text="Matched case-insensitively; keywords match anywhere in the line and may use * and ?",
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.kind} {self.value}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "value", "name"], name="unique_watch"),
+        ]
+
+
+class WatchMatch(models.Model):
+    """A credential that matched a watch when it was indexed."""
+
+    watch = models.ForeignKey("Watch", on_delete=models.CASCADE, related_name="matches")
+    # Not a foreign key: matches are recorded by the ingest writer next to the bulk insert
+    credential_id = models.CharField(max_length=32)
+    string = models.CharField(max_length=1024)
+    file = models.ForeignKey("ScrapFile", on_delete=models.CASCADE, related_name="watch_matches", null=True)
+    matched_at = models.DateTimeField(auto_now_add=True)
+    notified_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.watch}: {self.string}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["watch", "credential_id"], name="unique_watch_match"),
+        ]
+
+
+@receiver(post_save, sender=Watch)
+@receiver(post_delete, sender=Watch)
+def sync_watch(sender, instance, **kwargs):
+    from webui import watchlist
+    try:
+        watchlist.sync_watch(instance, deleted=kwargs.get("signal") is post_delete)
+    except Exception as e:
+        # `watchlist sync` re-registers every active watch
+        logger.error(f"Failed to sync watch {instance.pk} to the percolator index: {e}")
+
+
+class FileDailyStat(models.Model):
+    """Credentials of one file added on one day; the per-file rollup (see webui/rollups.py)."""
+
+    file = models.ForeignKey("ScrapFile", on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField(db_index=True)
+    credentials = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["file", "day"], name="unique_file_day"),
+        ]
+
+
+class DailyStat(models.Model):
+    """Credentials and files added per day, summed from FileDailyStat."""
+
+    day = models.DateField(unique=True)
+    credentials = models.BigIntegerField(default=0)
+    files = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.day}: {self.credentials} credentials"
+
+
+class SourceStat(models.Model):
+    """Files and credentials per top-level MinIO prefix, summed from FileDailyStat."""
+
+    source = models.CharField(max_length=256, unique=True)
+    files = models.IntegerField(default=0)
+    credentials = models.BigIntegerField(default=0)
+    last_added_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source}: {self.credentials} credentials"
+
+
+@receiver(pre_delete, sender=ScrapFile)
+def refresh_rollups_on_delete(sender, instance, **kwargs):
+    from webui import rollups
+    # The file's FileDailyStat rows are deleted with it; recount its days and source afterwards
+    days = list(instance.daily_stats.values_list("day", flat=True))
+    transaction.on_commit(lambda: rollups.queue_refresh(days, [rollups.source_of(instance.name)]))
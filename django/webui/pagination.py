@@ -0,0 +1,176 @@
+"""
+Server-side pagination of credential searches.
+
+Shallow pages (up to `shallow_limit` hits deep) use `from`/`size`. Past that, the search
+switches to a point-in-time (PIT) with `search_after`: the first deep page opens a PIT
+and is fetched once more with `from` inside it, and every following page continues from
+the sort values of the previous page's last hit, so it costs the same as the first page.
+
+Clients only see an opaque `next_cursor` that carries the offset or the PIT id and sort
+values, bound to the query it was issued for.
+
+The HTML list view pages with `SearchPaginator`, a Django paginator over a search whose
+pages are single from/size requests.
+"""
+from django.conf import settings
+from django.core.paginator import InvalidPage, PageNotAnInteger, Paginator
+from django.utils.functional import cached_property
+import base64
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'shallow_limit': 1000,
+    'max_per_page': 500,
+    'keep_alive': '2m',
+}
+# index.max_result_window: the deepest `from + size` Elasticsearch accepts
+MAX_RESULT_WINDOW = 10000
+# Search parameters Elasticsearch rejects together with a PIT; they are applied when opening it
+PIT_PARAMS = ('routing', 'preference')
+
+
+class CursorError(ValueError):
+    """An invalid, foreign or too deep pagination request."""
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'SEARCH_PAGINATION', {})}
+
+
+def fingerprint(search, indices: list[str], sort_order: str) -> str:
+    """Identity of a search without its pagination, so a cursor only continues its own query."""
+    body = {k: v for k, v in search.to_dict().items() if k not in ('from', 'size', 'sort', 'pit', 'search_after')}
+    identity = json.dumps([body, indices, sort_order], sort_keys=True, default=str)
+    return hashlib.sha256(identity.encode()).hexdigest()[:16]
+
+
+def encode_cursor(state: dict, query: str) -> str:
+    payload = json.dumps({**state, 'q': query}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str, query: str) -> dict:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise CursorError('Malformed cursor')
+    if not isinstance(state, dict) or state.pop('q', None) != query:
+        raise CursorError('Cursor belongs to a different search')
+    return state
+
+
+def page_state(page: int, per_page: int) -> dict:
+    """State of a `page` request; numbered pages only reach `shallow_limit`."""
+    offset = (page - 1) * per_page
+    if page < 1 or offset + per_page > config()['shallow_limit']:
+        raise CursorError(f"page is limited to the first {config()['shallow_limit']} hits; follow next_cursor instead")
+    return {'offset': offset}
+
+
+def sort_clause(sort_order: str) -> list:
+    """Sort of PIT pages; `_shard_doc` breaks ties so `search_after` never skips or repeats hits."""
+    primary = {'added_at': {'order': 'desc'}} if sort_order == 'date' else '_score'
+    return [primary, {'_shard_doc': 'asc'}]
+
+
+def apply(es_client, search, state: dict, per_page: int, sort_order: str, indices: list[str], params: dict):
+    """
+    Return `(search, params, state)` for the requested page.
+
+    Opens a PIT (stored in the returned state) when the offset passes `shallow_limit`.
+    """
+    cfg = config()
+    if 'pit' not in state:
+        offset = state.get('offset', 0)
+        if offset + per_page <= cfg['shallow_limit']:
+            return search[offset:offset + per_page], params, state
+        if offset + per_page > MAX_RESULT_WINDOW:
+            raise CursorError('Cursor offset is too deep')
+        pit = es_client.open_point_in_time(
+            index=','.join(indices),
+            keep_alive=cfg['keep_alive'],
+            **{name: params[name] for name in PIT_PARAMS if name in params},
+        )
+        state = {'pit': pit['id'], 'offset': offset}
+
+    pit_params = {name: value for name, value in params.items() if name not in PIT_PARAMS}
+    # PIT searches must not name indices
+    search = search.index().sort(*sort_clause(sort_order)).extra(
+        pit={'id': state['pit'], 'keep_alive': cfg['keep_alive']},
+        size=per_page,
+    )
+    if 'after' in state:
+        search = search.extra(search_after=state['after'])
+    else:
+        search = search.extra(from_=state['offset'])
+    return search, pit_params, state
+
+
+def next_state(es_client, state: dict, per_page: int, returned: int, total: int,
+               last_sort: list | None, pit_id: str | None) -> dict | None:
+    """State of the following page, or None (closing the PIT) when this was the last one."""
+    if 'pit' not in state:
+        offset = state.get('offset', 0) + per_page
+        return {'offset': offset} if offset < total else None
+    if returned < per_page or not last_sort:
+        close(es_client, pit_id or state['pit'])
+        return None
+    return {'pit': pit_id or state['pit'], 'after': last_sort}
+
+
+def close(es_client, pit_id: str) -> None:
+    try:
+        es_client.close_point_in_time(id=pit_id)
+    except Exception as e:
+        # The PIT expires with its keep_alive anyway
+        logger.debug(f"Could not close point in time: {e}")
+
+
+class SearchPaginator(Paginator):
+    """
+    Paginator over an elasticsearch_dsl Search.
+
+    `page()` runs one from/size search for the requested page and takes the count from
+    its hit total, so no separate count query is needed. `hydrate` turns the response
+    into the page's objects. Pages are limited to `index.max_result_window`. With
+    `orphans`, each search fetches that many extra hits so a short last page can be
+    folded into the one before it.
+    """
+
+    def __init__(self, search, per_page, hydrate=None, **kwargs):
+        super().__init__(search, per_page, **kwargs)
+        self.hydrate = hydrate or (lambda response: list(response))
+        self.total = None
+        self.total_is_lower_bound = False
+
+    def _set_total(self, total) -> None:
+        self.total = total.value
+        self.total_is_lower_bound = total.relation == 'gte'
+        self.__dict__['count'] = min(self.total, MAX_RESULT_WINDOW)
+
+    @cached_property
+    def count(self):
+        # Only reached before page(), e.g. for `page=last`
+        self._set_total(self.object_list.extra(size=0).execute().hits.total)
+        return self.__dict__['count']
+
+    def page(self, number):
+        try:
+            requested = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        bottom = max(requested - 1, 0) * self.per_page
+        if bottom + self.per_page > MAX_RESULT_WINDOW:
+            raise InvalidPage(f'Only the first {MAX_RESULT_WINDOW} results can be paged')
+        response = self.object_list[bottom:min(bottom + self.per_page + self.orphans, MAX_RESULT_WINDOW)].execute()
+        self._set_total(response.hits.total)
+        number = self.validate_number(requested)
+        objects = self.hydrate(response)
+        if bottom + self.per_page + self.orphans < self.count:
+            # Not the last page: the orphan look-ahead belongs to the next one
+            objects = objects[:self.per_page]
+        return self._get_page(objects, number, self)
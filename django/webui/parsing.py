@@ -0,0 +1,75 @@
+"""
+Parsing of raw combo-list lines into structured credential fields.
+
+Pure functions without Django dependencies, so they can run in worker processes.
+"""
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+EMAIL_RE = re.compile(r'^[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}$')
+URL_RE = re.compile(r'^(?:[a-z][a-z0-9+.-]*://)([^/:\s]+)(?::\d+)?(?:/[^\s:]*)?[:|;\s]', re.IGNORECASE)
+SEPARATORS = (':', ';', '|')
+
+CREDENTIAL_FIELDS = ('email', 'username', 'domain', 'password', 'url_host')
+
+
+def line_splitter(line: str, max_length: int = 1024) -> list[str]:
+    """Split a line into multiple strings if longer than max_length, based on the most frequent separator."""
+    if len(line) <= max_length:
+        return [line]
+    separators = ['https:\\\\', '\\\\', '::', ':', ';', ',', '\r\n', '\n', '\\r\\n']
+    sep_count = {s: line.count(s) for s in separators}
+    max_separator = max(sep_count, key=sep_count.get)
+    split_lines = [s.strip() for s in line.split(max_separator) if s.strip()]
+    logger.debug(f"Split {len(line)} chars into {len(split_lines)} parts using '{max_separator}'")
+    return [s[:max_length] for s in split_lines if len(s) > 0]
+
+
+def clean_string(s: str) -> str:
+    """Clean a string by removing NULL characters and other problematic characters."""
+    # Remove NULL characters and other control characters
+    s = ''.join(char for char in s if ord(char) >= 32 or char in '\n\r\t')
+    # Remove any remaining NULL bytes
+    s = s.replace('\x00', '')
+    # Remove any other problematic characters
+    s = s.encode('ascii', 'ignore').decode('ascii')
+    return s.strip()
+
+
+def parse_credential(line: str) -> dict:
+    """
+    Split a combo-list line into email, username, domain, password and url_host.
+
+    Handles the common layouts `login:password`, `login;password`, `login|password` and
+    `https://host/path:login:password`. The login is an email address or a plain username.
+    Only fields that could be extracted are returned.
+    """
+    parsed = {}
+    rest = line.strip()
+
+    url_match = URL_RE.match(rest)
+    if url_match:
+        parsed['url_host'] = url_match.group(1).lower()
+        rest = rest[url_match.end():]
+
+    separator = next((s for s in SEPARATORS if s in rest), None)
+    if separator is None:
+        login, password = rest, ''
+    else:
+        login, password = rest.split(separator, 1)
+    login = login.strip()
+    password = password.strip()
+
+    if login:
+        if EMAIL_RE.match(login):
+            local, domain = login.rsplit('@', 1)
+            parsed['email'] = login.lower()
+            parsed['username'] = local
+            parsed['domain'] = domain.lower()
+        elif separator is not None:
+            parsed['username'] = login
+    if password:
+        parsed['password'] = password
+    return parsed
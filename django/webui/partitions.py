@@ -0,0 +1,302 @@
+"""
+Rollover partitioning of the credential index.
+
+When `ELASTICSEARCH_PARTITIONING['enabled']` is set, credentials are no longer written
+to a single `breached_credentials` index. Each partition (an ingest period such as
+`2025.05`, or a top-level MinIO source prefix) gets its own rollover series:
+
+    breached_credentials-<key>-000001, breached_credentials-<key>-000002, ...
+
+Every index of every series carries the `breached_credentials` read alias (through an
+index template), so existing searches keep working unchanged, while each series has a
+`breached_credentials-<key>-write` alias pointing at its small hot index. Indices that
+have been rolled over are sealed (write-blocked and force-merged), and retention is a
+matter of dropping a partition's indices.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from webui.documents import index_body
+from webui.indexing import INDEX_NAME
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+READ_ALIAS = INDEX_NAME
+TEMPLATE_NAME = f'{INDEX_NAME}-partitions'
+INDEX_PATTERN = f'{INDEX_NAME}-*'
+LEGACY_PARTITION = 'legacy'
+
+DEFAULTS = {
+    'enabled': False,
+    'strategy': 'period',
+    'period_format': '%Y.%m',
+    'rollover': {'max_docs': 20_000_000, 'max_primary_shard_size': '20gb'},
+    'max_num_segments': 1,
+    # Seconds a partition (or the single index) counts as being ingested into after its last
+    # write_target/touch_ingest
+    'ingest_lease': 900,
+    'cache': 'default',
+}
+
+# Partition keys whose write alias is known to exist in this process
+_known_partitions: set[str] = set()
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'ELASTICSEARCH_PARTITIONING', {})}
+
+
+def is_enabled() -> bool:
+    return bool(config()['enabled'])
+
+
+def source_prefix(name: str) -> str:
+    """Top-level MinIO prefix of an object name ('root' for objects at the bucket root)."""
+    return name.split('/', 1)[0] if '/' in name else 'root'
+
+
+def partition_key(scrap_file) -> str:
+    """Return the partition a ScrapFile's credentials belong to."""
+    conf = config()
+    if conf['strategy'] == 'source':
+        raw = source_prefix(scrap_file.name)
+    else:
+        raw = scrap_file.added_at.strftime(conf['period_format'])
+    return _sanitize(raw)
+
+
+def current_period_key() -> str | None:
+    """Return the partition key new files are written to under the period strategy."""
+    conf = config()
+    if conf['strategy'] != 'period':
+        return None
+    return _sanitize(timezone.now().strftime(conf['period_format']))
+
+
+def _sanitize(raw: str) -> str:
+    # Index names must be lowercase and may not contain most punctuation
+    key = re.sub(r'[^a-z0-9._]+', '_', raw.lower()).strip('_.')
+    return key or 'default'
+
+
+def write_alias(key: str) -> str:
+    return f'{INDEX_NAME}-{key}-write'
+
+
+def partition_pattern(key: str) -> str:
+    return f'{INDEX_NAME}-{key}-*'
+
+
+def key_from_index(index: str) -> str | None:
+    """Extract the partition key from a concrete partition index name."""
+    match = re.fullmatch(rf'{re.escape(INDEX_NAME)}-(.+)-\d{{6}}', index)
+    return match.group(1) if match else None
+
+
+def _lease_key(key: str) -> str:
+    return f'partitions:ingesting:{key}'
+
+
+def touch_ingest(key: str) -> None:
+    """Mark a partition as being ingested into for the next `ingest_lease` seconds."""
+    conf = config()
+    caches[conf['cache']].set(_lease_key(key), timezone.now().isoformat(), timeout=conf['ingest_lease'])
+
+
+def ingesting_keys(keys) -> set[str]:
+    """The partitions among `keys` with an ingest in progress (a live lease)."""
+    leases = caches[config()['cache']].get_many([_lease_key(key) for key in keys])
+    return {key for key in keys if _lease_key(key) in leases}
+
+
+def ensure_template(es_client) -> None:
+    """Install the index template that gives every partition the mapping and read alias."""
+    body = index_body()
+    es_client.indices.put_index_template(
+        name=TEMPLATE_NAME,
+        index_patterns=[INDEX_PATTERN],
+        template={
+            'settings': body.get('settings', {}),
+            'mappings': body.get('mappings', {}),
+            'aliases': {READ_ALIAS: {}},
+        },
+        priority=100,
+    )
+
+
+def ensure_partition(es_client, key: str) -> str:
+    """Create the first index of a partition's rollover series if needed, returning its write alias."""
+    alias = write_alias(key)
+    if key in _known_partitions:
+        return alias
+    if not es_client.indices.exists_alias(name=alias):
+        ensure_template(es_client)
+        index = f'{INDEX_NAME}-{key}-000001'
+        try:
+            es_client.indices.create(index=index, aliases={alias: {'is_write_index': True}})
+            logger.info(f"Created partition index {index} with write alias {alias}")
+        except Exception as e:
+            # Another worker may have created it concurrently
+            if not es_client.indices.exists_alias(name=alias):
+                raise
+            logger.debug(f"Partition {key} created concurrently: {e}")
+    _known_partitions.add(key)
+    return alias
+
+
+def ingest_key(scrap_file) -> str:
+    """Lease key of a ScrapFile's ingest: its partition, or the single index without partitioning."""
+    return partition_key(scrap_file) if is_enabled() else INDEX_NAME
+
+
+def write_target(es_client, scrap_file) -> str:
+    """
+    Return the index or alias a ScrapFile's credentials should be written to.
+
+    The partition (or the single index) is leased for the ingest (see `touch_ingest`) so
+    it is not sealed or force-merged underneath the writer, and a sealed write index
+    (e.g. when an old file is re-indexed into a past period) is unsealed first.
+    """
+    key = ingest_key(scrap_file)
+    touch_ingest(key)
+    if not is_enabled():
+        return INDEX_NAME
+    alias = ensure_partition(es_client, key)
+    unseal_write_index(es_client, alias)
+    return alias
+
+
+def search_indices(keys=None) -> list[str]:
+    """Return the indices a search should target, optionally restricted to some partitions."""
+    if not keys or not is_enabled():
+        return [READ_ALIAS]
+    return [partition_pattern(key) for key in keys]
+
+
+def list_partitions(es_client) -> dict[str, list[dict]]:
+    """Return every partition with its indices, doc counts, sizes and write state."""
+    partitions: dict[str, list[dict]] = {}
+    if not es_client.indices.exists(index=INDEX_PATTERN, allow_no_indices=False):
+        return partitions
+    aliases = es_client.indices.get_alias(index=INDEX_PATTERN)
+    rows = es_client.cat.indices(index=INDEX_PATTERN, format='json', bytes='b')
+    blocks = es_client.indices.get_settings(index=INDEX_PATTERN, name='index.blocks.write')
+    for row in rows:
+        index = row['index']
+        key = key_from_index(index)
+        if key is None:
+            continue
+        index_aliases = aliases.get(index, {}).get('aliases', {})
+        is_write = index_aliases.get(write_alias(key), {}).get('is_write_index', False)
+        write_block = blocks.get(index, {}).get('settings', {}).get('index', {}).get('blocks', {}).get('write')
+        partitions.setdefault(key, []).append({
+            'index': index,
+            'docs': int(row.get('docs.count') or 0),
+            'size': int(row.get('store.size') or 0),
+            'is_write_index': is_write,
+            'sealed': str(write_block).lower() == 'true',
+        })
+    for indices in partitions.values():
+        indices.sort(key=lambda i: i['index'])
+    return partitions
+
+
+def rollover(es_client, key: str, conditions: dict | None = None, dry_run: bool = False) -> dict:
+    """Roll a partition's write alias over when it meets the configured conditions."""
+    conditions = conditions if conditions is not None else config()['rollover']
+    response = es_client.indices.rollover(alias=write_alias(key), conditions=conditions, dry_run=dry_run)
+    if response.get('rolled_over') and not dry_run:
+        logger.info(f"Rolled over {response['old_index']} -> {response['new_index']}")
+        seal_index(es_client, response['old_index'])
+    return response
+
+
+def seal_index(es_client, index: str, wait: bool = False) -> None:
+    """Make a cold index read-only and force-merge it down to few segments."""
+    es_client.indices.put_settings(index=index, settings={'index': {'blocks': {'write': True}}})
+    es_client.indices.forcemerge(
+        index=index,
+        max_num_segments=config()['max_num_segments'],
+        wait_for_completion=wait,
+    )
+    logger.info(f"Sealed partition index {index}")
+
+
+def unseal_write_index(es_client, alias: str) -> None:
+    """Lift the write block of the index behind a write alias if it was sealed."""
+    blocks = es_client.indices.get_settings(index=alias, name='index.blocks.write')
+    for index, body in blocks.items():
+        write_block = body.get('settings', {}).get('index', {}).get('blocks', {}).get('write')
+        if str(write_block).lower() == 'true':
+            es_client.indices.put_settings(index=index, settings={'index': {'blocks': {'write': False}}})
+            logger.warning(f"Unsealed partition index {index} to write to it again")
+
+
+def seal_cold(es_client, exclude_keys=(), wait: bool = False) -> list[str]:
+    """
+    Seal every partition index that is not a current write index.
+
+    The current period and partitions with an ingest in progress keep their write index open.
+    """
+    sealed = []
+    partitions = list_partitions(es_client)
+    exclude_keys = set(exclude_keys) | ingesting_keys(list(partitions))
+    current_key = current_period_key()
+    if current_key:
+        exclude_keys.add(current_key)
+    for key, indices in partitions.items():
+        for info in indices:
+            if info['sealed']:
+                continue
+            if info['is_write_index'] and key in exclude_keys:
+                continue
+            if info['is_write_index'] and config()['strategy'] != 'period':
+                continue
+            seal_index(es_client, info['index'], wait=wait)
+            sealed.append(info['index'])
+    return sealed
+
+
+def after_ingest(es_client, scrap_file) -> None:
+    """Housekeeping after a file was indexed: roll over a full hot index, seal past periods."""
+    if not is_enabled():
+        return
+    key = partition_key(scrap_file)
+    try:
+        rollover(es_client, key)
+        if config()['strategy'] == 'period':
+            seal_cold(es_client, exclude_keys={key})
+    except Exception as e:
+        logger.warning(f"Partition maintenance for {key} failed: {e}")
+
+
+def drop_partition(es_client, key: str) -> list[str]:
+    """Delete all indices of a partition. This is how retention is applied."""
+    indices = [info['index'] for info in list_partitions(es_client).get(key, [])]
+    if indices:
+        es_client.indices.delete(index=','.join(indices))
+        logger.info(f"Dropped partition {key}: {indices}")
+    _known_partitions.discard(key)
+    return indices
+
+
+def adopt_legacy_index(es_client) -> str:
+    """
+    Turn a pre-partitioning concrete `breached_credentials` index into a sealed partition.
+
+    The index is cloned (hard-linked segments, no reindex) into
+    `breached_credentials-legacy-000001`, after which the original is deleted so its name
+    can become the read alias.
+    """
+    if es_client.indices.exists_alias(name=READ_ALIAS) or not es_client.indices.exists(index=READ_ALIAS):
+        raise ValueError(f"'{READ_ALIAS}' is not a concrete index; nothing to adopt")
+    ensure_template(es_client)
+    target = f'{INDEX_NAME}-{LEGACY_PARTITION}-000001'
+    es_client.indices.put_settings(index=READ_ALIAS, settings={'index': {'blocks': {'write': True}}})
+    es_client.indices.clone(index=READ_ALIAS, target=target, wait_for_active_shards='all')
+    es_client.cluster.health(index=target, wait_for_status='yellow', timeout='120s')
+    es_client.indices.delete(index=READ_ALIAS)
+    es_client.indices.update_aliases(actions=[{'add': {'index': target, 'alias': READ_ALIAS}}])
+    return target
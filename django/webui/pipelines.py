@@ -0,0 +1,135 @@
+"""
+Server-side extraction of the parsed credential fields with an Elasticsearch ingest pipeline.
+
+With `ELASTICSEARCH_INGEST_PIPELINE['enabled']` set, writers ship only the raw line
+(`string`, `added_at`, `file_id`) and every bulk request names the `credential-fields`
+pipeline, which derives `url_host`, `email`, `username`, `domain` and `password` on the
+ingest node with grok and painless processors. The processors mirror
+`webui.parsing.parse_credential`; `parity()` checks both produce the same fields.
+"""
+from django.conf import settings
+from webui.parsing import CREDENTIAL_FIELDS, SEPARATORS, parse_credential
+import logging
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_NAME = 'credential-fields'
+PIPELINE_VERSION = 1
+
+# Split `_rest` on the first separator of SEPARATORS that occurs in it (same priority as
+# parse_credential) into `_login` and `password`.
+SPLIT_SCRIPT = """
+String rest = ctx._rest == null ? '' : ctx._rest.trim();
+String sep = null;
+for (String s : params.separators) {
+  if (rest.indexOf(s) >= 0) { sep = s; break; }
+}
+String login = rest;
+String password = '';
+if (sep != null) {
+  int i = rest.indexOf(sep);
+  login = rest.substring(0, i);
+  password = rest.substring(i + sep.length());
+}
+ctx._login = login.trim();
+password = password.trim();
+if (password.length() > 0) { ctx.password = password; }
+ctx._has_sep = sep != null;
+"""
+
+FINALIZE_SCRIPT = """
+if (ctx.domain != null) {
+  ctx.email = ctx._login.toLowerCase();
+  ctx.domain = ctx.domain.toLowerCase();
+} else if (ctx._has_sep && ctx._login.length() > 0) {
+  ctx.username = ctx._login;
+}
+"""
+
+
+def config() -> dict:
+    return {'enabled': False, **getattr(settings, 'ELASTICSEARCH_INGEST_PIPELINE', {})}
+
+
+def is_enabled() -> bool:
+    return bool(config()['enabled'])
+
+
+def pipeline_body() -> dict:
+    return {
+        'description': 'Extract url_host, email, username, domain and password from raw credential lines',
+        'version': PIPELINE_VERSION,
+        'processors': [
+            {'set': {'field': '_rest', 'copy_from': 'string'}},
+            {'grok': {
+                'field': '_rest',
+                'patterns': [r'^\s*%{CRED_SCHEME}://%{CRED_HOST:url_host}(?::[0-9]+)?(?:/%{CRED_PATH})?[:|;\s]%{GREEDYDATA:_rest}$'],
+                'pattern_definitions': {
+                    'CRED_SCHEME': r'[a-zA-Z][a-zA-Z0-9+.-]*',
+                    'CRED_HOST': r'[^/:\s]+',
+                    'CRED_PATH': r'[^\s:]*',
+                },
+                'ignore_failure': True,
+            }},
+            {'lowercase': {'field': 'url_host', 'ignore_missing': True}},
+            {'script': {'lang': 'painless', 'source': SPLIT_SCRIPT, 'params': {'separators': list(SEPARATORS)}}},
+            {'grok': {
+                'field': '_login',
+                'patterns': ['^%{CRED_LOCAL:username}@%{CRED_DOMAIN:domain}$'],
+                'pattern_definitions': {
+                    'CRED_LOCAL': r'[A-Za-z0-9._%+-]+',
+                    'CRED_DOMAIN': r'[A-Za-z0-9.-]+\.[A-Za-z]{2,}',
+                },
+                'ignore_missing': True,
+                'ignore_failure': True,
+            }},
+            {'script': {'lang': 'painless', 'source': FINALIZE_SCRIPT}},
+            {'remove': {'field': ['_rest', '_login', '_has_sep'], 'ignore_missing': True}},
+        ],
+    }
+
+
+# Whether the pipeline has been installed by this process
+_installed = False
+
+
+def ensure_pipeline(es_client, force: bool = False) -> None:
+    """Install or update the ingest pipeline (once per process)."""
+    global _installed
+    if _installed and not force:
+        return
+    es_client.ingest.put_pipeline(id=PIPELINE_NAME, **pipeline_body())
+    _installed = True
+    logger.info(f"Installed ingest pipeline {PIPELINE_NAME} v{PIPELINE_VERSION}")
+
+
+def bulk_params(es_client=None) -> dict:
+    """Extra bulk request parameters for the configured mode (installs the pipeline if needed)."""
+    if not is_enabled():
+        return {}
+    if es_client is not None:
+        ensure_pipeline(es_client)
+    return {'pipeline': PIPELINE_NAME}
+
+
+def simulate(es_client, lines: list[str]) -> list[dict]:
+    """Run lines through the pipeline without indexing and return the extracted fields."""
+    response = es_client.ingest.simulate(
+        pipeline=pipeline_body(),
+        docs=[{'_source': {'string': line}} for line in lines],
+    )
+    results = []
+    for doc in response['docs']:
+        source = doc.get('doc', {}).get('_source', {})
+        results.append({field: source[field] for field in CREDENTIAL_FIELDS if field in source})
+    return results
+
+
+def parity(es_client, lines: list[str]) -> list[dict]:
+    """Lines for which the pipeline and parse_credential disagree."""
+    mismatches = []
+    for line, extracted in zip(lines, simulate(es_client, lines)):
+        expected = parse_credential(line)
+        if extracted != expected:
+            mismatches.append({'string': line, 'python': expected, 'pipeline': extracted})
+    return mismatches
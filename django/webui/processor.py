@@ -1,8 +1,8 @@
-from core.settings import AWS_STORAGE_BUCKET_NAME, AWS_S3_ENDPOINT_URL, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY
+from core.settings import AWS_STORAGE_BUCKET_NAME
 from django.db import transaction, IntegrityError
 from django.core.exceptions import ValidationError
 from webui.models import ScrapFile, BreachedCredential
-from minio import Minio
+from webui import clients
 from minio.error import S3Error
 from minio.datatypes import Object
 import hashlib
@@ -76,7 +76,7 @@ class SkipFileException(Exception):
 
 def process_scrap_files(force_reprocess: bool = False, batch_size: int = 1000) -> None:
     print("[*] Running process_scrap_files...")
-    client = Minio(AWS_S3_ENDPOINT_URL, access_key=AWS_ACCESS_KEY_ID, secret_key=AWS_SECRET_ACCESS_KEY, secure=False)
+    client = clients.minio()
     bucket_name = AWS_STORAGE_BUCKET_NAME
     lines_total = 0
 
@@ -152,8 +152,12 @@ def process_scrap_files(force_reprocess: bool = False, batch_size: int = 1000) -
                 print(f"[*] Speed: {speed_mb_s:.2f} MB/s for {object_key} ({processed_size_mb:.2f} MB in {elapsed_time:.2f} s) - Skipped")
                 print(f"[*] First 5 lines of {object_key}: {[f'{line[:50]}... ({len(line)} chars)' for line in first_five_lines[:5]]}")
                 response.close()
+                response.release_conn()
                 continue
 
+            response.close()
+            response.release_conn()
+
             # Reset hasher i ponownie przetwarzaj plik
             hasher = hashlib.sha256()
             response = client.get_object(bucket_name, object_key)
@@ -265,6 +269,7 @@ def process_scrap_files(force_reprocess: bool = False, batch_size: int = 1000) -
                 print(f"[***] Failed to queue Elasticsearch indexing: {e}")
 
             response.close()
+            response.release_conn()
             elapsed_time = time.time() - start_time
             processed_size_mb = obj.size / (1024 ** 2)
             speed_mb_s = processed_size_mb / elapsed_time if elapsed_time > 0 else 0.0
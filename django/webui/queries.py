@@ -0,0 +1,165 @@
+"""
+Elasticsearch query construction for credential searches.
+
+Shared by the JSON search API, the search command and the benchmarks so every entry
+point builds the same query for a given search type and index layout.
+"""
+from django.conf import settings
+from elasticsearch_dsl import Q
+from elasticsearch_dsl.query import Query
+from webui import partitions, sharding
+from webui.documents import BreachedCredentialDocument, active_layout
+from webui.parsing import CREDENTIAL_FIELDS
+
+SEARCH_TYPES = ('case_insensitive', 'exact', 'iexact', 'wildcard', 'regexp', 'match')
+
+
+def case_insensitive_pattern(query: str) -> str:
+    """Expand a term into a regexp matching it in any letter case (ngram layout only)."""
+    pattern = ".*"
+    for char in query:
+        if char.isalpha():
+            pattern += f"[{char.lower()}{char.upper()}]"
+        else:
+            pattern += char
+    pattern += ".*"
+    return pattern
+
+
+def rewrite_query(query: str, search_type: str) -> Query | None:
+    """
+    Rewrite the most common analyst queries into cheap term/prefix lookups.
+
+    - `iexact`: case-insensitive exact match -> term on the lowercase keyword
+    - `*@company.com`: suffix pattern -> prefix on the reversed subfield
+    - `admin*`: prefix pattern -> prefix on the lowercase keyword
+
+    Returns None when the query needs the layout's general-purpose path.
+    """
+    if search_type == 'iexact':
+        return Q('term', **{'string.lower': query.lower()})
+    if search_type not in ('case_insensitive', 'wildcard') or '?' in query or query.count('*') != 1:
+        return None
+    if len(query) > 1 and query.startswith('*'):
+        return Q('prefix', **{'string.reversed': query[1:].lower()[::-1]})
+    if len(query) > 1 and query.endswith('*'):
+        return Q('prefix', **{'string.lower': query[:-1].lower()})
+    return None
+
+
+def infix_pattern(query: str) -> str:
+    """Wrap a plain term as `*term*`; explicit wildcard patterns are used as given."""
+    return query if '*' in query or '?' in query else f'*{query}*'
+
+
+def build_query(query: str, search_type: str = 'case_insensitive', layout: str | None = None,
+                field: str = 'string') -> Query:
+    """Return the query for `search_type` against an index with the given mapping layout."""
+    if field in CREDENTIAL_FIELDS:
+        return field_query(query, search_type, field)
+    rewritten = rewrite_query(query, search_type)
+    if rewritten is not None:
+        return rewritten
+    layout = layout or active_layout()
+    if layout == 'wildcard':
+        return _wildcard_layout_query(query, search_type)
+    return _ngram_layout_query(query, search_type)
+
+
+def _ngram_layout_query(query: str, search_type: str) -> Query:
+    if search_type == 'exact':
+        # Term query - exact match
+        return Q('term', string=query)
+    if search_type == 'wildcard':
+        # Wildcard search that matches any string containing the query. `string` holds
+        # lowercased tokens, so the pattern is lowercased too.
+        return Q('wildcard', string={'value': infix_pattern(query).lower()})
+    if search_type == 'regexp':
+        return Q('regexp', string={'value': case_insensitive_pattern(query)})
+    if search_type == 'match':
+        # Standard match query
+        return Q('match', string=query)
+    inner = query.strip('*')
+    if '*' in inner or '?' in inner:
+        # Explicit patterns that could not be rewritten run against the whole lowercased value
+        return Q('wildcard', **{'string.lower': {'value': query.lower()}})
+    # Default case-insensitive (infix) search using ngram field
+    return Q('match', **{'string.ngram': inner})
+
+
+def _wildcard_layout_query(query: str, search_type: str) -> Query:
+    # `string` is a wildcard-type field: infix and regexp queries run against its
+    # 3-gram index and are verified on the stored value, so no case expansion is needed.
+    if search_type == 'exact':
+        return Q('term', **{'string.keyword': query})
+    if search_type == 'regexp':
+        return Q('regexp', string={'value': f'.*{query}.*', 'case_insensitive': True})
+    if search_type == 'match':
+        return Q('match', string=query)
+    # wildcard and the default case-insensitive search are both infix matches
+    return Q('wildcard', string={'value': infix_pattern(query), 'case_insensitive': True})
+
+
+def field_query(query: str, search_type: str, field: str) -> Query:
+    """
+    Query one of the parsed credential keyword fields.
+
+    Keyword fields other than `password` carry a lowercase normalizer, so term and
+    prefix lookups on them are already case-insensitive.
+    """
+    case_insensitive = field == 'password' and search_type != 'exact'
+    options = {'case_insensitive': True} if case_insensitive else {}
+    if field != 'password':
+        query = query.lower()
+    if search_type in ('exact', 'iexact', 'match'):
+        return Q('term', **{field: {'value': query, **options}})
+    pattern = query if search_type == 'wildcard' or '*' in query or '?' in query else f'*{query}*'
+    if pattern.count('*') == 1 and pattern.endswith('*') and '?' not in pattern:
+        return Q('prefix', **{field: {'value': pattern[:-1], **options}})
+    if search_type == 'regexp':
+        return Q('regexp', **{field: {'value': f'.*{query}.*', 'case_insensitive': True}})
+    return Q('wildcard', **{field: {'value': infix_pattern(pattern), **options}})
+
+
+def build_filters(field: str = 'string', email_only: bool = False, domain: str | None = None) -> list[Query]:
+    """
+    Return the cacheable filters for the search options.
+
+    `field=username|password|...` requires the credential to have that part and
+    `email_only` requires a parsed email; both are `exists` filters on keyword fields.
+    """
+    filters = []
+    if field in CREDENTIAL_FIELDS:
+        filters.append(Q('exists', field=field))
+    if email_only:
+        filters.append(Q('exists', field='email'))
+    if domain:
+        filters.append(Q('term', domain=domain.lower()))
+    return filters
+
+
+def build_search(query: str, search_type: str = 'case_insensitive', field: str = 'string', email_only: bool = False,
+                 domain: str | None = None, partition_keys=None):
+    """
+    Return `(search, indices, params)` for a search API request.
+
+    An empty `query` matches every credential, so listings only apply the filters.
+    `params` are the ELASTICSEARCH_SEARCH_PARAMS plus shard routing for domain-scoped
+    searches. Sorting and pagination are left to the caller.
+    """
+    indices = partitions.search_indices(partition_keys)
+    search = BreachedCredentialDocument.search(index=indices)
+    if query:
+        search = search.query(build_query(query, search_type, field=field))
+
+    # Field, email and domain filters run as cacheable exists/term filters on the parsed fields
+    for search_filter in build_filters(field, email_only, domain):
+        search = search.filter(search_filter)
+
+    params = dict(getattr(settings, 'ELASTICSEARCH_SEARCH_PARAMS', {}))
+    # Domain-scoped searches only need the shard(s) owning the domain
+    scoped_domain = domain or (query if field == 'domain' and search_type in ('exact', 'iexact', 'match') else None)
+    routing = sharding.search_routing(scoped_domain)
+    if routing:
+        params['routing'] = routing
+    return search, indices, params
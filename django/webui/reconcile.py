@@ -0,0 +1,254 @@
+"""
+Per-file consistency checks between Postgres, Elasticsearch and MinIO.
+
+Each ScrapFile is checked on its own instead of comparing table-wide totals:
+
+- `ScrapFile.count` against the file's rows in `BreachedCredential`, counted with a
+  grouped `COUNT(file_id)` that Postgres answers from the foreign key index,
+- the Postgres count against a `terms` aggregation on `file_id` in Elasticsearch,
+- the file against the MinIO object list (objects that vanished, or were never registered).
+
+Runs are incremental: every run checks the files that were never reconciled or diverged
+last time first, then the ones reconciled longest ago, and stamps `reconciled_at` on the
+files that match. Divergent files are repaired by targeted django-q tasks: the stored
+count is corrected, a file missing from Elasticsearch is re-indexed from Postgres and a
+file with no rows at all is ingested again from MinIO.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Count, F
+from django.utils import timezone
+from django_q.models import Schedule
+from django_q.tasks import async_task
+from elasticsearch.helpers import streaming_bulk
+from webui import clients, partitions, pipelines, rollups, search_cache
+from webui.indexing import credential_action
+from webui.maintenance import ingest_pending
+from webui.models import BreachedCredential, ScrapFile
+import logging
+
+logger = logging.getLogger(__name__)
+
+REPAIR_GROUP = 'reconcile-repairs'
+DEFAULTS = {
+    'batch_size': 500,
+    'interval_minutes': 60,
+    'repair': True,
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'RECONCILIATION', {})}
+
+
+def pending_files(batch_size: int | None = None, file_ids=None):
+    """The next files to check: never reconciled (or divergent) first, then the stalest."""
+    files = ScrapFile.objects.filter(is_active=True).only('id', 'name', 'count')
+    if file_ids:
+        return files.filter(id__in=file_ids)
+    files = files.order_by(F('reconciled_at').asc(nulls_first=True), 'id')
+    return files[:batch_size or config()['batch_size']]
+
+
+def postgres_counts(file_ids) -> dict[int, int]:
+    """Credential rows per file; counting `file_id` keeps the plan an index-only scan."""
+    rows = (
+        BreachedCredential.objects.filter(file_id__in=file_ids)
+        .order_by()
+        .values('file_id')
+        .annotate(rows=Count('file_id'))
+        .values_list('file_id', 'rows')
+    )
+    return dict(rows)
+
+
+def elasticsearch_counts(es_client, file_ids) -> dict[int, int]:
+    """Indexed documents per file, from one `terms` aggregation over the requested files."""
+    file_ids = list(file_ids)
+    if not file_ids:
+        return {}
+    response = es_client.search(
+        index=partitions.READ_ALIAS,
+        size=0,
+        query={'terms': {'file_id': file_ids}},
+        aggs={'files': {'terms': {'field': 'file_id', 'size': len(file_ids)}}},
+    )
+    return {bucket['key']: bucket['doc_count'] for bucket in response['aggregations']['files']['buckets']}
+
+
+def minio_objects() -> set[str]:
+    """Names of all objects in the credentials bucket (one listing per run)."""
+    return {obj.object_name for obj in clients.minio().list_objects(settings.AWS_STORAGE_BUCKET_NAME, recursive=True)}
+
+
+def diagnose(scrap_file, pg_count: int, es_count: int, in_minio: bool | None = None) -> list[str]:
+    """
+    Problems of one file, as repair kinds:
+
+    `count` (ScrapFile.count is stale), `elasticsearch` (index differs from Postgres),
+    `ingest` (the file had credentials but Postgres has none left) and `missing_object`
+    (the MinIO object is gone, which cannot be repaired here).
+    """
+    problems = []
+    if in_minio is False:
+        problems.append('missing_object')
+    if scrap_file.count != pg_count:
+        problems.append('count')
+    if pg_count == 0 and scrap_file.count > 0 and in_minio is not False:
+        problems.append('ingest')
+    elif es_count != pg_count:
+        problems.append('elasticsearch')
+    return problems
+
+
+def check_files(es_client, files, objects: set[str] | None = None) -> dict[int, dict]:
+    """
+    Compare the given files across the stores and stamp `reconciled_at` on the ones that match.
+
+    Returns the divergent files keyed by id. Without `objects` the MinIO check is skipped.
+    """
+    files = list(files)
+    file_ids = [sf.id for sf in files]
+    pg_counts = postgres_counts(file_ids)
+    es_counts = elasticsearch_counts(es_client, file_ids)
+
+    divergent = {}
+    for sf in files:
+        pg_count, es_count = pg_counts.get(sf.id, 0), es_counts.get(sf.id, 0)
+        in_minio = None if objects is None else sf.name in objects
+        problems = diagnose(sf, pg_count, es_count, in_minio)
+        if problems:
+            divergent[sf.id] = {
+                'name': sf.name,
+                'stored': sf.count,
+                'postgres': pg_count,
+                'elasticsearch': es_count,
+                'problems': problems,
+            }
+
+    matching = [file_id for file_id in file_ids if file_id not in divergent]
+    ScrapFile.objects.filter(id__in=matching).update(reconciled_at=timezone.now())
+    # Divergent files go to the front of the next run
+    ScrapFile.objects.filter(id__in=list(divergent)).update(reconciled_at=None)
+    return divergent
+
+
+def unregistered_objects(objects: set[str]) -> list[str]:
+    """MinIO objects without a ScrapFile (not picked up by process_scrap yet)."""
+    known = set(ScrapFile.objects.values_list('name', flat=True))
+    return sorted(objects - known)
+
+
+def queue_repairs(divergent: dict[int, dict]) -> int:
+    """Queue one repair task per divergent file; returns the number of queued tasks."""
+    queued = 0
+    for file_id, report in divergent.items():
+        problems = [p for p in report['problems'] if p != 'missing_object']
+        if not problems:
+            logger.warning(f"MinIO object of ScrapFile {file_id} ({report['name']}) is missing, not repairable")
+            continue
+        if 'ingest' in problems:
+            async_task('webui.tasks.index_breached_credential', file_id, group=REPAIR_GROUP)
+        else:
+            async_task('webui.reconcile.repair_file', file_id, problems, group=REPAIR_GROUP)
+        queued += 1
+    return queued
+
+
+def reindex_file(es_client, file_id: int, chunk_size: int = 5000) -> dict:
+    """
+    Re-index one file's credentials from Postgres.
+
+    When Elasticsearch holds more documents for the file than Postgres, the file's
+    documents are deleted first so orphans do not survive the repair.
+    """
+    scrap_file = ScrapFile.objects.only('id', 'name', 'added_at').get(id=file_id)
+    index = partitions.write_target(es_client, scrap_file)
+    deleted = 0
+    pg_count = postgres_counts([file_id]).get(file_id, 0)
+    if elasticsearch_counts(es_client, [file_id]).get(file_id, 0) > pg_count:
+        deleted = es_client.delete_by_query(
+            index=partitions.READ_ALIAS, query={'term': {'file_id': file_id}}, conflicts='proceed', refresh=True,
+        )['deleted']
+
+    rows = (
+        BreachedCredential.objects.filter(file_id=file_id)
+        .order_by()
+        .values_list('id', 'string', 'added_at')
+        .iterator(chunk_size=chunk_size)
+    )
+    actions = (credential_action(cred_id, string, added_at, file_id, index=index) for cred_id, string, added_at in rows)
+    indexed = failed = 0
+    for ok, item in streaming_bulk(
+        es_client, actions, chunk_size=chunk_size, raise_on_error=False, max_retries=3,
+        **pipelines.bulk_params(es_client),
+    ):
+        if ok:
+            indexed += 1
+        else:
+            failed += 1
+            if failed <= 10:
+                logger.error(f"Failed to re-index a credential of ScrapFile {file_id}: {item}")
+    es_client.indices.refresh(index=index)
+    return {'deleted': deleted, 'indexed': indexed, 'failed': failed}
+
+
+def repair_file(file_id: int, problems: list[str]) -> dict:
+    """django-q task: fix the stored count and/or re-index one file, then check it again."""
+    es_client = clients.elasticsearch()
+    result = {'file_id': file_id}
+    if 'count' in problems:
+        result['count'] = postgres_counts([file_id]).get(file_id, 0)
+        ScrapFile.objects.filter(id=file_id).update(count=result['count'])
+        rollups.update_file(file_id)
+    if 'elasticsearch' in problems:
+        result['reindex'] = reindex_file(es_client, file_id)
+        search_cache.bump_generation()
+    remaining = check_files(es_client, ScrapFile.objects.filter(id=file_id).only('id', 'name', 'count'))
+    result['status'] = 'diverged' if remaining else 'repaired'
+    logger.info(f"Repaired ScrapFile {file_id} ({', '.join(problems)}): {result['status']}")
+    return result
+
+
+def reconcile(es_client, batch_size: int | None = None, file_ids=None, repair: bool | None = None,
+              check_minio: bool = True) -> dict:
+    """Check the next batch of files and optionally queue repairs for the divergent ones."""
+    repair = config()['repair'] if repair is None else repair
+    objects = minio_objects() if check_minio else None
+    files = pending_files(batch_size, file_ids)
+    divergent = check_files(es_client, files, objects)
+    return {
+        'checked': len(files),
+        'divergent': divergent,
+        'unregistered': unregistered_objects(objects) if objects is not None else [],
+        'queued': queue_repairs(divergent) if repair else 0,
+    }
+
+
+def scheduled_reconcile() -> dict:
+    """django-q task: reconcile one batch while no indexing is queued."""
+    if ingest_pending(own_tasks=1):
+        logger.info("Indexing is in progress, skipping reconciliation")
+        return {'status': 'skipped'}
+    result = reconcile(clients.elasticsearch())
+    logger.info(
+        f"Reconciled {result['checked']} files: {len(result['divergent'])} divergent, "
+        f"{result['queued']} repairs queued, {len(result['unregistered'])} unregistered objects"
+    )
+    return {'status': 'done', 'checked': result['checked'], 'divergent': list(result['divergent'])}
+
+
+def schedule_reconcile(minutes: int | None = None):
+    """Install (or update) the django-q schedule that runs `scheduled_reconcile`."""
+    minutes = minutes or config()['interval_minutes']
+    schedule, _ = Schedule.objects.update_or_create(
+        name='credential-reconcile',
+        defaults={
+            'func': 'webui.reconcile.scheduled_reconcile',
+            'schedule_type': Schedule.MINUTES,
+            'minutes': minutes,
+            'repeats': -1,
+            'next_run': timezone.now() + timedelta(minutes=5),
+        },
+    )
+    return schedule
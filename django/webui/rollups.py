@@ -0,0 +1,215 @@
+"""
+Precomputed statistics for the dashboard.
+
+Three rollup tables are maintained incrementally as ingest completes:
+
+- FileDailyStat: credentials of one file per day, counted from that file's rows only
+  (an indexed `file_id` lookup), and replaced whenever the file is (re-)indexed.
+- DailyStat: credentials and files per day, summed from FileDailyStat for the days a
+  file touched.
+- SourceStat: files and credentials per top-level MinIO prefix.
+
+`update_file` runs as a django-q task queued after each indexed file; `rebuild` backfills
+all files. Elasticsearch cluster and index statistics are cached for `es_stats_ttl`
+seconds, so a dashboard view reads only these tables and the cache.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django_q.tasks import async_task
+from webui import clients
+from webui.models import BreachedCredential, DailyStat, FileDailyStat, ScrapFile, SourceStat
+from webui.partitions import source_prefix as source_of
+import logging
+
+logger = logging.getLogger(__name__)
+
+ES_STATS_KEY = 'rollups:es_stats'
+DEFAULTS = {
+    'cache': 'default',
+    'es_stats_ttl': 30,
+    'es_timeout': 5,
+    'index': 'breached_credentials',
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'ROLLUPS', {})}
+
+
+def _source_files(source: str):
+    if source == 'root':
+        return ScrapFile.objects.exclude(name__contains='/')
+    return ScrapFile.objects.filter(name__startswith=f"{source}/")
+
+
+def _lock_rows(model, field: str, values) -> dict:
+    """
+    Create missing rollup rows and lock them all, in sorted order.
+
+    Concurrent refreshes of the same day or source then run one after the other, and
+    each aggregates only after the previous one committed (under READ COMMITTED a
+    plain read-aggregate-write would let the later commit overwrite newer totals).
+    Call inside a transaction.
+    """
+    values = sorted(set(values))
+    model.objects.bulk_create([model(**{field: value}) for value in values], ignore_conflicts=True)
+    rows = model.objects.select_for_update().filter(**{f'{field}__in': values}).order_by(field)
+    return {getattr(row, field): row for row in rows}
+
+
+def refresh_days(days) -> None:
+    """Recompute DailyStat for the given days from FileDailyStat."""
+    with transaction.atomic():
+        for day, stat in _lock_rows(DailyStat, 'day', days).items():
+            totals = FileDailyStat.objects.filter(day=day).aggregate(
+                credentials=Sum('credentials'), files=Count('file', distinct=True),
+            )
+            if totals['credentials']:
+                stat.credentials, stat.files = totals['credentials'], totals['files']
+                stat.save(update_fields=['credentials', 'files', 'updated_at'])
+            else:
+                stat.delete()
+
+
+def refresh_sources(sources) -> None:
+    """Recompute SourceStat for the given MinIO prefixes."""
+    with transaction.atomic():
+        for source, stat in _lock_rows(SourceStat, 'source', sources).items():
+            files = _source_files(source)
+            file_totals = files.aggregate(files=Count('id'), last_added_at=Max('added_at'))
+            if not file_totals['files']:
+                stat.delete()
+                continue
+            stat.files = file_totals['files']
+            stat.credentials = FileDailyStat.objects.filter(file__in=files).aggregate(total=Sum('credentials'))['total'] or 0
+            stat.last_added_at = file_totals['last_added_at']
+            stat.save(update_fields=['files', 'credentials', 'last_added_at', 'updated_at'])
+
+
+def refresh(days, sources) -> None:
+    """django-q task: recompute the daily and source rollups of the given days and prefixes."""
+    # Days are always locked before sources, so concurrent refreshes cannot deadlock
+    refresh_days(days)
+    refresh_sources(sources)
+
+
+def queue_refresh(days, sources) -> None:
+    async_task('webui.rollups.refresh', list(days), list(sources), group='rollups')
+
+
+def update_file(file_id: int) -> dict:
+    """
+    django-q task: replace one file's FileDailyStat rows and refresh the rollups they feed.
+
+    The per-day counts add up to the file's credentials, which are stored as
+    `ScrapFile.count` too, so callers need no separate exact count.
+    """
+    try:
+        scrap_file = ScrapFile.objects.only('id', 'name').get(id=file_id)
+    except ScrapFile.DoesNotExist:
+        logger.warning(f"ScrapFile {file_id} no longer exists, skipping its rollups")
+        return {'file_id': file_id, 'days': 0, 'credentials': 0}
+    per_day = (
+        BreachedCredential.objects.filter(file_id=file_id)
+        .annotate(day=TruncDate('added_at'))
+        .values('day')
+        .annotate(credentials=Count('id'))
+    )
+    stats = [FileDailyStat(file_id=file_id, day=row['day'], credentials=row['credentials']) for row in per_day]
+    credentials = sum(stat.credentials for stat in stats)
+    with transaction.atomic():
+        ScrapFile.objects.filter(id=file_id).update(count=credentials)
+        days = set(FileDailyStat.objects.filter(file_id=file_id).values_list('day', flat=True))
+        FileDailyStat.objects.filter(file_id=file_id).delete()
+        FileDailyStat.objects.bulk_create(stats)
+        days.update(stat.day for stat in stats)
+        refresh(days, [source_of(scrap_file.name)])
+    logger.debug(f"Updated rollups of ScrapFile {file_id}: {len(stats)} days")
+    return {'file_id': file_id, 'days': len(stats), 'credentials': credentials}
+
+
+def queue_update(file_id: int) -> None:
+    async_task('webui.rollups.update_file', file_id, group='rollups')
+
+
+def rebuild(progress=None) -> int:
+    """Recompute the rollups of every file (one indexed query per file); returns the number of files."""
+    file_ids = list(ScrapFile.objects.order_by('id').values_list('id', flat=True))
+    for done, file_id in enumerate(file_ids, 1):
+        update_file(file_id)
+        if progress:
+            progress(done, len(file_ids))
+    # Drop rollups of files deleted without their signal (e.g. queryset deletes)
+    DailyStat.objects.exclude(day__in=FileDailyStat.objects.values('day')).delete()
+    live_sources = {source_of(name) for name in ScrapFile.objects.values_list('name', flat=True)}
+    SourceStat.objects.exclude(source__in=live_sources).delete()
+    return len(file_ids)
+
+
+def daily(days: int = 7) -> list[DailyStat]:
+    since = (timezone.now() - timedelta(days=days)).date()
+    return list(DailyStat.objects.filter(day__gte=since).order_by('day'))
+
+
+def top_sources(limit: int = 10) -> list[SourceStat]:
+    return list(SourceStat.objects.order_by('-credentials')[:limit])
+
+
+def es_stats() -> dict:
+    """Cluster health, indices, nodes and credential index stats, cached for `es_stats_ttl` seconds."""
+    cfg = config()
+    cache = caches[cfg['cache']]
+    stats = cache.get(ES_STATS_KEY)
+    if stats is None:
+        stats = _collect_es_stats(cfg)
+        cache.set(ES_STATS_KEY, stats, timeout=cfg['es_stats_ttl'])
+    return stats
+
+
+def _collect_es_stats(cfg: dict) -> dict:
+    stats = {
+        'es_status': 'error',
+        'es_error': 'Not connected',
+        'es_health': {},
+        'es_indices': [],
+        'es_nodes': [],
+        'doc_count': 0,
+        'store_size': 0,
+        'query_total': 0,
+        'query_time': 0,
+        'fetch_total': 0,
+        'fetch_time': 0,
+    }
+    es_client = clients.elasticsearch()
+    try:
+        stats['es_health'] = es_client.cluster.health(request_timeout=cfg['es_timeout']).body
+        stats['es_status'] = 'connected'
+        stats['es_error'] = None
+    except Exception as e:
+        logger.error(f"Error connecting to Elasticsearch: {e}")
+        stats['es_error'] = f"Connection issue: {e}"
+        return stats
+    try:
+        stats['es_indices'] = es_client.cat.indices(format='json', request_timeout=cfg['es_timeout']).body
+        stats['es_nodes'] = es_client.cat.nodes(format='json', request_timeout=cfg['es_timeout']).body
+        if es_client.indices.exists(index=cfg['index'], request_timeout=cfg['es_timeout']):
+            primaries = es_client.indices.stats(
+                index=cfg['index'], request_timeout=cfg['es_timeout'],
+            ).body.get('_all', {}).get('primaries', {})
+            search = primaries.get('search', {})
+            stats.update({
+                'doc_count': primaries.get('docs', {}).get('count', 0),
+                'store_size': primaries.get('store', {}).get('size_in_bytes', 0),
+                'query_total': search.get('query_total', 0),
+                'query_time': search.get('query_time_in_millis', 0),
+                'fetch_total': search.get('fetch_total', 0),
+                'fetch_time': search.get('fetch_time_in_millis', 0),
+            })
+    except Exception as e:
+        logger.warning(f"Error fetching ES details: {e}. Dashboard will show limited information.")
+    return stats
@@ -0,0 +1,192 @@
+"""
+Result cache for credential searches.
+
+Results are keyed by a hash of the normalized Elasticsearch request (target indices,
+query body and search parameters) and kept in a bounded in-process LRU, so repeated
+analyst queries and dashboard watch terms do not re-run a multi-second query.
+
+Result pages hold full credential strings, passwords included, so by default they never
+leave the process: the shared cache (Django's cache framework, the database cache) only
+holds the ingest generation. With `shared_results` the pages are also stored there and
+shared between processes; only enable it with a backend you would trust with the
+credentials themselves (e.g. a private Redis), as it serializes every page into it.
+
+Every key embeds the current ingest generation, a nanosecond timestamp in the shared
+cache that is replaced whenever credentials are indexed or re-indexed. Replacing it
+makes every older entry unreachable at once; stale entries simply expire with their
+TTL. The generation is stored without expiry, and if the cache evicts it anyway a new
+timestamp is started rather than a counter that could restart at a value older
+entries still use.
+
+Identical concurrent searches are coalesced: within a process the first caller runs the
+query while the others wait for its result, and with `shared_results` a short-lived
+cache lock makes other processes poll the shared tier instead of querying Elasticsearch.
+"""
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from threading import Condition, Lock
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'search'
+GENERATION_KEY = f'{KEY_PREFIX}:generation'
+DEFAULTS = {
+    'enabled': True,
+    'cache': 'default',
+    'ttl': 300,
+    'lru_size': 256,
+    'shared_results': False,
+    'lock_timeout': 30,
+    'poll_interval': 0.2,
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'SEARCH_CACHE', {})}
+
+
+def _cache():
+    return caches[config()['cache']]
+
+
+def generation() -> int:
+    """The current ingest generation, starting a new one if there is none (never bumped, or evicted)."""
+    cache = _cache()
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        # Another process may start one at the same time; everyone uses the first
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        value = cache.get(GENERATION_KEY, 0)
+    return value
+
+
+def bump_generation() -> int:
+    """Invalidate all cached search results; call after credentials were (re-)indexed."""
+    value = time.time_ns()
+    # No timeout: a generation that expired would let older entries be served again
+    _cache().set(GENERATION_KEY, value, timeout=None)
+    logger.debug(f"Search cache generation is now {value}")
+    return value
+
+
+def make_key(**request) -> str:
+    """Cache key of an Elasticsearch request given as keyword arguments (index, body, params, ...)."""
+    normalized = json.dumps(request, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class _LRU:
+    """A small thread-safe LRU of (expires_at, value) entries."""
+
+    def __init__(self):
+        self._entries: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value, ttl: float, size: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_lru = _LRU()
+
+# Keys being computed by a thread of this process
+_inflight: set[str] = set()
+_inflight_done = Condition()
+
+
+def _lookup(key: str):
+    value = _lru.get(key)
+    if value is not None or not config()['shared_results']:
+        return value
+    value = _cache().get(key)
+    if value is not None:
+        cfg = config()
+        _lru.set(key, value, cfg['ttl'], cfg['lru_size'])
+    return value
+
+
+def _store(key: str, value) -> None:
+    cfg = config()
+    _lru.set(key, value, cfg['ttl'], cfg['lru_size'])
+    if cfg['shared_results']:
+        _cache().set(key, value, timeout=cfg['ttl'])
+
+
+def get_or_compute(request_key: str, compute):
+    """
+    Return `(value, cached)` for a request key, running `compute()` at most once per key.
+
+    Exceptions raised by `compute` are not cached and reach only the caller that ran it;
+    waiting callers then retry on their own.
+    """
+    cfg = config()
+    if not cfg['enabled']:
+        return compute(), False
+
+    key = f"{KEY_PREFIX}:{generation()}:{request_key}"
+    value = _lookup(key)
+    if value is not None:
+        return value, True
+
+    # Coalesce within this process
+    with _inflight_done:
+        while key in _inflight:
+            _inflight_done.wait(timeout=cfg['lock_timeout'])
+            value = _lookup(key)
+            if value is not None:
+                return value, True
+        _inflight.add(key)
+
+    try:
+        if not cfg['shared_results']:
+            value = compute()
+            _store(key, value)
+            return value, False
+
+        # Coalesce across processes: only the lock holder queries Elasticsearch
+        lock_key = f"{key}:lock"
+        cache = _cache()
+        locked = cache.add(lock_key, 1, timeout=cfg['lock_timeout'])
+        if not locked:
+            deadline = time.monotonic() + cfg['lock_timeout']
+            while time.monotonic() < deadline and cache.get(lock_key) is not None:
+                time.sleep(cfg['poll_interval'])
+                value = _lookup(key)
+                if value is not None:
+                    return value, True
+            # The other process failed or timed out; run the query here
+            locked = cache.add(lock_key, 1, timeout=cfg['lock_timeout'])
+        try:
+            value = compute()
+            _store(key, value)
+            return value, False
+        finally:
+            if locked:
+                cache.delete(lock_key)
+    finally:
+        with _inflight_done:
+            _inflight.discard(key)
+            _inflight_done.notify_all()
@@ -0,0 +1,65 @@
+"""
+Shard layout and custom routing of credential documents.
+
+With `hash` routing documents are spread over the shards by their ID (Elasticsearch's
+default), so every search fans out to all shards and runs on one thread per shard in
+parallel. With `domain` routing credentials that have an email domain are routed by it,
+and a search filtered on a domain is sent only to the shard(s) owning that domain.
+`routing_partition_size` spreads each domain over several shards so a huge domain
+(gmail.com, ...) does not turn one shard into a hotspot.
+
+Credentials without a domain are routed by their ID, which is exactly where default
+routing puts them, so mixing routed and unrouted writers never duplicates a document.
+"""
+from django.conf import settings
+
+ROUTING_MODES = ('hash', 'domain')
+DEFAULTS = {
+    'number_of_shards': 1,
+    'routing': 'hash',
+    'routing_partition_size': 1,
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'ELASTICSEARCH_SHARDING', {})}
+
+
+def routing_mode(mode: str | None = None) -> str:
+    mode = mode or config()['routing']
+    if mode not in ROUTING_MODES:
+        raise ValueError(f"Unknown credential routing '{mode}', expected one of {list(ROUTING_MODES)}")
+    return mode
+
+
+def index_settings(shards: int | None = None, mode: str | None = None) -> dict:
+    """Static index settings for the shard layout, merged into `index_body()`."""
+    cfg = config()
+    shards = shards or cfg['number_of_shards']
+    index_settings = {'number_of_shards': shards}
+    # The routing partition must be smaller than the shard count to have any effect
+    partition_size = min(cfg['routing_partition_size'], shards - 1)
+    if routing_mode(mode) == 'domain' and partition_size > 1:
+        index_settings['index.routing_partition_size'] = partition_size
+    return index_settings
+
+
+def mapping_options(shards: int | None = None, mode: str | None = None) -> dict:
+    """Mapping options for the shard layout; partitioned routing requires a routing value on every document."""
+    if 'index.routing_partition_size' in index_settings(shards, mode):
+        return {'_routing': {'required': True}}
+    return {}
+
+
+def document_routing(cred_id: str, source: dict, mode: str | None = None) -> str | None:
+    """Routing value of a credential document, or None for Elasticsearch's default routing."""
+    if routing_mode(mode) != 'domain':
+        return None
+    return source.get('domain') or cred_id
+
+
+def search_routing(domain: str | None, mode: str | None = None) -> str | None:
+    """Routing value that restricts a domain-scoped search to the shards owning the domain."""
+    if not domain or routing_mode(mode) != 'domain':
+        return None
+    return domain.lower()
@@ -0,0 +1,205 @@
+"""
+Filesystem snapshots of the credential index for disaster recovery and environment cloning.
+
+Snapshots go to a shared-filesystem (`fs`) repository under the node's `path.repo`, so
+no external service is needed. Elasticsearch snapshots are incremental: segments already
+stored by an earlier snapshot are referenced instead of copied, so the scheduled snapshot
+after each ingest only writes the new segments. Restoring into a fresh node (or a staging
+copy mounting the same directory) takes minutes instead of re-indexing from MinIO.
+
+Every snapshot records how many credentials Postgres held when it was taken, and a restore
+is verified per file against `ScrapFile.count` to show exactly which files need re-indexing.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from django_q.models import Schedule
+from elasticsearch_dsl import connections
+from webui import partitions, search_cache
+from webui.models import ScrapFile
+import logging
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = 'credentials'
+DEFAULTS = {
+    'repository': 'credentials_backup',
+    'location': '/usr/share/elasticsearch/snapshots',
+    'keep': 7,
+    'after_ingest': False,
+    'interval_hours': 24,
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'ELASTICSEARCH_SNAPSHOTS', {})}
+
+
+def register_repository(es_client, location: str | None = None, verify: bool = True) -> dict:
+    """Create (or update) the `fs` snapshot repository; the location must be listed in `path.repo`."""
+    cfg = config()
+    es_client.snapshot.create_repository(
+        name=cfg['repository'],
+        repository={'type': 'fs', 'settings': {'location': location or cfg['location'], 'compress': True}},
+        verify=verify,
+    )
+    return es_client.snapshot.get_repository(name=cfg['repository'])[cfg['repository']]
+
+
+def snapshot_name() -> str:
+    return f"{SNAPSHOT_PREFIX}-{timezone.now():%Y.%m.%d-%H%M%S}"
+
+
+def postgres_state() -> dict:
+    """What Postgres held when a snapshot was taken: expected credentials and the newest file."""
+    totals = ScrapFile.objects.filter(is_active=True).aggregate(last_file_id=Max('id'), last_file_at=Max('added_at'))
+    return {
+        'credentials': sum(ScrapFile.objects.filter(is_active=True).values_list('count', flat=True)),
+        'last_file_id': totals['last_file_id'],
+        'last_file_at': totals['last_file_at'].isoformat() if totals['last_file_at'] else None,
+    }
+
+
+def create_snapshot(es_client, name: str | None = None, wait: bool = False) -> dict:
+    """Snapshot every credential index (through the read alias) together with its aliases."""
+    cfg = config()
+    name = name or snapshot_name()
+    response = es_client.snapshot.create(
+        repository=cfg['repository'],
+        snapshot=name,
+        indices=partitions.READ_ALIAS,
+        include_global_state=False,
+        metadata={'postgres': postgres_state(), 'partitioning': partitions.is_enabled()},
+        wait_for_completion=wait,
+    )
+    logger.info(f"Snapshot {name} {'completed' if wait else 'started'} in {cfg['repository']}")
+    return response.get('snapshot', {'snapshot': name})
+
+
+def list_snapshots(es_client) -> list[dict]:
+    """Snapshots of the credential index, oldest first."""
+    response = es_client.snapshot.get(repository=config()['repository'], snapshot=f'{SNAPSHOT_PREFIX}-*')
+    return sorted(response['snapshots'], key=lambda s: s.get('start_time_in_millis', 0))
+
+
+def latest_snapshot(es_client, successful: bool = True) -> dict | None:
+    snapshots = [s for s in list_snapshots(es_client) if not successful or s['state'] == 'SUCCESS']
+    return snapshots[-1] if snapshots else None
+
+
+def prune(es_client, keep: int | None = None, dry_run: bool = False) -> list[str]:
+    """Delete all but the newest `keep` successful snapshots (failed ones are always removed)."""
+    keep = keep if keep is not None else config()['keep']
+    snapshots = list_snapshots(es_client)
+    successful = [s for s in snapshots if s['state'] == 'SUCCESS']
+    failed = [s for s in snapshots if s['state'] in ('FAILED', 'PARTIAL')]
+    doomed = failed + (successful[:-keep] if keep else successful)
+    if not dry_run:
+        for snap in doomed:
+            es_client.snapshot.delete(repository=config()['repository'], snapshot=snap['snapshot'])
+            logger.info(f"Deleted snapshot {snap['snapshot']}")
+    return [s['snapshot'] for s in doomed]
+
+
+def has_new_data(es_client) -> bool:
+    """True when Postgres has files or credentials that the latest snapshot does not cover."""
+    latest = latest_snapshot(es_client)
+    if latest is None:
+        return True
+    taken = latest.get('metadata', {}).get('postgres', {})
+    current = postgres_state()
+    return current['credentials'] != taken.get('credentials') or current['last_file_id'] != taken.get('last_file_id')
+
+
+def scheduled_snapshot() -> dict:
+    """django-q task: take an incremental snapshot when data changed since the last one, then prune."""
+    es_client = connections.get_connection()
+    if not has_new_data(es_client):
+        logger.info("No new credentials since the last snapshot, skipping")
+        return {'status': 'skipped'}
+    if es_client.snapshot.status(repository=config()['repository']).get('snapshots'):
+        logger.info("A snapshot is already running, skipping")
+        return {'status': 'running'}
+    snapshot = create_snapshot(es_client, wait=False)
+    pruned = prune(es_client)
+    return {'status': 'started', 'snapshot': snapshot.get('snapshot'), 'pruned': pruned}
+
+
+def schedule_snapshots(hours: int | None = None):
+    """Install (or update) the django-q schedule that runs `scheduled_snapshot`."""
+    hours = hours or config()['interval_hours']
+    schedule, _ = Schedule.objects.update_or_create(
+        name='credential-index-snapshot',
+        defaults={
+            'func': 'webui.snapshots.scheduled_snapshot',
+            'schedule_type': Schedule.MINUTES,
+            'minutes': hours * 60,
+            'repeats': -1,
+            'next_run': timezone.now() + timedelta(minutes=5),
+        },
+    )
+    return schedule
+
+
+def restore(es_client, name: str, replace: bool = False) -> dict:
+    """
+    Restore a snapshot with its aliases into this cluster.
+
+    Existing credential indices block the restore unless `replace` is set, in which case
+    they are deleted first. The partition template is reinstalled because snapshots are
+    taken without the global state.
+    """
+    cfg = config()
+    if replace:
+        for index in es_client.indices.get(index=f'{partitions.INDEX_NAME}*', ignore_unavailable=True):
+            es_client.indices.delete(index=index)
+            logger.info(f"Deleted {index} before restore")
+    response = es_client.snapshot.restore(
+        repository=cfg['repository'],
+        snapshot=name,
+        indices=f'{partitions.INDEX_NAME}*',
+        include_aliases=True,
+        include_global_state=False,
+        wait_for_completion=True,
+        request_timeout=24 * 3600,
+    )
+    if partitions.is_enabled():
+        partitions.ensure_template(es_client)
+    search_cache.bump_generation()
+    return response['snapshot']
+
+
+def verify(es_client) -> dict:
+    """
+    Compare the restored credentials per file with `ScrapFile.count` in Postgres.
+
+    Uses a composite aggregation on `file_id`, so the check costs one pass over doc values
+    instead of a count query per file.
+    """
+    es_counts = {}
+    after = None
+    while True:
+        composite = {'size': 10000, 'sources': [{'file_id': {'terms': {'field': 'file_id'}}}]}
+        if after:
+            composite['after'] = after
+        response = es_client.search(index=partitions.READ_ALIAS, size=0, aggs={'files': {'composite': composite}})
+        agg = response['aggregations']['files']
+        for bucket in agg['buckets']:
+            es_counts[bucket['key']['file_id']] = bucket['doc_count']
+        after = agg.get('after_key')
+        if not agg['buckets'] or after is None:
+            break
+
+    pg_counts = dict(ScrapFile.objects.filter(is_active=True, count__gt=0).values_list('id', 'count'))
+    mismatched = {
+        file_id: {'postgres': count, 'elasticsearch': es_counts.get(file_id, 0)}
+        for file_id, count in pg_counts.items()
+        if es_counts.get(file_id, 0) != count
+    }
+    return {
+        'postgres': sum(pg_counts.values()),
+        'elasticsearch': sum(es_counts.values()),
+        'files': len(pg_counts),
+        'mismatched': mismatched,
+    }
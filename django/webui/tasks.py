@@ -1,197 +1,156 @@
 from django_elasticsearch_dsl import Document
 from webui.documents import BreachedCredentialDocument
 from webui.models import ScrapFile, BreachedCredential
+from webui.indexing import credential_action
+from webui import clients, ingest, partitions, pipelines, reconcile, rollups, search_cache, watchlist
+from webui.ingest import CredentialBatch
+from webui.parsing import line_splitter
 import logging
 import time
 from django.db.models import Q, F
 from django.utils import timezone
 from celery import shared_task
-from minio import Minio
 from django.conf import settings
 import io
 import hashlib
-from elasticsearch import Elasticsearch
 from concurrent.futures import ThreadPoolExecutor
-from queue import Queue
+from queue import Empty, Full, Queue
 import gc
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
 
 logger = logging.getLogger(__name__)
 
-def line_splitter(line: str, max_length: int = 1024) -> list[str]:
-    """Split a line into multiple strings if longer than max_length, based on the most frequent separator."""
-    if len(line) <= max_length:
-        return [line]
-    separators = ['https:\\\\', '\\\\', '::', ':', ';', ',', '\r\n', '\n', '\\r\\n']
-    sep_count = {s: line.count(s) for s in separators}
-    max_separator = max(sep_count, key=sep_count.get)
-    logger.debug(f"Line: '{line[:50]}...', Separator counts: {sep_count}, Chosen: '{max_separator}'")
-    split_lines = [s.strip() for s in line.split(max_separator) if s.strip()]
-    print(f"[*] Split {len(line)} chars into {len(split_lines)} parts using '{max_separator}'")
-    return [s[:max_length] for s in split_lines if len(s) > 0]
+def materialize(batches) -> list[tuple[str, str, CredentialBatch]]:
+    """Expand batches into (id, string, batch) rows, splitting lines longer than the column."""
+    rows = []
+    for batch in batches:
+        for cred_id, string in zip(batch.ids(), batch.strings):
+            if len(string) > 1024:
+                for split_str in line_splitter(string):
+                    rows.append((hashlib.md5(f"{split_str}{time.time()}".encode()).hexdigest(), split_str, batch))
+            else:
+                rows.append((cred_id, string, batch))
+    return rows
 
-def process_chunk(credentials, es_actions, es_client):
-    """Process a chunk of credentials and actions"""
-    if not credentials:
+def bulk_failures(response) -> int:
+    """Count the items of a bulk response that failed; 409s are the duplicates `create` skips on purpose."""
+    if not response.get('errors'):
         return 0
-        
-    # Split long strings before bulk create
-    processed_credentials = []
-    for cred in credentials:
-        if len(cred.string) > 1024:
-            split_strings = line_splitter(cred.string)
-            for split_str in split_strings:
-                # Create new credential with split string
-                new_cred = BreachedCredential(
-                    id=hashlib.md5(f"{split_str}{time.time()}".encode()).hexdigest(),
-                    string=split_str,
-                    file=cred.file,
-                    added_at=cred.added_at
-                )
-                processed_credentials.append(new_cred)
-        else:
-            processed_credentials.append(cred)
-    
+    failed = 0
+    for item in response['items']:
+        result = next(iter(item.values()))
+        if result.get('status', 200) < 300 or result.get('status') == 409:
+            continue
+        failed += 1
+        if failed <= 5:
+            logger.error(f"Elasticsearch rejected {result.get('_id')}: {result.get('error')}")
+    return failed
+
+def process_chunk(batches, es_client):
+    """Write a chunk of credential batches to Postgres and Elasticsearch; returns the documents that failed to index"""
+    rows = materialize(batches)
+    if not rows:
+        return 0
+
+    credentials = [
+        BreachedCredential(id=cred_id, string=string, file_id=batch.file_id, added_at=batch.added_at)
+        for cred_id, string, batch in rows
+    ]
     try:
         # Try bulk create with processed credentials
-        BreachedCredential.objects.bulk_create(processed_credentials, batch_size=1000, ignore_conflicts=True)
+        BreachedCredential.objects.bulk_create(credentials, batch_size=1000, ignore_conflicts=True)
     except Exception as e:
         logger.error(f"Error in bulk create: {str(e)}")
         # If bulk create fails, try individual inserts
-        for cred in processed_credentials:
+        for cred in credentials:
             try:
                 BreachedCredential.objects.create(
                     id=cred.id,
                     string=cred.string,
-                    file=cred.file,
+                    file_id=cred.file_id,
                     added_at=cred.added_at
                 )
             except Exception as e:
                 logger.debug(f"Duplicate credential skipped: {cred.id}")
                 continue
-    
+    del credentials
+
     # Process Elasticsearch actions
-    if es_actions:
-        try:
-            # Format actions for Elasticsearch bulk API
-            formatted_actions = []
-            for action in es_actions:
-                # Add the index operation
-                formatted_actions.append({
-                    'index': {
-                        '_index': action['_index'],
-                        '_id': action['_id']
-                    }
-                })
-                # Add the document
-                formatted_actions.append(action['_source'])
-            
-            es_client.bulk(operations=formatted_actions, refresh=True)
-        except Exception as e:
-            logger.error(f"Error in Elasticsearch bulk: {str(e)}")
-    
-    return len(processed_credentials)
+    try:
+        # Format actions for Elasticsearch bulk API
+        formatted_actions = []
+        for cred_id, string, batch in rows:
+            # `create` keeps the first file's document for duplicate lines, matching the
+            # row Postgres keeps (bulk_create ignores conflicts), so per-file counts agree
+            action = credential_action(cred_id, string, batch.added_at, batch.file_id, index=batch.index, op_type='create')
+            header = {
+                '_index': action['_index'],
+                '_id': action['_id']
+            }
+            if '_routing' in action:
+                header['routing'] = action['_routing']
+            formatted_actions.append({action['_op_type']: header})
+            # Add the document
+            formatted_actions.append(action['_source'])
+
+        # With the ingest pipeline enabled, documents carry only the raw line and
+        # Elasticsearch extracts the credential fields
+        response = es_client.bulk(operations=formatted_actions, refresh=True, **pipelines.bulk_params())
+        failed = bulk_failures(response)
+        if failed:
+            logger.error(f"{failed} of {len(rows)} documents failed to index")
+    except Exception as e:
+        logger.error(f"Error in Elasticsearch bulk: {str(e)}")
+        failed = len(rows)
+
+    # Match the new credentials against the watchlist's percolator queries
+    try:
+        watchlist.record_matches(es_client, rows)
+    except Exception as e:
+        logger.error(f"Error percolating watchlist: {str(e)}")
+
+    return failed
 
-def writer_process(queue, es_client, total_processed):
+def writer_process(queue, es_client, total_processed, index_errors):
     """Single writer process to handle database inserts"""
-    credentials = []
-    es_actions = []
+    batches = []
+    pending = 0
     chunk_size = 10000
-    
+
     while True:
         try:
-            item = queue.get(timeout=5)  # 5 second timeout
-            if item is None:  # Signal to stop
-                break
-                
-            credentials.append(item['credential'])
-            es_actions.append(item['es_action'])
-            
-            if len(credentials) >= chunk_size:
-                try:
-                    process_chunk(credentials, es_actions, es_client)
-                    total_processed[0] += len(credentials)
-                    credentials.clear()
-                    es_actions.clear()
-                except Exception as e:
-                    logger.error(f"Error in writer process: {str(e)}")
-                    if "deadlock" in str(e).lower():
-                        time.sleep(5)  # Wait before retrying
-                        continue
-                    raise
-                    
-        except Exception as e:
-            if isinstance(e, TimeoutError):
-                break
-            logger.error(f"Error in writer process: {str(e)}")
-            raise
-    
+            batch = queue.get(timeout=5)  # 5 second timeout
+        except Empty:
+            # Readers are still waiting on MinIO; keep waiting for the stop signal
+            continue
+        if batch is None:  # Signal to stop
+            break
+
+        batches.append(batch)
+        pending += len(batch)
+
+        if pending >= chunk_size:
+            try:
+                index_errors[0] += process_chunk(batches, es_client)
+                total_processed[0] += pending
+                batches.clear()
+                pending = 0
+            except Exception as e:
+                logger.error(f"Error in writer process: {str(e)}")
+                if "deadlock" in str(e).lower():
+                    time.sleep(5)  # Wait before retrying
+                    continue
+                raise
+
     # Process any remaining items
-    if credentials:
+    if batches:
         try:
-            process_chunk(credentials, es_actions, es_client)
-            total_processed[0] += len(credentials)
+            index_errors[0] += process_chunk(batches, es_client)
+            total_processed[0] += pending
         except Exception as e:
             logger.error(f"Error processing final chunk: {str(e)}")
             raise
 
-def clean_string(s: str) -> str:
-    """Clean a string by removing NULL characters and other problematic characters."""
-    # Remove NULL characters and other control characters
-    s = ''.join(char for char in s if ord(char) >= 32 or char in '\n\r\t')
-    # Remove any remaining NULL bytes
-    s = s.replace('\x00', '')
-    # Remove any other problematic characters
-    s = s.encode('ascii', 'ignore').decode('ascii')
-    return s.strip()
-
-def reader_process(chunk, scrap_file, queue):
-    """Process a chunk of data and put results in queue"""
-    try:
-        for line in chunk.splitlines():
-            line = line.strip()
-            if ':' in line:  # Basic validation
-                # Clean the line before processing
-                line = clean_string(line)
-                if not line:  # Skip if line is empty after cleaning
-                    continue
-                    
-                # Generate ID
-                unique_string = line.strip()
-                cred_id = hashlib.md5(unique_string.encode()).hexdigest()
-                
-                # Create credential
-                credential = BreachedCredential(
-                    id=cred_id,
-                    string=line,
-                    file=scrap_file,
-                    added_at=timezone.now()
-                )
-                
-                # Prepare Elasticsearch action
-                es_action = {
-                    '_index': 'breached_credentials',
-                    '_id': cred_id,
-                    '_source': {
-                        'string': line,
-                        'added_at': timezone.now().isoformat(),
-                        'file_id': scrap_file.id,
-                        'file_name': scrap_file.name,
-                        'file_size': float(scrap_file.size),
-                        'file_uploaded_at': scrap_file.added_at.isoformat()
-                    }
-                }
-                
-                # Put in queue
-                queue.put({
-                    'credential': credential,
-                    'es_action': es_action
-                })
-    except Exception as e:
-        logger.error(f"Error in reader process: {str(e)}")
-        raise
-
 @shared_task(bind=True, max_retries=3)
 def index_breached_credential(self, scrap_file_id):
     """
@@ -219,19 +178,17 @@ def index_breached_credential(self, scrap_file_id):
         logger.debug(f"ScrapFile {scrap_file_id} fetched")
         start_time = time.time()
 
-        # Initialize clients
-        minio_client = Minio(
-            'minio:9000',
-            access_key=settings.AWS_ACCESS_KEY_ID,
-            secret_key=settings.AWS_SECRET_ACCESS_KEY,
-            secure=False
-        )
-        es_client = Elasticsearch(['http://elastic:9200'])
+        # Shared clients of this worker process
+        minio_client = clients.minio()
+        es_client = clients.elasticsearch()
+        target_index = partitions.write_target(es_client, scrap_file)
+        if pipelines.is_enabled():
+            pipelines.ensure_pipeline(es_client)
 
         # Get file from MinIO
         logger.debug(f"Reading file {scrap_file.name} from MinIO")
         try:
-            data = minio_client.get_object('breached-credentials', scrap_file.name)
+            data = minio_client.get_object(settings.AWS_STORAGE_BUCKET_NAME, scrap_file.name)
         except Exception as e:
             logger.error(f"Error accessing MinIO file {scrap_file.name}: {str(e)}")
             return {
@@ -242,82 +199,114 @@ def index_breached_credential(self, scrap_file_id):
             }
         
         # Setup queue and shared counter
-        queue = Queue(maxsize=100000)  # Limit queue size to prevent memory issues
+        # Parsed batches of ~1 MB of lines each waiting for the writer
+        queue = Queue(maxsize=8)
         total_processed = [0]  # Use list for mutable shared state
+        index_errors = [0]  # Documents Elasticsearch rejected
         last_log_time = time.time()
         
+        # Fork the reader processes before the writer thread exists (see webui/ingest.py)
+        readers = ingest.start_readers()
+
         # Start writer process
-        with ThreadPoolExecutor(max_workers=1) as writer_executor:
-            writer_future = writer_executor.submit(writer_process, queue, es_client, total_processed)
+        with readers, ThreadPoolExecutor(max_workers=1) as writer_executor:
+            writer_future = writer_executor.submit(writer_process, queue, es_client, total_processed, index_errors)
             
-            # Start reader processes
-            with ThreadPoolExecutor(max_workers=4) as reader_executor:
-                futures = []
-                buffer = ""
-                
-                try:
-                    for chunk in data.stream(32768):
-                        buffer += chunk.decode('utf-8', errors='replace')
-                        chunks = buffer.splitlines()
-                        buffer = chunks.pop() if chunks else ""
-                        
-                        # Submit chunks to reader processes
-                        for chunk in chunks:
-                            futures.append(reader_executor.submit(reader_process, chunk, scrap_file, queue))
-                            
-                            # Log progress every 5 seconds
-                            current_time = time.time()
-                            if current_time - last_log_time >= 5:
-                                logger.debug(f"Processed {total_processed[0]} lines so far")
-                                last_log_time = current_time
+            try:
+                # Readers parse byte batches in a process pool and return them in file order
+                for batch in ingest.read_batches(data.stream(262144), scrap_file.id, target_index, executor=readers):
+                    while True:
+                        try:
+                            queue.put(batch, timeout=5)
+                            break
+                        except Full:
+                            if writer_future.done():
+                                # The writer failed; surface its exception
+                                writer_future.result()
+                    
+                    # Log progress every 5 seconds
+                    current_time = time.time()
+                    if current_time - last_log_time >= 5:
+                        logger.debug(f"Processed {total_processed[0]} lines so far")
+                        # Keep the ingest lease so the index is not sealed or force-merged while we write
+                        partitions.touch_ingest(partitions.ingest_key(scrap_file))
+                        last_log_time = current_time
+            
+            except Exception as e:
+                logger.error(f"Error processing file content: {str(e)}")
+                raise
+            
+            finally:
+                data.close()
+                data.release_conn()
                 
-                except Exception as e:
-                    logger.error(f"Error processing file content: {str(e)}")
-                    data.close()
-                    raise
+                # Signal writer to stop; a writer that died no longer drains the full queue
+                while not writer_future.done():
+                    try:
+                        queue.put(None, timeout=5)
+                        break
+                    except Full:
+                        continue
                 
-                finally:
-                    data.close()
-                    
-                    # Wait for all reader processes to complete
-                    for future in futures:
-                        future.result()
-                    
-                    # Signal writer to stop
-                    queue.put(None)
-                    
-                    # Wait for writer to complete
-                    writer_future.result()
+                # Wait for writer to complete
+                writer_future.result()
         
-        # Update scrap file count
-        scrap_file.count = BreachedCredential.objects.filter(file=scrap_file).count()
-        scrap_file.save()
+        # The file is fully indexed from here on, so failures of the follow-up steps are
+        # logged instead of turning it into an error (and a deadlock retry of the ingest)
+        try:
+            # Roll the hot partition over if it is full and seal past periods
+            partitions.after_ingest(es_client, scrap_file)
+        except Exception as e:
+            logger.error(f"Partition maintenance after ScrapFile {scrap_file_id} failed: {str(e)}")
+        try:
+            # Cached search results no longer include everything that is indexed
+            search_cache.bump_generation()
+        except Exception as e:
+            logger.error(f"Could not invalidate cached search results: {str(e)}")
 
-        # Verify counts
-        total_scrap_count = ScrapFile.objects.aggregate(total=models.Sum('count'))['total'] or 0
-        total_credential_count = BreachedCredential.objects.count()
-        
-        logger.debug(f"Total ScrapFile count: {total_scrap_count}")
-        logger.debug(f"Total BreachedCredential count: {total_credential_count}")
-        logger.debug(f"Count difference: {total_credential_count - total_scrap_count}")
-        
-        if total_scrap_count != total_credential_count:
-            logger.warning(f"Count mismatch! ScrapFiles: {total_scrap_count}, Credentials: {total_credential_count}")
-            print(f"[*] WARNING: Count mismatch! ScrapFiles: {total_scrap_count}, Credentials: {total_credential_count}")
+        # Alert on the watchlist matches of this file (and any earlier ones not yet sent)
+        try:
+            notified = watchlist.notify_pending()
+            if notified:
+                logger.info(f"Sent {notified} watchlist matches for ScrapFile {scrap_file_id}")
+        except Exception as e:
+            logger.error(f"Watchlist notification failed, matches stay pending: {str(e)}")
+
+        # Fold this file into the dashboard's daily and per-source rollups; their per-day
+        # counts also set the file's count, so there is no separate exact count
+        try:
+            scrap_file.count = rollups.update_file(scrap_file.id)['credentials']
+        except Exception as e:
+            logger.error(f"Rollups of ScrapFile {scrap_file_id} failed, retrying in the background: {str(e)}")
+            rollups.queue_update(scrap_file.id)
+
+        # Compare this file's counts in Postgres and Elasticsearch (see webui/reconcile.py);
+        # if the check itself fails, whether they diverge stays unknown (None)
+        divergent = count_mismatch = None
+        try:
+            divergent = reconcile.check_files(es_client, [scrap_file]).get(scrap_file.id)
+            count_mismatch = divergent is not None
+            if divergent:
+                logger.warning(f"ScrapFile {scrap_file_id} diverges after indexing: {divergent}")
+        except Exception as e:
+            logger.error(f"Reconciliation check of ScrapFile {scrap_file_id} failed: {str(e)}")
 
         processing_time = time.time() - start_time
         logger.debug(f"Finished processing ScrapFile {scrap_file_id} in {processing_time:.2f}s")
         logger.debug(f"Total processed: {total_processed[0]} credentials")
+        if index_errors[0]:
+            logger.error(f"ScrapFile {scrap_file_id}: {index_errors[0]} documents failed to index")
         
         return {
-            'status': 'success',
+            # Rejected documents leave the file incomplete in Elasticsearch
+            'status': 'error' if index_errors[0] else 'success',
             'scrap_file_id': scrap_file_id,
             'file_name': scrap_file.name,
             'total_processed': total_processed[0],
+            'index_errors': index_errors[0],
             'processing_time': processing_time,
-            'total_scrap_count': total_scrap_count,
-            'total_credential_count': total_credential_count,
-            'count_mismatch': total_scrap_count != total_credential_count
+            'divergent': divergent,
+            'count_mismatch': count_mismatch
         }
         
     except Exception as e:
@@ -349,9 +338,6 @@ def index_breached_credentials():
                 meta={'id': credential.id},
                 string=credential.string,
                 file_id=credential.file.id,
-                file_name=credential.file.name,
-                file_size=credential.file.size,
-                file_uploaded_at=credential.file.uploaded_at,
                 created_at=credential.created_at,
                 modified=credential.modified
             )
@@ -1,3 +1,976 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import date, datetime, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.core.cache import caches
+from django.core.paginator import EmptyPage, InvalidPage, PageNotAnInteger
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from elasticsearch import ApiError, NotFoundError
+from elasticsearch_dsl import Search
+
+from webui import (
+    async_search, bulk_lookup, clients, counting, export, file_cache, maintenance, pagination, partitions,
+    pipelines, reconcile, rollups, search_cache, sharding, views, watchlist,
+)
+from webui.indexing import INDEX_NAME, credential_action
+from webui.ingest import byte_batches, parse_block, read_batches, start_readers
+from webui.management.commands import rebuild_elasticsearch_index
+from webui.models import BreachedCredential, DailyStat, FileDailyStat, ScrapFile, SourceStat, Watch, WatchMatch
+from webui.parsing import parse_credential
+from webui.queries import build_query, build_search, rewrite_query
+from webui.tasks import bulk_failures
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'webui-tests'}}
+
+
+class PartitionTests(SimpleTestCase):
+    def test_period_key_of_file(self):
+        scrap_file = ScrapFile(name='combo/a.txt', added_at=datetime(2025, 5, 3, tzinfo=dt_timezone.utc))
+        self.assertEqual(partitions.partition_key(scrap_file), '2025.05')
+
+    @override_settings(ELASTICSEARCH_PARTITIONING={'strategy': 'source'})
+    def test_source_key_of_file(self):
+        self.assertEqual(partitions.partition_key(ScrapFile(name='Combo Lists/a.txt')), 'combo_lists')
+        self.assertEqual(partitions.partition_key(ScrapFile(name='a.txt')), 'root')
+
+    def test_key_from_index(self):
+        self.assertEqual(partitions.key_from_index('breached_credentials-2025.05-000002'), '2025.05')
+        self.assertIsNone(partitions.key_from_index('breached_credentials'))
+
+    @override_settings(ELASTICSEARCH_PARTITIONING={'enabled': True})
+    def test_search_indices(self):
+        self.assertEqual(partitions.search_indices(), [partitions.READ_ALIAS])
+        self.assertEqual(
+            partitions.search_indices(['2025.04', '2025.05']),
+            ['breached_credentials-2025.04-*', 'breached_credentials-2025.05-*'],
+        )
+
+
+@override_settings(ELASTICSEARCH_PARTITIONING={'enabled': True})
+class RebuildTargetTests(TestCase):
+    def test_each_partition_is_ensured_once(self):
+        may, april = datetime(2025, 5, 1, tzinfo=dt_timezone.utc), datetime(2025, 4, 1, tzinfo=dt_timezone.utc)
+        file_ids = []
+        for name, added_at in (('a.txt', may), ('b.txt', may), ('c.txt', april)):
+            scrap_file = ScrapFile.objects.create(name=name, sha256=hashlib.sha256(name.encode()).hexdigest())
+            ScrapFile.objects.filter(id=scrap_file.id).update(added_at=added_at)
+            file_ids.append(scrap_file.id)
+
+        with mock.patch.object(
+            partitions, 'ensure_partition', side_effect=lambda es_client, key: partitions.write_alias(key),
+        ) as ensure_partition:
+            targets = rebuild_elasticsearch_index.Command().partition_targets(mock.Mock(), None)
+        self.assertEqual(ensure_partition.call_count, 2)
+        self.assertEqual(targets, {
+            file_ids[0]: 'breached_credentials-2025.05-write',
+            file_ids[1]: 'breached_credentials-2025.05-write',
+            file_ids[2]: 'breached_credentials-2025.04-write',
+        })
+
+
+class QueryRewriteTests(SimpleTestCase):
+    def test_iexact_is_a_lowercase_term(self):
+        self.assertEqual(rewrite_query('Admin@X.com', 'iexact').to_dict(), {'term': {'string.lower': 'admin@x.com'}})
+
+    def test_suffix_pattern_uses_reversed_field(self):
+        self.assertEqual(
+            rewrite_query('*@Company.com', 'case_insensitive').to_dict(),
+            {'prefix': {'string.reversed': 'moc.ynapmoc@'}},
+        )
+
+    def test_prefix_pattern_uses_lowercase_field(self):
+        self.assertEqual(rewrite_query('Admin*', 'wildcard').to_dict(), {'prefix': {'string.lower': 'admin'}})
+
+    def test_other_queries_are_not_rewritten(self):
+        for query, search_type in (('admin', 'case_insensitive'), ('a*b*', 'wildcard'), ('a?b*', 'wildcard'),
+                                   ('*', 'wildcard'), ('admin*', 'regexp'), ('admin*', 'exact')):
+            self.assertIsNone(rewrite_query(query, search_type))
+
+    def test_ngram_layout(self):
+        self.assertEqual(build_query('Admin', layout='ngram').to_dict(), {'match': {'string.ngram': 'Admin'}})
+        self.assertEqual(build_query('Admin', 'wildcard', layout='ngram').to_dict(), {'wildcard': {'string': {'value': '*admin*'}}})
+        self.assertEqual(build_query('a*b*c', layout='ngram').to_dict(), {'wildcard': {'string.lower': {'value': 'a*b*c'}}})
+        self.assertEqual(build_query('ab', 'regexp', layout='ngram').to_dict(), {'regexp': {'string': {'value': '.*[aA][bB].*'}}})
+
+    def test_wildcard_layout(self):
+        self.assertEqual(
+            build_query('Admin', layout='wildcard').to_dict(),
+            {'wildcard': {'string': {'value': '*Admin*', 'case_insensitive': True}}},
+        )
+        self.assertEqual(build_query('Admin', 'exact', layout='wildcard').to_dict(), {'term': {'string.keyword': 'Admin'}})
+
+    def test_rewrites_apply_to_every_layout(self):
+        for layout in ('ngram', 'wildcard'):
+            self.assertEqual(build_query('*@x.com', layout=layout).to_dict(), {'prefix': {'string.reversed': 'moc.x@'}})
+
+
+class ParseCredentialTests(SimpleTestCase):
+    def test_email_and_password(self):
+        self.assertEqual(parse_credential('John.Doe@Example.COM:s3cret:x'), {
+            'email': 'john.doe@example.com',
+            'username': 'John.Doe',
+            'domain': 'example.com',
+            'password': 's3cret:x',
+        })
+
+    def test_username_with_other_separators(self):
+        self.assertEqual(parse_credential('jdoe;hunter2'), {'username': 'jdoe', 'password': 'hunter2'})
+        self.assertEqual(parse_credential('jdoe|hunter2'), {'username': 'jdoe', 'password': 'hunter2'})
+
+    def test_url_prefix(self):
+        self.assertEqual(parse_credential('https://Login.Example.com/auth:a@b.io:pw'), {
+            'url_host': 'login.example.com',
+            'email': 'a@b.io',
+            'username': 'a',
+            'domain': 'b.io',
+            'password': 'pw',
+        })
+
+    def test_lone_value(self):
+        self.assertEqual(parse_credential('a@b.io'), {'email': 'a@b.io', 'username': 'a', 'domain': 'b.io'})
+        self.assertEqual(parse_credential('justtext'), {})
+
+
+class FileCacheTests(TestCase):
+    def setUp(self):
+        file_cache.invalidate()
+        self.scrap_file = ScrapFile.objects.create(name='combo/a.txt', sha256=hashlib.sha256(b'a').hexdigest())
+
+    def test_missing_files_are_loaded_with_one_query(self):
+        with self.assertNumQueries(1):
+            files = file_cache.get_many([self.scrap_file.id, None, self.scrap_file.id, 12345])
+        self.assertEqual(list(files), [self.scrap_file.id])
+        self.assertEqual(files[self.scrap_file.id]['file_name'], 'combo/a.txt')
+        with self.assertNumQueries(0):
+            file_cache.get_many([self.scrap_file.id, None])
+
+    def test_saving_a_file_invalidates_it(self):
+        file_cache.get(self.scrap_file.id)
+        self.scrap_file.name = 'combo/b.txt'
+        self.scrap_file.save()
+        self.assertEqual(file_cache.get(self.scrap_file.id)['file_name'], 'combo/b.txt')
+
+
+@override_settings(ELASTICSEARCH_SHARDING={'number_of_shards': 6, 'routing': 'domain', 'routing_partition_size': 3})
+class ShardingTests(SimpleTestCase):
+    def test_domain_routing_uses_a_routing_partition(self):
+        self.assertEqual(sharding.index_settings(), {'number_of_shards': 6, 'index.routing_partition_size': 3})
+        self.assertEqual(sharding.mapping_options(), {'_routing': {'required': True}})
+
+    def test_routing_partition_stays_below_the_shard_count(self):
+        self.assertEqual(sharding.index_settings(shards=3), {'number_of_shards': 3, 'index.routing_partition_size': 2})
+        self.assertEqual(sharding.index_settings(shards=2), {'number_of_shards': 2})
+        self.assertEqual(sharding.mapping_options(shards=2), {})
+
+    def test_documents_and_searches_are_routed_by_domain(self):
+        self.assertEqual(sharding.document_routing('id1', {'domain': 'x.com'}), 'x.com')
+        self.assertEqual(sharding.document_routing('id1', {'username': 'jdoe'}), 'id1')
+        self.assertEqual(sharding.search_routing('X.com'), 'x.com')
+        self.assertIsNone(sharding.search_routing(None))
+
+    def test_hash_routing(self):
+        self.assertEqual(sharding.index_settings(mode='hash'), {'number_of_shards': 6})
+        self.assertIsNone(sharding.document_routing('id1', {'domain': 'x.com'}, mode='hash'))
+        self.assertIsNone(sharding.search_routing('x.com', mode='hash'))
+
+    def test_unknown_routing_mode(self):
+        with self.assertRaises(ValueError):
+            sharding.routing_mode('random')
+
+
+@override_settings(ELASTICSEARCH_MAINTENANCE={'max_segments_per_shard': 10, 'max_deleted_ratio': 0.1, 'max_num_segments': 1})
+class MaintenancePlanTests(SimpleTestCase):
+    def health(self, index, hot=False, sealed=False, segments_per_shard=1, deleted_ratio=0.0):
+        return {'index': index, 'hot': hot, 'sealed': sealed,
+                'segments_per_shard': segments_per_shard, 'deleted_ratio': deleted_ratio}
+
+    def test_cold_indices_with_many_segments_are_merged(self):
+        steps = maintenance.plan([
+            self.health('rolled', segments_per_shard=40),
+            self.health('sealed', sealed=True, segments_per_shard=40),
+            self.health('merged', segments_per_shard=1),
+            self.health('few', segments_per_shard=5),
+        ])
+        self.assertEqual(steps, [{'index': 'rolled', 'action': 'merge'}, {'index': 'sealed', 'action': 'merge'}])
+
+    def test_write_index_is_never_merged_to_one_segment(self):
+        steps = maintenance.plan([
+            self.health('write', hot=True, segments_per_shard=40),
+            self.health('write-deletes', hot=True, segments_per_shard=40, deleted_ratio=0.3),
+        ])
+        self.assertEqual(steps, [{'index': 'write-deletes', 'action': 'expunge'}])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ELASTICSEARCH_PARTITIONING={'enabled': False})
+class MaintenanceHealthTests(SimpleTestCase):
+    def setUp(self):
+        caches['default'].clear()
+        self.merges = {'breached_credentials': 0}
+        self.es_client = mock.Mock()
+        self.es_client.indices.exists.return_value = True
+        self.es_client.indices.stats.side_effect = self.stats
+        self.es_client.indices.get_settings.return_value = {
+            'breached_credentials': {'settings': {'index': {'number_of_shards': '2'}}},
+        }
+        self.es_client.tasks.list.return_value = {'nodes': {}}
+
+    def stats(self, index, metric):
+        if metric == 'merge':
+            return {'_all': {'total': {'merges': {'current': sum(self.merges.values())}}},
+                    'indices': {name: {} for name in self.merges}}
+        primaries = {'docs': {'count': 90, 'deleted': 10}, 'segments': {'count': 80}}
+        return {'indices': {'breached_credentials': {'primaries': primaries}}}
+
+    def forcemerge_task(self, indices):
+        description = f"Force-merge indices [{', '.join(indices)}], maxSegments[1], onlyExpungeDeletes[false]"
+        return {'nodes': {'node': {'tasks': {'node:1': {'description': description}}}}}
+
+    def test_single_index_is_merged_once_no_ingest_holds_it(self):
+        health = maintenance.index_health(self.es_client)
+        self.assertFalse(health[0]['hot'])
+        self.assertEqual(health[0]['segments_per_shard'], 40)
+        self.assertEqual(maintenance.plan(health), [{'index': 'breached_credentials', 'action': 'merge'}])
+
+    def test_single_index_is_hot_while_an_ingest_holds_it(self):
+        partitions.write_target(self.es_client, ScrapFile(id=1))
+        health = maintenance.index_health(self.es_client)
+        self.assertTrue(health[0]['hot'])
+        self.assertEqual(maintenance.plan(health), [])
+
+    def test_merges_running_only_counts_credential_indices(self):
+        self.assertFalse(maintenance.merges_running(self.es_client))
+        self.es_client.tasks.list.return_value = self.forcemerge_task(['other-index'])
+        self.assertFalse(maintenance.merges_running(self.es_client))
+        self.es_client.tasks.list.return_value = self.forcemerge_task(['other-index', 'breached_credentials'])
+        self.assertTrue(maintenance.merges_running(self.es_client))
+        self.es_client.tasks.list.return_value = {'nodes': {}}
+        self.merges['breached_credentials'] = 1
+        self.assertTrue(maintenance.merges_running(self.es_client))
+
+
+class IngestPipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.es_client = mock.Mock()
+        patcher = mock.patch.object(pipelines, '_installed', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(ELASTICSEARCH_INGEST_PIPELINE={'enabled': False})
+    def test_disabled_pipeline_adds_no_parameters(self):
+        self.assertEqual(pipelines.bulk_params(self.es_client), {})
+        self.es_client.ingest.put_pipeline.assert_not_called()
+
+    @override_settings(ELASTICSEARCH_INGEST_PIPELINE={'enabled': True})
+    def test_enabled_pipeline_is_installed_once(self):
+        self.assertEqual(pipelines.bulk_params(self.es_client), {'pipeline': pipelines.PIPELINE_NAME})
+        self.assertEqual(pipelines.bulk_params(self.es_client), {'pipeline': pipelines.PIPELINE_NAME})
+        self.es_client.ingest.put_pipeline.assert_called_once()
+        self.assertEqual(self.es_client.ingest.put_pipeline.call_args.kwargs['id'], pipelines.PIPELINE_NAME)
+
+    @override_settings(ELASTICSEARCH_INGEST_PIPELINE={'enabled': True})
+    def test_without_client_nothing_is_installed(self):
+        self.assertEqual(pipelines.bulk_params(), {'pipeline': pipelines.PIPELINE_NAME})
+        self.assertFalse(pipelines._installed)
+
+
+class ClientTests(SimpleTestCase):
+    def setUp(self):
+        clients.reset()
+        self.addCleanup(clients.reset)
+        patcher = mock.patch.object(clients, '_build_minio', side_effect=lambda: object())
+        self.build_minio = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_minio_client_is_built_once(self):
+        self.assertIs(clients.minio(), clients.minio())
+        self.build_minio.assert_called_once()
+
+    def test_reset_drops_the_clients(self):
+        minio_client, es_client = clients.minio(), clients.elasticsearch()
+        clients.reset()
+        self.assertIsNot(clients.minio(), minio_client)
+        self.assertIsNot(clients.elasticsearch(), es_client)
+
+    def test_forked_child_rebuilds_the_clients(self):
+        clients.minio()
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if clients._minio is None else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertIsNotNone(clients._minio)
+
+
+class ReconcileTests(TestCase):
+    def add_file(self, name, credentials, count=None):
+        scrap_file = ScrapFile.objects.create(name=name, sha256=hashlib.sha256(name.encode()).hexdigest())
+        BreachedCredential.objects.bulk_create([
+            BreachedCredential(id=hashlib.md5(f'{name}{i}'.encode()).hexdigest(), string=f'u{i}@x.com:pw', file=scrap_file)
+            for i in range(credentials)
+        ])
+        ScrapFile.objects.filter(id=scrap_file.id).update(count=credentials if count is None else count)
+        return scrap_file.id
+
+    def es_client(self, counts):
+        es_client = mock.Mock()
+        es_client.search.return_value = {'aggregations': {'files': {'buckets': [
+            {'key': file_id, 'doc_count': doc_count} for file_id, doc_count in counts.items()
+        ]}}}
+        return es_client
+
+    def test_matching_files_are_stamped(self):
+        file_id = self.add_file('a.txt', 3)
+        es_client = self.es_client({file_id: 3})
+        self.assertEqual(reconcile.check_files(es_client, ScrapFile.objects.all(), {'a.txt'}), {})
+        self.assertEqual(es_client.search.call_args.kwargs['query'], {'terms': {'file_id': [file_id]}})
+        self.assertIsNotNone(ScrapFile.objects.get(id=file_id).reconciled_at)
+
+    def test_divergent_files_are_reported(self):
+        matching = self.add_file('ok.txt', 2)
+        stale = self.add_file('stale.txt', 2, count=5)
+        unindexed = self.add_file('unindexed.txt', 2)
+        es_client = self.es_client({matching: 2, stale: 2})
+        divergent = reconcile.check_files(es_client, ScrapFile.objects.order_by('id'), {'ok.txt', 'stale.txt'})
+
+        self.assertEqual({file_id: report['problems'] for file_id, report in divergent.items()}, {
+            stale: ['count'],
+            unindexed: ['missing_object', 'elasticsearch'],
+        })
+        self.assertEqual(divergent[stale], {
+            'name': 'stale.txt', 'stored': 5, 'postgres': 2, 'elasticsearch': 2, 'problems': ['count'],
+        })
+        self.assertEqual(
+            list(ScrapFile.objects.filter(reconciled_at__isnull=False).values_list('id', flat=True)), [matching],
+        )
+
+    def test_emptied_file_is_ingested_again(self):
+        scrap_file = ScrapFile(name='a.txt', count=4)
+        self.assertEqual(reconcile.diagnose(scrap_file, 0, 0), ['count', 'ingest'])
+        self.assertEqual(reconcile.diagnose(scrap_file, 0, 0, in_minio=True), ['count', 'ingest'])
+        # Without the MinIO object there is nothing to ingest from
+        self.assertEqual(reconcile.diagnose(scrap_file, 0, 0, in_minio=False), ['missing_object', 'count'])
+
+
+class BulkActionTests(SimpleTestCase):
+    @override_settings(ELASTICSEARCH_INGEST_PIPELINE={'enabled': False})
+    def test_credential_action(self):
+        action = credential_action('id1', 'a@x.com:pw', '2025-05-01T00:00:00', 7)
+        self.assertEqual((action['_op_type'], action['_index'], action['_id']), ('index', INDEX_NAME, 'id1'))
+        self.assertEqual(action['_source'], {
+            'string': 'a@x.com:pw', 'added_at': '2025-05-01T00:00:00', 'file_id': 7,
+            'email': 'a@x.com', 'username': 'a', 'domain': 'x.com', 'password': 'pw',
+        })
+        self.assertEqual(credential_action('id1', 'a@x.com:pw', '2025-05-01T00:00:00', 7, op_type='create')['_op_type'], 'create')
+
+    def test_duplicates_are_not_bulk_failures(self):
+        self.assertEqual(bulk_failures({'errors': False, 'items': [{'create': {'status': 201}}]}), 0)
+        response = {'errors': True, 'items': [
+            {'create': {'_id': 'a', 'status': 201}},
+            {'create': {'_id': 'b', 'status': 409, 'error': {'type': 'version_conflict_engine_exception'}}},
+            {'create': {'_id': 'c', 'status': 400, 'error': {'type': 'mapper_parsing_exception'}}},
+        ]}
+        with self.assertLogs('webui.tasks', 'ERROR'):
+            self.assertEqual(bulk_failures(response), 1)
+
+
+class ByteBatchTests(SimpleTestCase):
+    def test_batches_end_on_newlines_and_keep_the_last_line(self):
+        chunks = [b'a@x.com:1\nb@x', b'.com:2\nc@x.com:3\n', b'd@x.com:4']
+        batches = list(byte_batches(chunks, 8))
+        self.assertEqual(b''.join(batches), b''.join(chunks))
+        self.assertTrue(all(batch.endswith(b'\n') for batch in batches[:-1]))
+        self.assertEqual(batches[-1], b'd@x.com:4')
+
+    def test_long_line_is_not_cut(self):
+        chunks = [b'x' * 10, b'y' * 10, b':pw\nz:1']
+        self.assertEqual(list(byte_batches(chunks, 5)), [b'x' * 10 + b'y' * 10 + b':pw\n', b'z:1'])
+
+    def test_shared_reader_pool_keeps_file_order(self):
+        lines = [f'u{i}@x.com:{i}' for i in range(50)]
+        with start_readers(2) as readers:
+            batches = list(read_batches(
+                (f'{line}\n'.encode() for line in lines), 7, 'idx', workers=2, batch_bytes=64, executor=readers,
+            ))
+            # The pool outlives the stream it read
+            self.assertEqual(readers.submit(int, '3').result(), 3)
+        self.assertGreater(len(batches), 1)
+        self.assertEqual([line for batch in batches for line in batch.strings], lines)
+
+    def test_parse_block_keeps_file_order(self):
+        added_at = datetime(2025, 5, 1, tzinfo=dt_timezone.utc)
+        data = b'b@x.com:2\n  no separator  \na@x.com:1\x00\n\nc@x.com:3'
+        batch = parse_block(data, 7, 'idx', added_at)
+        self.assertEqual(batch.strings, ['b@x.com:2', 'a@x.com:1', 'c@x.com:3'])
+        self.assertEqual(list(batch.ids()), [hashlib.md5(line.encode()).hexdigest() for line in batch.strings])
+        self.assertEqual((batch.file_id, batch.index, batch.added_at, len(batch)), (7, 'idx', added_at, 3))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SEARCH_CACHE={'enabled': True, 'lock_timeout': 5, 'poll_interval': 0.01})
+class SearchCacheTests(SimpleTestCase):
+    def setUp(self):
+        search_cache._lru.clear()
+        search_cache._cache().clear()
+
+    def test_second_call_is_cached(self):
+        compute = mock.Mock(return_value={'hits': 1})
+        self.assertEqual(search_cache.get_or_compute('key', compute), ({'hits': 1}, False))
+        self.assertEqual(search_cache.get_or_compute('key', compute), ({'hits': 1}, True))
+        compute.assert_called_once()
+
+    def test_concurrent_identical_searches_are_coalesced(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'hits': 2}
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(search_cache.get_or_compute('key', compute)))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=lambda: results.append(search_cache.get_or_compute('key', compute)))
+        second.start()
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results, key=lambda result: result[1]), [({'hits': 2}, False), ({'hits': 2}, True)])
+
+    def test_failures_are_not_cached(self):
+        with self.assertRaises(RuntimeError):
+            search_cache.get_or_compute('key', mock.Mock(side_effect=RuntimeError))
+        self.assertEqual(search_cache.get_or_compute('key', lambda: 3), (3, False))
+
+    def test_bump_generation_invalidates_results(self):
+        search_cache.get_or_compute('key', lambda: 'old')
+        before = search_cache.generation()
+        search_cache.bump_generation()
+        self.assertNotEqual(search_cache.generation(), before)
+        self.assertEqual(search_cache.get_or_compute('key', lambda: 'new'), ('new', False))
+
+    def test_results_stay_in_process_by_default(self):
+        with mock.patch.object(search_cache._cache(), 'set') as cache_set:
+            search_cache.get_or_compute('key', lambda: {'password': 'hunter2'})
+        cache_set.assert_not_called()
+        search_cache._lru.clear()
+        self.assertEqual(search_cache.get_or_compute('key', lambda: 'again'), ('again', False))
+
+    @override_settings(SEARCH_CACHE={'enabled': True, 'shared_results': True})
+    def test_shared_results_are_served_to_other_processes(self):
+        search_cache.get_or_compute('key', lambda: 'shared')
+        search_cache._lru.clear()
+        self.assertEqual(search_cache.get_or_compute('key', lambda: 'again'), ('shared', True))
+
+    def test_generation_is_stored_without_expiry(self):
+        with mock.patch.object(search_cache._cache(), 'set') as cache_set:
+            search_cache.bump_generation()
+        self.assertIsNone(cache_set.call_args.kwargs['timeout'])
+
+    def test_evicted_generation_starts_a_new_one(self):
+        search_cache.get_or_compute('key', lambda: 'old')
+        before = search_cache.generation()
+        search_cache._cache().delete(search_cache.GENERATION_KEY)
+        self.assertNotEqual(search_cache.generation(), before)
+        self.assertEqual(search_cache.get_or_compute('key', lambda: 'new'), ('new', False))
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        token = pagination.encode_cursor({'offset': 40}, 'q1')
+        self.assertEqual(pagination.decode_cursor(token, 'q1'), {'offset': 40})
+
+    def test_cursor_of_another_query_is_rejected(self):
+        token = pagination.encode_cursor({'offset': 40}, 'q1')
+        with self.assertRaises(pagination.CursorError):
+            pagination.decode_cursor(token, 'q2')
+
+    def test_malformed_cursor_is_rejected(self):
+        for token in ('not a cursor', pagination.encode_cursor({'offset': 1}, 'q1')[:-3] + '!!!'):
+            with self.assertRaises(pagination.CursorError):
+                pagination.decode_cursor(token, 'q1')
+
+
+@override_settings(SEARCH_PAGINATION={'shallow_limit': 100, 'keep_alive': '1m'})
+class PaginationApplyTests(SimpleTestCase):
+    def setUp(self):
+        self.search = Search(index='idx').query('match', string='example.com')
+        self.es_client = mock.Mock()
+        self.es_client.open_point_in_time.return_value = {'id': 'pit-1'}
+
+    def test_shallow_page_uses_from_size(self):
+        params = {'preference': '_local'}
+        search, out_params, state = pagination.apply(
+            self.es_client, self.search, {'offset': 20}, 20, 'relevance', ['idx'], params,
+        )
+        self.assertEqual((search.to_dict()['from'], search.to_dict()['size']), (20, 20))
+        self.assertEqual(out_params, params)
+        self.assertEqual(state, {'offset': 20})
+        self.es_client.open_point_in_time.assert_not_called()
+
+    def test_deep_page_opens_pit(self):
+        search, out_params, state = pagination.apply(
+            self.es_client, self.search, {'offset': 100}, 20, 'date', ['idx'],
+            {'routing': 'r', 'preference': '_local', 'timeout': '5s'},
+        )
+        self.es_client.open_point_in_time.assert_called_once_with(index='idx', keep_alive='1m', routing='r', preference='_local')
+        body = search.to_dict()
+        self.assertEqual(body['pit'], {'id': 'pit-1', 'keep_alive': '1m'})
+        self.assertEqual(body['from'], 100)
+        self.assertEqual(body['sort'], [{'added_at': {'order': 'desc'}}, {'_shard_doc': 'asc'}])
+        self.assertEqual(search._index, None)
+        self.assertEqual(out_params, {'timeout': '5s'})
+        self.assertEqual(state, {'pit': 'pit-1', 'offset': 100})
+
+    def test_pit_page_continues_after_last_sort(self):
+        search, _, _ = pagination.apply(
+            self.es_client, self.search, {'pit': 'pit-1', 'after': [5, 9]}, 20, 'relevance', ['idx'], {},
+        )
+        body = search.to_dict()
+        self.assertEqual(body['search_after'], [5, 9])
+        self.assertNotIn('from', body)
+        self.es_client.open_point_in_time.assert_not_called()
+
+    def test_too_deep_offset_is_rejected(self):
+        with self.assertRaises(pagination.CursorError):
+            pagination.apply(self.es_client, self.search, {'offset': pagination.MAX_RESULT_WINDOW}, 20, 'relevance', ['idx'], {})
+
+    def test_next_state_of_offsets(self):
+        self.assertEqual(pagination.next_state(self.es_client, {'offset': 20}, 20, 20, 100, None, None), {'offset': 40})
+        self.assertIsNone(pagination.next_state(self.es_client, {'offset': 80}, 20, 20, 100, None, None))
+
+    def test_next_state_of_pit(self):
+        state = {'pit': 'pit-1', 'offset': 100}
+        self.assertEqual(
+            pagination.next_state(self.es_client, state, 20, 20, 5000, [5, 9], 'pit-2'),
+            {'pit': 'pit-2', 'after': [5, 9]},
+        )
+        self.es_client.close_point_in_time.assert_not_called()
+        self.assertIsNone(pagination.next_state(self.es_client, state, 20, 7, 5000, [5, 9], 'pit-2'))
+        self.es_client.close_point_in_time.assert_called_once_with(id='pit-2')
+
+
+class ExportTests(SimpleTestCase):
+    def hit(self, slice_id, position):
+        return {'_id': f'c{slice_id}-{position}', '_source': {'string': f'u{position}@x.com:pw'}, 'sort': [position]}
+
+    def es_client(self, slices):
+        """A client serving each slice's hits page by page, continuing after `search_after`."""
+        es_client = mock.Mock()
+        es_client.open_point_in_time.return_value = {'id': 'pit-1'}
+
+        def search(**request):
+            hits = slices[request.get('slice', {}).get('id', 0)]
+            start = request['search_after'][0] + 1 if 'search_after' in request else 0
+            return {'hits': {'hits': hits[start:start + request['size']]}}
+
+        es_client.search.side_effect = search
+        return es_client
+
+    def iter_hits(self, es_client, **kwargs):
+        search = mock.Mock()
+        search.to_dict.return_value = {'query': {'match_all': {}}, 'size': 20}
+        with mock.patch.object(clients, 'elasticsearch', return_value=es_client):
+            return list(export.iter_hits(search, ['idx'], **kwargs))
+
+    def test_every_slice_is_read_to_the_end(self):
+        slices = [[self.hit(n, i) for i in range(5)] for n in range(3)]
+        es_client = self.es_client(slices)
+        stats = export.ExportStats()
+        pages = self.iter_hits(es_client, slices=3, page_size=2, stats=stats)
+
+        self.assertEqual(
+            sorted(row['id'] for rows in pages for row in rows),
+            sorted(hit['_id'] for hits in slices for hit in hits),
+        )
+        self.assertEqual(stats.docs, 15)
+        # Pages of 2, 2 and 1 hits per slice
+        self.assertEqual(es_client.search.call_count, 9)
+        request = es_client.search.call_args_list[0].kwargs
+        self.assertEqual((request['pit'], request['slice']['max'], request['size']), ({'id': 'pit-1', 'keep_alive': '5m'}, 3, 2))
+        self.assertNotIn('from', request)
+        es_client.close_point_in_time.assert_called_once_with(id='pit-1')
+
+    def test_single_slice_is_not_sliced(self):
+        es_client = self.es_client([[self.hit(0, i) for i in range(3)]])
+        pages = self.iter_hits(es_client, slices=1, page_size=5)
+        self.assertEqual([len(rows) for rows in pages], [3])
+        self.assertNotIn('slice', es_client.search.call_args.kwargs)
+
+    def test_failing_slice_fails_the_export(self):
+        es_client = self.es_client([[self.hit(0, i) for i in range(5)]] * 2)
+        es_client.search.side_effect = RuntimeError('shard failure')
+        with self.assertLogs('webui.export', 'ERROR'), self.assertRaises(RuntimeError):
+            self.iter_hits(es_client, slices=2, page_size=2)
+        es_client.close_point_in_time.assert_called_once_with(id='pit-1')
+
+    def test_render_and_compress(self):
+        rows = [{**dict.fromkeys(export.COLUMNS), 'id': 'c1', 'string': 'a@x.com:pw'}]
+        ndjson = b''.join(export.render([rows]))
+        self.assertEqual(json.loads(ndjson)['string'], 'a@x.com:pw')
+        lines = b''.join(export.render([rows], 'csv')).decode().splitlines()
+        self.assertEqual(lines, [','.join(export.COLUMNS), 'c1,a@x.com:pw,,,,,,,,'])
+        self.assertEqual(gzip.decompress(b''.join(export.gzip_chunks(export.render([rows])))), ndjson)
+
+
+class AsyncSearchStatusTests(SimpleTestCase):
+    def response(self, **body):
+        return {'id': 'job-1', 'start_time_in_millis': 1, 'expiration_time_in_millis': 2, **body}
+
+    def test_running_job_reports_progress(self):
+        job = async_search.job_status(self.response(is_running=True, is_partial=True, response={
+            '_shards': {'total': 4, 'successful': 1, 'skipped': 1, 'failed': 0},
+            'hits': {'total': {'value': 7}, 'hits': [{'_id': 'c1', '_source': {'string': 'a@x.com:pw', 'email': 'a@x.com'}}]},
+        }))
+        self.assertEqual((job['job_id'], job['status'], job['progress'], job['total']), ('job-1', 'running', 0.5, 7))
+        self.assertEqual(
+            (job['results'][0]['id'], job['results'][0]['email'], job['results'][0]['file_name']), ('c1', 'a@x.com', None),
+        )
+
+    def test_finished_job(self):
+        job = async_search.job_status(self.response(is_running=False, is_partial=False, response={
+            '_shards': {'total': 2, 'successful': 2}, 'hits': {'total': {'value': 0}, 'hits': []},
+        }))
+        self.assertEqual((job['status'], job['progress'], job['results']), ('done', 1.0, []))
+
+    def test_response_objects_are_unwrapped(self):
+        job = async_search.job_status(mock.Mock(body=self.response(is_running=True)))
+        self.assertEqual((job['job_id'], job['status'], job['progress'], job['total']), ('job-1', 'running', 0.0, 0))
+
+    def test_failed_job(self):
+        job = async_search.job_status(self.response(
+            is_running=False, error={'type': 'search_phase_execution_exception', 'reason': 'all shards failed'},
+        ))
+        self.assertEqual((job['status'], job['error']), ('failed', 'all shards failed'))
+
+    def test_partial_job(self):
+        job = async_search.job_status(self.response(is_running=False, is_partial=True, response={
+            '_shards': {'total': 2, 'successful': 1, 'failed': 1, 'failures': [{'reason': {'reason': 'timed out'}}]},
+            'hits': {'total': {'value': 3}, 'hits': []},
+        }))
+        self.assertEqual((job['status'], job['progress'], job['shard_failures']), ('partial', 1.0, ['timed out']))
+
+    def test_poll_errors_keep_the_upstream_status(self):
+        request = RequestFactory().get('/search/async/job-1/')
+        error = ApiError('search_phase_execution_exception', meta=mock.Mock(status=503), body={})
+        with mock.patch.object(async_search, 'get', side_effect=error):
+            response = views.async_search_job(request, 'job-1')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.content)['status'], 'error')
+        error = NotFoundError('resource_not_found_exception', meta=mock.Mock(status=404), body={})
+        with mock.patch.object(async_search, 'get', side_effect=error):
+            self.assertEqual(views.async_search_job(request, 'job-1').status_code, 404)
+
+
+class BulkLookupNormalizeTests(SimpleTestCase):
+    def test_strips_lowercases_and_dedupes_in_order(self):
+        values = [' B@x.com ', 'a@x.com', '', 'b@X.com', '  ']
+        self.assertEqual(bulk_lookup.normalize(values, 'email'), ['b@x.com', 'a@x.com'])
+
+    def test_unknown_field(self):
+        with self.assertRaises(bulk_lookup.BulkLookupError):
+            bulk_lookup.normalize(['a'], 'password')
+
+    def test_too_many_inputs(self):
+        with self.assertRaises(bulk_lookup.BulkLookupError):
+            bulk_lookup.normalize(['a', 'b', 'c'], 'username', max_inputs=2)
+        self.assertEqual(bulk_lookup.normalize(['a', 'b', 'a'], 'username', max_inputs=2), ['a', 'b'])
+
+    def test_non_string_values(self):
+        with self.assertRaises(bulk_lookup.BulkLookupError):
+            bulk_lookup.normalize(['a', 1], 'username')
+
+    def test_hits_per_input(self):
+        self.assertEqual(bulk_lookup.parse_hits_per_input('5'), 5)
+        self.assertEqual(bulk_lookup.parse_hits_per_input(None), bulk_lookup.config()['hits_per_input'])
+        for value in (-1, bulk_lookup.MAX_HITS_PER_INPUT + 1, 'x', 1.5, True):
+            with self.assertRaises(bulk_lookup.BulkLookupError):
+                bulk_lookup.parse_hits_per_input(value)
+
+
+class WatchlistTests(TestCase):
+    def setUp(self):
+        # Saving a watch registers it in the percolator index
+        patcher = mock.patch('webui.watchlist.sync_watch')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_matches(self, count):
+        watch = Watch.objects.create(name='ACME', kind=Watch.DOMAIN, value='acme.com')
+        scrap_file = ScrapFile.objects.create(name='a.txt', sha256=hashlib.sha256(b'a').hexdigest())
+        WatchMatch.objects.bulk_create([
+            WatchMatch(watch=watch, credential_id=f'c{i}', string=f'u{i}@acme.com:pw', file=scrap_file)
+            for i in range(count)
+        ])
+
+    def test_watch_queries(self):
+        self.assertEqual(watchlist.watch_query(Watch(kind=Watch.DOMAIN, value=' Acme.COM ')), {'term': {'domain': 'acme.com'}})
+        self.assertEqual(
+            watchlist.watch_query(Watch(kind=Watch.KEYWORD, value='Acme')),
+            {'wildcard': {'string.lower': {'value': '*acme*'}}},
+        )
+        self.assertEqual(
+            watchlist.watch_query(Watch(kind=Watch.KEYWORD, value='admin@*')),
+            {'wildcard': {'string.lower': {'value': 'admin@*'}}},
+        )
+
+    @override_settings(WATCHLIST={'notify_batch': 2})
+    def test_pending_matches_are_sent_once(self):
+        self.add_matches(3)
+        notifier = mock.Mock()
+        with mock.patch('webui.watchlist.import_string', return_value=notifier):
+            self.assertEqual(watchlist.notify_pending(), 3)
+            self.assertEqual(watchlist.notify_pending(), 0)
+        self.assertEqual([len(call.args[0]) for call in notifier.call_args_list], [2, 1])
+        self.assertEqual(
+            notifier.call_args_list[0].args[0][0],
+            {**notifier.call_args_list[0].args[0][0], 'watch': 'ACME', 'kind': 'domain', 'credential_id': 'c0'},
+        )
+        self.assertFalse(WatchMatch.objects.filter(notified_at__isnull=True).exists())
+
+    def test_failed_notification_stays_pending(self):
+        self.add_matches(2)
+        with mock.patch('webui.watchlist.import_string', return_value=mock.Mock(side_effect=RuntimeError)):
+            with self.assertRaises(RuntimeError):
+                watchlist.notify_pending()
+        self.assertEqual(WatchMatch.objects.filter(notified_at__isnull=True).count(), 2)
+
+
+class FakeSearch:
+    """Stands in for a Search over `total` hits numbered from 0; records each from/size window."""
+
+    def __init__(self, total, relation='eq', requests=None, window=slice(0, 10)):
+        self.total, self.relation, self.window = total, relation, window
+        self.requests = [] if requests is None else requests
+
+    def __getitem__(self, window):
+        return FakeSearch(self.total, self.relation, self.requests, window)
+
+    def extra(self, size):
+        return self[0:size]
+
+    def execute(self):
+        self.requests.append((self.window.start, self.window.stop))
+        hits = list(range(self.total))[self.window]
+        return SimpleNamespace(hits=SimpleNamespace(total=SimpleNamespace(value=self.total, relation=self.relation)), rows=hits)
+
+
+class SearchPaginatorTests(SimpleTestCase):
+    def paginator(self, search, per_page=10, **kwargs):
+        return pagination.SearchPaginator(search, per_page, hydrate=lambda response: response.rows, **kwargs)
+
+    def test_page_takes_the_count_from_its_search(self):
+        search = FakeSearch(25)
+        paginator = self.paginator(search)
+        page = paginator.page(2)
+        self.assertEqual(list(page), list(range(10, 20)))
+        self.assertEqual((paginator.count, paginator.num_pages, page.has_next()), (25, 3, True))
+        self.assertEqual(search.requests, [(10, 20)])
+
+    def test_count_before_page(self):
+        search = FakeSearch(25)
+        self.assertEqual(self.paginator(search).count, 25)
+        self.assertEqual(search.requests, [(0, 0)])
+
+    def test_lower_bound_totals(self):
+        paginator = self.paginator(FakeSearch(50000, relation='gte'))
+        paginator.page(1)
+        self.assertEqual((paginator.total, paginator.total_is_lower_bound), (50000, True))
+        self.assertEqual(paginator.count, pagination.MAX_RESULT_WINDOW)
+
+    def test_pages_past_the_end(self):
+        with self.assertRaises(EmptyPage):
+            self.paginator(FakeSearch(25)).page(4)
+        with self.assertRaises(InvalidPage):
+            self.paginator(FakeSearch(50000)).page(pagination.MAX_RESULT_WINDOW // 10 + 1)
+        with self.assertRaises(PageNotAnInteger):
+            self.paginator(FakeSearch(25)).page('last')
+
+    def test_empty_first_page(self):
+        self.assertEqual(list(self.paginator(FakeSearch(0)).page(1)), [])
+        with self.assertRaises(EmptyPage):
+            self.paginator(FakeSearch(0), allow_empty_first_page=False).page(1)
+
+    def test_orphans_fold_into_the_last_page(self):
+        search = FakeSearch(23)
+        paginator = self.paginator(search, orphans=3)
+        self.assertEqual(list(paginator.page(1)), list(range(10)))
+        self.assertEqual(list(paginator.page(2)), list(range(10, 23)))
+        self.assertEqual(paginator.num_pages, 2)
+        self.assertEqual(search.requests, [(0, 13), (10, 23)])
+
+
+class CredentialChangeListTests(SimpleTestCase):
+    def changelist(self, query_string='', total=10000):
+        """Build the credential changelist with every Elasticsearch search answered by fake hits."""
+        requests = self.requests = getattr(self, 'requests', [])
+
+        def execute(search, ignore_cache=False):
+            body = search.to_dict()
+            requests.append(body)
+            hits = [
+                {'_id': f'c{i}', '_index': 'idx', '_source': {'string': f'u{i}@x.com:pw'}, 'sort': [1, i]}
+                for i in range(min(body.get('size', 10), total))
+            ]
+            return search._response_class(search, {'hits': {'total': {'value': total, 'relation': 'gte'}, 'hits': hits}})
+
+        request = RequestFactory().get(f'/admin/webui/breachedcredential/{query_string}')
+        request.user = mock.Mock(is_active=True, is_staff=True)
+        with mock.patch.object(Search, 'execute', execute):
+            return admin.site._registry[BreachedCredential].get_changelist_instance(request)
+
+    def test_rows_come_from_search_hits(self):
+        changelist = self.changelist('?q=example.com')
+        self.assertEqual(len(changelist.result_list), changelist.list_per_page)
+        self.assertEqual((changelist.result_list[0].pk, changelist.result_list[0].string), ('c0', 'u0@x.com:pw'))
+        self.assertEqual((changelist.result_count, changelist.result_count_is_lower_bound), (10000, True))
+        self.assertEqual((self.requests[0]['from'], self.requests[0]['size']), (0, changelist.list_per_page))
+        self.assertIn('example.com', str(self.requests[0]['query']))
+
+    def test_next_page_continues_from_the_cursor(self):
+        first = self.changelist('?q=example.com')
+        self.assertIn('cursor=', first.next_page_url)
+        second = self.changelist(first.next_page_url)
+        self.assertEqual(self.requests[-1]['from'], first.list_per_page)
+        self.assertEqual(second.query, 'example.com')
+
+    def test_last_page_has_no_next_link(self):
+        self.assertIsNone(self.changelist('?q=example.com', total=3).next_page_url)
+
+    def test_listing_without_query_is_newest_first(self):
+        self.changelist()
+        self.assertEqual(self.requests[0]['sort'], [{'added_at': {'order': 'desc'}}])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CountingTests(SimpleTestCase):
+    def setUp(self):
+        counting._cache().clear()
+        patcher = mock.patch.object(counting, 'async_task')
+        self.async_task = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_estimate_mode(self):
+        with mock.patch.object(counting, 'estimate', return_value=1234):
+            self.assertEqual(
+                counting.count(BreachedCredential, 'estimate'), {'value': 1234, 'exact': False, 'counted_at': None},
+            )
+        self.async_task.assert_not_called()
+
+    def test_cached_mode_queues_one_refresh(self):
+        with mock.patch.object(counting, 'estimate', return_value=1234):
+            self.assertEqual(counting.count(BreachedCredential)['value'], 1234)
+            self.assertEqual(counting.count(BreachedCredential)['value'], 1234)
+        self.async_task.assert_called_once_with('webui.counting.refresh', 'webui.BreachedCredential', group='counting')
+
+    def test_cached_mode_serves_the_refreshed_count(self):
+        with mock.patch.object(counting, 'estimate', return_value=1234):
+            counting.count(BreachedCredential)
+        with mock.patch.object(BreachedCredential.objects, 'count', return_value=1300):
+            counting.refresh('webui.BreachedCredential')
+        result = counting.count(BreachedCredential)
+        self.assertEqual((result['value'], result['exact']), (1300, True))
+        # The refresh released its lock, so the next expiry queues a new one
+        self.assertTrue(counting.queue_refresh(BreachedCredential))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            counting.count(BreachedCredential, 'approximate')
+
+    @override_settings(COUNTING={'track_total_hits': 500})
+    def test_search_totals_are_limited(self):
+        self.assertEqual(counting.limit_total_hits(Search()).to_dict(), {'track_total_hits': 500})
+
+    def test_never_analyzed_table_has_no_count(self):
+        with mock.patch.object(counting, 'estimate', return_value=None), mock.patch.object(counting, 'exact') as exact:
+            self.assertEqual(counting.count(BreachedCredential, 'estimate')['value'], None)
+            self.assertEqual(counting.count(BreachedCredential)['value'], None)
+        exact.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RollupTests(TestCase):
+    def add_file(self, name, days):
+        scrap_file = ScrapFile.objects.create(name=name, sha256=hashlib.sha256(name.encode()).hexdigest())
+        for n, (day, credentials) in enumerate(days.items()):
+            ids = [hashlib.md5(f'{name}{n}{i}'.encode()).hexdigest() for i in range(credentials)]
+            BreachedCredential.objects.bulk_create(
+                [BreachedCredential(id=cred_id, string=f'{cred_id}@x.com:pw', file=scrap_file) for cred_id in ids]
+            )
+            BreachedCredential.objects.filter(id__in=ids).update(
+                added_at=datetime(day.year, day.month, day.day, 12, tzinfo=dt_timezone.utc),
+            )
+        return scrap_file
+
+    def test_update_file_rolls_up_days_and_sources(self):
+        first = self.add_file('combo/a.txt', {date(2025, 5, 1): 3, date(2025, 5, 2): 2})
+        second = self.add_file('combo/b.txt', {date(2025, 5, 2): 4})
+        rollups.update_file(first.id)
+        rollups.update_file(second.id)
+
+        self.assertEqual(
+            list(FileDailyStat.objects.filter(file=first).order_by('day').values_list('day', 'credentials')),
+            [(date(2025, 5, 1), 3), (date(2025, 5, 2), 2)],
+        )
+        self.assertEqual(
+            list(DailyStat.objects.order_by('day').values_list('day', 'credentials', 'files')),
+            [(date(2025, 5, 1), 3, 1), (date(2025, 5, 2), 6, 2)],
+        )
+        source = SourceStat.objects.get(source='combo')
+        self.assertEqual((source.files, source.credentials), (2, 9))
+        self.assertEqual(rollups.update_file(first.id)['credentials'], 5)
+        self.assertEqual(ScrapFile.objects.get(id=first.id).count, 5)
+
+    def test_update_file_replaces_earlier_rollups(self):
+        scrap_file = self.add_file('root.txt', {date(2025, 5, 1): 3})
+        rollups.update_file(scrap_file.id)
+        BreachedCredential.objects.filter(file=scrap_file).update(
+            added_at=datetime(2025, 5, 3, 12, tzinfo=dt_timezone.utc),
+        )
+        rollups.update_file(scrap_file.id)
+
+        self.assertEqual(list(DailyStat.objects.values_list('day', 'credentials')), [(date(2025, 5, 3), 3)])
+        self.assertEqual(SourceStat.objects.get(source='root').credentials, 3)
+
+    def test_missing_file_is_skipped(self):
+        self.assertEqual(rollups.update_file(12345), {'file_id': 12345, 'days': 0, 'credentials': 0})
+
+
+class PartitionSearchTests(SimpleTestCase):
+    def test_unpartitioned_search_targets_read_alias(self):
+        search, indices, _ = build_search('example.com')
+        self.assertEqual(indices, [partitions.READ_ALIAS])
+        self.assertEqual(search._index, [partitions.READ_ALIAS])
+
+    @override_settings(ELASTICSEARCH_PARTITIONING={'enabled': True})
+    def test_partition_search_replaces_default_index(self):
+        search, indices, _ = build_search('example.com', partition_keys=['2025.05'])
+        self.assertEqual(indices, ['breached_credentials-2025.05-*'])
+        self.assertEqual(search._index, ['breached_credentials-2025.05-*'])
+
+    @override_settings(ELASTICSEARCH_PARTITIONING={'enabled': True})
+    def test_several_partitions(self):
+        search, _, _ = build_search('example.com', partition_keys=['2025.04', '2025.05'])
+        self.assertEqual(search._index, ['breached_credentials-2025.04-*', 'breached_credentials-2025.05-*'])
+
+    @override_settings(ELASTICSEARCH_PARTITIONING={'enabled': False})
+    def test_partition_keys_ignored_when_disabled(self):
+        search, _, _ = build_search('example.com', partition_keys=['2025.05'])
+        self.assertEqual(search._index, [partitions.READ_ALIAS])
+
+    def test_empty_query_only_applies_filters(self):
+        search, _, _ = build_search('', email_only=True, domain='Example.com')
+        self.assertEqual(search.to_dict(), {'query': {'bool': {'filter': [
+            {'exists': {'field': 'email'}},
+            {'term': {'domain': 'example.com'}},
+        ]}}})
+        self.assertEqual(build_search('')[0].to_dict(), {})
@@ -6,6 +6,10 @@ from .views import (
     BreachedCredentialDeleteView,
     BreachedCredentialDetailView,
     search_credentials,
+    export_credentials,
+    submit_async_search,
+    async_search_job,
+    lookup_credentials,
 )
 
 app_name = "webui"
@@ -17,4 +21,8 @@ urlpatterns = [
     path("<int:pk>/update/", BreachedCredentialUpdateView.as_view(), name="update"),
     path("<int:pk>/delete/", BreachedCredentialDeleteView.as_view(), name="delete"),
     path("search/", search_credentials, name="search"),
+    path("export/", export_credentials, name="export"),
+    path("search/async/", submit_async_search, name="async-search"),
+    path("search/async/<str:job_id>/", async_search_job, name="async-search-job"),
+    path("lookup/", lookup_credentials, name="lookup"),
 ]
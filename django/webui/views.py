@@ -2,92 +2,92 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView, TemplateView
 from django.urls import reverse_lazy
 from .models import BreachedCredential, ScrapFile
-from .documents import BreachedCredentialDocument
-from elasticsearch_dsl import Q
-from django.http import JsonResponse
+from . import async_search, bulk_lookup, clients, counting, export, file_cache, pagination, rollups, search_cache
+from .queries import build_search
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.core.paginator import Paginator
+from elasticsearch import ApiError, NotFoundError
 from django.conf import settings
+import json
 import logging
 import time
 
 logger = logging.getLogger(__name__)
 
+def credential_rows(response) -> list[dict]:
+    """Rows of the credential list from search hits, with file fields from the file cache."""
+    files = file_cache.get_many(getattr(hit, 'file_id', None) for hit in response)
+    rows = []
+    for hit in response:
+        file_meta = files.get(getattr(hit, 'file_id', None))
+        rows.append({
+            'id': hit.meta.id,
+            'pk': hit.meta.id,
+            'string': hit.string,
+            'added_at': getattr(hit, 'added_at', None),
+            'email': getattr(hit, 'email', None),
+            'username': getattr(hit, 'username', None),
+            'domain': getattr(hit, 'domain', None),
+            'password': getattr(hit, 'password', None),
+            'url_host': getattr(hit, 'url_host', None),
+            'file': {
+                'id': file_meta['file_id'],
+                'name': file_meta['file_name'],
+                'size': file_meta['file_size'],
+                'uploaded_at': parse_datetime(file_meta['file_uploaded_at']),
+            } if file_meta else None,
+        })
+    return rows
+
+
 # List View
 class BreachedCredentialListView(ListView):
+    """Credential list and search page; runs the search API's Elasticsearch query, not ORM scans."""
     model = BreachedCredential
     template_name = "webui/list.html"
     context_object_name = "credentials"
     paginate_by = 20
     
     def get_queryset(self):
-        queryset = super().get_queryset()
-        
         # Get search parameters
         query = self.request.GET.get('q', '')
         search_type = self.request.GET.get('search_type', 'case_insensitive')
         field = self.request.GET.get('field', 'string')
         email_only = self.request.GET.get('email_only', 'false').lower() == 'true'
+        domain = self.request.GET.get('domain') or None
         sort_order = self.request.GET.get('sort', 'relevance')
-        
-        # Store initial query count for metrics
-        self.initial_count = queryset.count()
+        partition_keys = [p for p in self.request.GET.get('partition', '').split(',') if p]
         
         # Reset search error and fallback flags
         self.search_error = None
         self.search_suggestion = None
         self.search_fallback = None
         
-        if query:
-            try:
-                # Choose search strategy based on search_type parameter
-                if search_type == 'exact':
-                    # Use filter here as we're not using Elasticsearch yet
-                    queryset = queryset.filter(string__exact=query)
-                elif search_type == 'wildcard':
-                    # Simulate wildcard with contains
-                    queryset = queryset.filter(string__contains=query)
-                elif search_type == 'regexp':
-                    # For regexp, we'll need to use icontains as a simpler alternative
-                    queryset = queryset.filter(string__icontains=query)
-                elif search_type == 'match':
-                    # Match query in ES, in Django we'll use contains
-                    queryset = queryset.filter(string__contains=query)
-                else:
-                    # Default case-insensitive search
-                    queryset = queryset.filter(string__icontains=query)
-                
-                # Apply field filtering if needed
-                if field == 'username':
-                    # Ensure the string has a colon and filter for the username part
-                    queryset = queryset.filter(string__regex=r'^[^:]+:')
-                elif field == 'password':
-                    # Ensure the string has a colon and password part
-                    queryset = queryset.filter(string__regex=r':.+')
-                
-                # Add email filter if requested
-                if email_only:
-                    queryset = queryset.filter(string__regex=r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
-                
-                # Apply sorting
-                if sort_order == 'date':
-                    queryset = queryset.order_by('-added_at')
-                    
-            except Exception as e:
-                logger.error(f"Search error in ListView: {str(e)}")
-                self.search_error = f"Search error: {str(e)}"
-                self.search_suggestion = "Try a simpler search query or a different search type."
-                
-                # Fallback to a very basic search
-                try:
-                    queryset = queryset.filter(string__icontains=query)[:100]
-                    self.search_fallback = "Search encountered an error. Showing limited basic results."
-                except Exception as fallback_e:
-                    # If even the basic search fails, return an empty queryset
-                    logger.error(f"Fallback search error: {str(fallback_e)}")
-                    queryset = BreachedCredential.objects.none()
+        search, indices, params = build_search(query, search_type, field, email_only, domain, partition_keys)
         
-        return queryset
+        # Apply sorting; without a query the page lists the newest credentials
+        if sort_order == 'date' or not query:
+            search = search.sort('-added_at')
+        return counting.limit_total_hits(search).params(**params)
+    
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return pagination.SearchPaginator(
+            queryset, per_page, hydrate=credential_rows,
+            orphans=orphans, allow_empty_first_page=allow_empty_first_page, **kwargs,
+        )
+    
+    def paginate_queryset(self, queryset, page_size):
+        try:
+            return super().paginate_queryset(queryset, page_size)
+        except Http404:
+            raise
+        except Exception as e:
+            logger.error(f"Search error in ListView: {str(e)}")
+            self.search_error = f"Search error: {str(e)}"
+            self.search_suggestion = "Try a simpler search query or a different search type."
+            return None, None, [], False
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -98,6 +98,9 @@ class BreachedCredentialListView(ListView):
         context['field'] = self.request.GET.get('field', 'string')
         context['email_only'] = self.request.GET.get('email_only', 'false').lower() == 'true'
         context['sort_order'] = self.request.GET.get('sort', 'relevance')
+        paginator = context.get('paginator')
+        context['total'] = paginator.total if paginator else 0
+        context['total_is_lower_bound'] = paginator.total_is_lower_bound if paginator else False
         
         # Add error and fallback messages
         context['search_error'] = getattr(self, 'search_error', None)
@@ -139,110 +142,30 @@ class BreachedCredentialDeleteView(DeleteView):
 
 # Dashboard View
 class DashboardView(TemplateView):
+    """Overview page; renders from the stats rollups and cached cluster stats (see webui/rollups.py)."""
     template_name = "webui/dashboard.html"
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        from elasticsearch_dsl.connections import get_connection
-        from django.db.models import Count
-        import datetime
-        import elastic_transport  # Import for exception handling
-        
-        # Initialize default values for ES stats
-        context.update({
-            "es_status": "error",
-            "es_error": "Not connected",
-            "es_health": {},
-            "es_indices": [],
-            "es_nodes": [],
-            "doc_count": 0,
-            "store_size": 0,
-            "query_total": 0,
-            "query_time": 0,
-            "fetch_total": 0,
-            "fetch_time": 0,
-        })
+        # Elasticsearch cluster health, indices, nodes and index stats, cached for a few seconds
+        context.update(rollups.es_stats())
         
-        # Get Elasticsearch cluster health with timeout handling
-        try:
-            es_client = get_connection()
-            # Use a shorter timeout for initial health check to make the page load faster
-            health = es_client.cluster.health(request_timeout=5)
-            
-            # Only fetch additional details if basic health check succeeds
-            context["es_health"] = health
-            context["es_status"] = "connected"
-            
-            try:
-                # Get indices
-                indices = es_client.cat.indices(format="json")
-                context["es_indices"] = indices
-                
-                # Get nodes
-                nodes = es_client.cat.nodes(format="json")
-                context["es_nodes"] = nodes
-                
-                # Check if the index exists first - note: the correct index name is 'breached_credentials' (plural)
-                if es_client.indices.exists(index='breached_credentials', request_timeout=5):
-                    try:
-                        index_stats = es_client.indices.stats(index='breached_credentials', request_timeout=5)
-                        
-                        # Extract statistics for template (avoiding underscore-prefixed attributes)
-                        if index_stats and '_all' in index_stats and 'primaries' in index_stats['_all']:
-                            primaries = index_stats['_all']['primaries']
-                            
-                            # Document count
-                            if 'docs' in primaries and 'count' in primaries['docs']:
-                                context['doc_count'] = primaries['docs']['count']
-                            
-                            # Storage size
-                            if 'store' in primaries and 'size_in_bytes' in primaries['store']:
-                                context['store_size'] = primaries['store']['size_in_bytes']
-                            
-                            # Query stats
-                            if 'search' in primaries:
-                                context['query_total'] = primaries['search'].get('query_total', 0)
-                                context['query_time'] = primaries['search'].get('query_time_in_millis', 0)
-                                context['fetch_total'] = primaries['search'].get('fetch_total', 0)
-                                context['fetch_time'] = primaries['search'].get('fetch_time_in_millis', 0)
-                    except (elastic_transport.ConnectionTimeout, Exception) as e:
-                        logger.warning(f"Error fetching index stats: {str(e)}. Dashboard will show limited information.")
-                else:
-                    logger.warning("Index 'breached_credentials' does not exist yet. This is normal if no data has been indexed.")
-            except (elastic_transport.ConnectionTimeout, Exception) as e:
-                logger.warning(f"Error fetching ES details: {str(e)}. Dashboard will show limited information.")
-                
-        except (elastic_transport.ConnectionTimeout, Exception) as e:
-            logger.error(f"Error connecting to Elasticsearch: {str(e)}")
-            context["es_error"] = f"Connection issue: {str(e)}"
-        
-        # Get database stats
-        context["total_credentials"] = BreachedCredential.objects.count()
+        # Get database stats; the credential count is the cached exact count or the planner estimate
+        credentials = counting.count(BreachedCredential)
+        context["total_credentials"] = credentials['value']
+        context["total_credentials_exact"] = credentials['exact']
+        context["total_credentials_counted_at"] = credentials['counted_at']
         context["total_files"] = ScrapFile.objects.count()
         
         # Get recent files
         context["recent_files"] = ScrapFile.objects.all().order_by('-added_at')[:5]
+        context["source_stats"] = rollups.top_sources()
         
-        # Get credential count by date (last 7 days)
-        from django.utils import timezone
-        end_date = timezone.now()
-        start_date = end_date - datetime.timedelta(days=7)
-        
-        try:
-            daily_counts = BreachedCredential.objects.filter(
-                added_at__range=(start_date, end_date)
-            ).extra({
-                'day': "date(added_at)"
-            }).values('day').annotate(count=Count('id')).order_by('day')
-            
-            # Format data for chart
-            context["credential_dates"] = [entry['day'].strftime('%Y-%m-%d') for entry in daily_counts]
-            context["credential_counts"] = [entry['count'] for entry in daily_counts]
-        except Exception as e:
-            logger.error(f"Error generating daily counts: {str(e)}")
-            context["credential_dates"] = []
-            context["credential_counts"] = []
+        # Get credential count by date (last 7 days) from the daily rollup
+        daily_counts = rollups.daily(days=7)
+        context["credential_dates"] = [stat.day.strftime('%Y-%m-%d') for stat in daily_counts]
+        context["credential_counts"] = [stat.credentials for stat in daily_counts]
         
         return context
 
@@ -253,11 +176,15 @@ def search_credentials(request):
         # Get search parameters from request
         query = request.GET.get('q', '')
         page = int(request.GET.get('page', 1))
-        per_page = int(request.GET.get('per_page', 20))
+        per_page = min(int(request.GET.get('per_page', 20)), pagination.config()['max_per_page'])
+        cursor = request.GET.get('cursor')  # Opaque next_cursor of a previous response
         search_type = request.GET.get('search_type', 'case_insensitive')  # Default to case-insensitive
-        field = request.GET.get('field', 'string')  # Options: string, username, password
+        field = request.GET.get('field', 'string')  # Options: string, email, username, domain, password, url_host
         email_only = request.GET.get('email_only', 'false').lower() == 'true'  # Filter for emails only
+        domain = request.GET.get('domain') or None  # Restrict to credentials of one email domain
         sort_order = request.GET.get('sort', 'relevance')  # Options: relevance, date
+        # Optional comma-separated partition keys to restrict the search to
+        partition_keys = [p for p in request.GET.get('partition', '').split(',') if p]
         
         logger.debug(f"Search request: query='{query}', type={search_type}, field={field}, email_only={email_only}, sort={sort_order}")
 
@@ -273,83 +200,81 @@ def search_credentials(request):
                 'sort_order': sort_order
             })
 
-        # Choose search strategy based on search_type parameter
-        if search_type == 'exact':
-            # Term query - exact match
-            search_query = Q('term', string=query)
-        elif search_type == 'wildcard':
-            # Wildcard search that matches any string containing the query
-            search_query = Q('wildcard', string={'value': f'*{query}*'})
-        elif search_type == 'regexp':
-            # Create a case-insensitive regexp pattern
-            pattern = ".*"
-            for char in query:
-                if char.isalpha():
-                    pattern += f"[{char.lower()}{char.upper()}]"
-                else:
-                    pattern += char
-            pattern += ".*"
-            search_query = Q('regexp', string={'value': pattern})
-        elif search_type == 'match':
-            # Standard match query
-            search_query = Q('match', string=query)
-        else:
-            # Default case-insensitive search using ngram field
-            search_query = Q('match', **{'string.ngram': query})
-        
-        # Start with base search
-        search = BreachedCredentialDocument.search().query(search_query)
-        
-        # Apply field filtering if needed
-        if field == 'username':
-            # Filter for username part (before the colon)
-            search = search.filter('regexp', string='^[^:]+:')
-        elif field == 'password':
-            # Filter for password part (after the colon)
-            search = search.filter('regexp', string=':.+')
-        
-        # Add email filter if requested
-        if email_only:
-            search = search.filter('regexp', string='[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}')
+        # Query for the search type and index layout, parsed-field filters and domain routing
+        search, indices, search_params = build_search(query, search_type, field, email_only, domain, partition_keys)
+        search = counting.limit_total_hits(search)
         
         # Apply sorting
         if sort_order == 'date':
             search = search.sort('-added_at')
-            
-        # Get search parameters from settings
-        from django.conf import settings
-        search_params = getattr(settings, 'ELASTICSEARCH_SEARCH_PARAMS', {})
+        
+        # Numbered pages use from/size; cursors continue deep result sets with PIT + search_after
+        query_id = pagination.fingerprint(search, indices, sort_order)
+        try:
+            state = pagination.decode_cursor(cursor, query_id) if cursor else pagination.page_state(page, per_page)
+        except pagination.CursorError as e:
+            return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
         
         # Track performance
         start_time = time.time()
         
-        try:
+        def run_search():
             # Execute search with timeout and error handling
-            response = search.params(**search_params).execute()
+            response = page_search.params(**page_params).execute()
             
-            # Process results
+            # Process results; file fields come from the cached file map, not the documents
+            files = file_cache.get_many(getattr(hit, 'file_id', None) for hit in response)
             results = []
             for hit in response:
+                file_meta = files.get(getattr(hit, 'file_id', None), {})
                 results.append({
                     'id': hit.meta.id,
                     'string': hit.string,
-                    'file_name': hit.file_name,
-                    'file_size': hit.file_size,
-                    'file_uploaded_at': hit.file_uploaded_at,
+                    'file_name': file_meta.get('file_name'),
+                    'file_size': file_meta.get('file_size'),
+                    'file_uploaded_at': file_meta.get('file_uploaded_at'),
                     'created_at': hit.added_at,
+                    'email': getattr(hit, 'email', None),
+                    'username': getattr(hit, 'username', None),
+                    'domain': getattr(hit, 'domain', None),
+                    'password': getattr(hit, 'password', None),
+                    'url_host': getattr(hit, 'url_host', None),
                     'modified': getattr(hit, 'modified', None)
                 })
+            return {
+                'results': results,
+                'total': response.hits.total.value,
+                # 'gte' once the total passes COUNTING track_total_hits
+                'total_relation': response.hits.total.relation,
+                # Sort values of the last hit; search_after continues from there
+                'last_sort': list(getattr(hit.meta, 'sort', [])) if results else None,
+                'pit_id': response.to_dict().get('pit_id'),
+            }
+        
+        try:
+            es_client = clients.elasticsearch()
+            page_search, page_params, state = pagination.apply(
+                es_client, search, state, per_page, sort_order, indices, search_params,
+            )
+            
+            # Identical searches are served from the result cache and run only once concurrently
+            cache_key = search_cache.make_key(
+                index=page_search._index, body=page_search.to_dict(), params=page_params,
+            )
+            outcome, cached = search_cache.get_or_compute(cache_key, run_search)
+            results = outcome['results']
+            next_state = pagination.next_state(
+                es_client, state, per_page, len(results), outcome['total'], outcome['last_sort'], outcome['pit_id'],
+            )
                 
             elapsed_time = time.time() - start_time
-            logger.info(f"Search completed: {response.hits.total.value} results in {elapsed_time:.3f} seconds")
-            
-            # Paginate results
-            paginator = Paginator(results, per_page)
-            page_obj = paginator.get_page(page)
+            logger.info(f"Search completed: {outcome['total']} results in {elapsed_time:.3f} seconds (cached: {cached})")
 
             return JsonResponse({
-                'results': list(page_obj),
-                'total': response.hits.total.value,
+                'results': results,
+                'total': outcome['total'],
+                'total_relation': outcome.get('total_relation', 'eq'),
+                'next_cursor': pagination.encode_cursor(next_state, query_id) if next_state else None,
                 'page': page,
                 'per_page': per_page,
                 'search_type': search_type,
@@ -357,6 +282,7 @@ def search_credentials(request):
                 'email_only': email_only,
                 'sort_order': sort_order,
                 'elapsed_time': elapsed_time,
+                'cached': cached,
                 'status': 'success'
             })
             
@@ -371,7 +297,7 @@ def search_credentials(request):
             logger.error(f"Elasticsearch search error ({error_type}): {error_message}")
             
             # For timeout errors, try a fallback to database search for simple queries
-            if isinstance(e, elastic_transport.ConnectionTimeout) and search_type in ['exact', 'wildcard', 'match']:
+            if isinstance(e, elastic_transport.ConnectionTimeout) and search_type in ['exact', 'iexact', 'wildcard', 'match']:
                 logger.info(f"Elasticsearch timeout, attempting database fallback for query: {query}")
                 
                 # Attempt database fallback
@@ -383,6 +309,8 @@ def search_credentials(request):
                     
                     if search_type == 'exact':
                         db_queryset = db_queryset.filter(string__exact=query)
+                    elif search_type == 'iexact':
+                        db_queryset = db_queryset.filter(string__iexact=query)
                     elif search_type in ['wildcard', 'match']:
                         db_queryset = db_queryset.filter(string__icontains=query)
                     
@@ -448,3 +376,153 @@ def search_credentials(request):
             'message': 'An unexpected error occurred during search processing',
             'error': str(e)
         }, status=500)
+
+
+@require_http_methods(["GET"])
+def export_credentials(request):
+    """Stream every hit of a search as NDJSON or CSV (optionally gzipped); takes the search API's filters."""
+    query = request.GET.get('q', '')
+    fmt = request.GET.get('format', 'ndjson')
+    compress = request.GET.get('gzip', 'false').lower() == 'true'
+    if not query or fmt not in export.FORMATS:
+        return JsonResponse({
+            'status': 'error',
+            'message': f"'q' is required and 'format' must be one of {', '.join(export.FORMATS)}",
+        }, status=400)
+
+    search, indices, search_params = build_search(
+        query,
+        request.GET.get('search_type', 'case_insensitive'),
+        request.GET.get('field', 'string'),
+        request.GET.get('email_only', 'false').lower() == 'true',
+        request.GET.get('domain') or None,
+        [p for p in request.GET.get('partition', '').split(',') if p],
+    )
+    slices = int(request.GET['slices']) if request.GET.get('slices') else None
+    stats = export.ExportStats()
+
+    def chunks():
+        yield from export.stream(search, indices, search_params, fmt=fmt, compress=compress, slices=slices, stats=stats)
+        logger.info(f"Export of '{query}' finished: {stats.docs} documents at {stats.rate():,.0f} docs/s")
+
+    response = StreamingHttpResponse(
+        chunks(), content_type='application/gzip' if compress else export.CONTENT_TYPES[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{export.filename(fmt, compress)}"'
+    return response
+
+
+# Async searches are posted by API clients, which carry no CSRF token
+@csrf_exempt
+@require_http_methods(["POST"])
+def submit_async_search(request):
+    """
+    Start a background search; returns a job id to poll.
+
+    Takes the search API's parameters as a JSON object or as form fields.
+    """
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Malformed JSON body'}, status=400)
+        if not isinstance(payload, dict):
+            return JsonResponse({'status': 'error', 'message': 'Expected a JSON object'}, status=400)
+    else:
+        payload = request.POST
+    query = str(payload.get('q') or '')
+    if not query:
+        return JsonResponse({'status': 'error', 'message': "'q' is required"}, status=400)
+    try:
+        size = min(int(payload.get('per_page', 100)), pagination.config()['max_per_page'])
+    except (TypeError, ValueError):
+        return JsonResponse({'status': 'error', 'message': "'per_page' must be an integer"}, status=400)
+    search, indices, search_params = build_search(
+        query,
+        payload.get('search_type', 'case_insensitive'),
+        payload.get('field', 'string'),
+        str(payload.get('email_only', 'false')).lower() == 'true',
+        payload.get('domain') or None,
+        [p for p in str(payload.get('partition') or '').split(',') if p],
+    )
+    if payload.get('sort') == 'date':
+        search = search.sort('-added_at')
+    try:
+        job = async_search.submit(search, indices, search_params, size=size)
+    except Exception as e:
+        logger.error(f"Async search submit failed: {e}")
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
+    logger.info(f"Async search {job['job_id']} for '{query}' submitted ({job['status']})")
+    return JsonResponse(job, status=202 if job['status'] == 'running' else 200)
+
+
+# Cancelling is a DELETE from API clients, which carry no CSRF token
+@csrf_exempt
+@require_http_methods(["GET", "DELETE"])
+def async_search_job(request, job_id):
+    """Poll an async search job (`wait` blocks up to that long, e.g. `2s`) or cancel it with DELETE."""
+    try:
+        if request.method == 'DELETE':
+            async_search.cancel(job_id)
+            return JsonResponse({'job_id': job_id, 'status': 'cancelled'})
+        return JsonResponse(async_search.get(job_id, wait=request.GET.get('wait', '0s')))
+    except NotFoundError:
+        return JsonResponse({'job_id': job_id, 'status': 'error', 'message': 'Unknown or expired job'}, status=404)
+    except ApiError as e:
+        logger.error(f"Async search {job_id} poll failed: {e}")
+        return JsonResponse({'job_id': job_id, 'status': 'error', 'message': str(e)}, status=e.meta.status)
+
+
+# Bulk lookups are posted by API clients, which carry no CSRF token
+@csrf_exempt
+@require_http_methods(["POST"])
+def lookup_credentials(request):
+    """
+    Look up a list of emails, usernames or domains and stream the matches as NDJSON.
+
+    Takes a JSON body `{"field": "email", "values": [...]}` or one value per line with
+    `?field=`; optional `hits_per_input` and `partition`. Every input gets a `match`
+    record, every batch a `batch` record with its latency, and the stream ends with a
+    `summary` record.
+    """
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'status': 'error', 'message': 'Malformed JSON body'}, status=400)
+        if not isinstance(payload, dict):
+            return JsonResponse({'status': 'error', 'message': 'Expected a JSON object'}, status=400)
+        values = payload.get('values') or []
+        if not isinstance(values, list):
+            return JsonResponse({'status': 'error', 'message': 'values must be a list of strings'}, status=400)
+    else:
+        payload = request.GET
+        values = request.body.decode('utf-8', errors='replace').splitlines()
+    field = payload.get('field', 'email')
+    hits_per_input = payload.get('hits_per_input')
+    partition_keys = payload.get('partition') or []
+    if isinstance(partition_keys, str):
+        partition_keys = [p for p in partition_keys.split(',') if p]
+    if not isinstance(partition_keys, list) or not all(isinstance(p, str) for p in partition_keys):
+        return JsonResponse({'status': 'error', 'message': 'partition must be a string or a list of strings'}, status=400)
+    # Validate everything before streaming: errors after the first record cannot change the status
+    try:
+        values = bulk_lookup.normalize(values, field)
+        hits_per_input = bulk_lookup.parse_hits_per_input(hits_per_input)
+    except bulk_lookup.BulkLookupError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    if not values:
+        return JsonResponse({'status': 'error', 'message': 'No values to look up'}, status=400)
+    stats = bulk_lookup.LookupStats()
+
+    def records():
+        for record in bulk_lookup.lookup(
+            values, field, partition_keys, hits_per_input=hits_per_input, stats=stats,
+        ):
+            yield json.dumps(record, default=str) + '\n'
+        summary = stats.summary()
+        logger.info(f"Bulk {field} lookup finished: {summary['matched_inputs']}/{summary['inputs']} inputs matched "
+                    f"in {summary['elapsed_time']:.3f} seconds")
+        yield json.dumps(summary) + '\n'
+
+    return StreamingHttpResponse(records(), content_type='application/x-ndjson')
@@ -0,0 +1,202 @@
+"""
+Watchlist matching at ingest time with the Elasticsearch percolator.
+
+Every active Watch is stored as a query in a percolator index. While a file is being
+indexed, the ingest writer percolates each chunk of new credentials against those
+queries and records hits as WatchMatch rows; once the file is done, unnotified matches
+are handed to the configured notifier. Alerting therefore costs one percolate search per
+chunk of new data instead of re-running every watch over the whole corpus.
+
+The notifier is a dotted path to a callable taking a list of match dicts. The default
+logs them; `webhook_notifier` POSTs them as JSON to `webhook_url`, which can point at
+any local stand-in while testing.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from webui import clients
+from webui.models import Watch, WatchMatch
+from webui.parsing import parse_credential
+import json
+import logging
+import urllib3
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'enabled': True,
+    'index': 'credential_watchlist',
+    'percolate_batch': 500,
+    'max_watches': 10000,
+    'notifier': 'webui.watchlist.log_notifier',
+    'webhook_url': '',
+    'notify_batch': 1000,
+}
+
+# Fields of percolated documents; mirrors the credential document's parsed fields
+PERCOLATOR_MAPPING = {
+    'properties': {
+        'query': {'type': 'percolator'},
+        'watch_id': {'type': 'integer'},
+        'string': {
+            'type': 'text',
+            'fields': {'lower': {'type': 'keyword', 'normalizer': 'lowercase_normalizer', 'ignore_above': 1024}},
+        },
+        'email': {'type': 'keyword', 'normalizer': 'lowercase_normalizer'},
+        'username': {'type': 'keyword', 'normalizer': 'lowercase_normalizer'},
+        'domain': {'type': 'keyword', 'normalizer': 'lowercase_normalizer'},
+        'url_host': {'type': 'keyword', 'normalizer': 'lowercase_normalizer'},
+    }
+}
+PERCOLATOR_SETTINGS = {
+    'number_of_shards': 1,
+    'number_of_replicas': 0,
+    'analysis': {
+        'normalizer': {'lowercase_normalizer': {'type': 'custom', 'filter': ['lowercase']}},
+    },
+}
+
+
+def config() -> dict:
+    return {**DEFAULTS, **getattr(settings, 'WATCHLIST', {})}
+
+
+def ensure_index(es_client) -> str:
+    index = config()['index']
+    if not es_client.indices.exists(index=index):
+        es_client.indices.create(index=index, settings=PERCOLATOR_SETTINGS, mappings=PERCOLATOR_MAPPING)
+        logger.info(f"Created percolator index {index}")
+    return index
+
+
+def watch_query(watch) -> dict:
+    """Percolator query of a watch."""
+    value = watch.value.strip().lower()
+    if watch.kind == 'keyword':
+        pattern = value if '*' in value or '?' in value else f'*{value}*'
+        return {'wildcard': {'string.lower': {'value': pattern}}}
+    return {'term': {watch.kind: value}}
+
+
+def sync_watch(watch, deleted: bool = False) -> None:
+    """Register an active watch in the percolator index, or remove an inactive or deleted one."""
+    es_client = clients.elasticsearch()
+    index = ensure_index(es_client)
+    if deleted or not watch.is_active:
+        es_client.delete(index=index, id=watch.pk, ignore_status=404, refresh=True)
+        return
+    es_client.index(index=index, id=watch.pk, document={'query': watch_query(watch), 'watch_id': watch.pk}, refresh=True)
+
+
+def sync_all(es_client) -> int:
+    """Rebuild the percolator index from the active watches; returns their number."""
+    index = config()['index']
+    es_client.indices.delete(index=index, ignore_unavailable=True)
+    ensure_index(es_client)
+    operations = []
+    for watch in Watch.objects.filter(is_active=True).iterator():
+        operations.append({'index': {'_index': index, '_id': watch.pk}})
+        operations.append({'query': watch_query(watch), 'watch_id': watch.pk})
+    if operations:
+        es_client.bulk(operations=operations, refresh=True)
+    return len(operations) // 2
+
+
+def has_watches() -> bool:
+    return config()['enabled'] and Watch.objects.filter(is_active=True).exists()
+
+
+def percolate(es_client, lines: list[str]) -> dict[int, list[int]]:
+    """Map watch id to the positions of the `lines` it matches."""
+    cfg = config()
+    matches: dict[int, list[int]] = {}
+    for start in range(0, len(lines), cfg['percolate_batch']):
+        documents = []
+        for line in lines[start:start + cfg['percolate_batch']]:
+            documents.append({'string': line, **parse_credential(line)})
+        response = es_client.search(
+            index=cfg['index'],
+            query={'percolate': {'field': 'query', 'documents': documents}},
+            size=cfg['max_watches'],
+            source=['watch_id'],
+        )
+        for hit in response['hits']['hits']:
+            slots = hit.get('fields', {}).get('_percolator_document_slot', [0])
+            matches.setdefault(hit['_source']['watch_id'], []).extend(start + slot for slot in slots)
+    return matches
+
+
+def record_matches(es_client, rows) -> int:
+    """
+    Percolate newly indexed `(id, string, batch)` rows and store their watch matches.
+
+    Returns the number of matches recorded (duplicates of earlier matches are ignored).
+    """
+    if not rows or not has_watches():
+        return 0
+    matches = percolate(es_client, [string for _, string, _ in rows])
+    records = [
+        WatchMatch(watch_id=watch_id, credential_id=rows[slot][0], string=rows[slot][1], file_id=rows[slot][2].file_id)
+        for watch_id, slots in matches.items()
+        for slot in slots
+    ]
+    if records:
+        WatchMatch.objects.bulk_create(records, batch_size=1000, ignore_conflicts=True)
+        logger.info(f"Recorded {len(records)} watchlist matches for {len(matches)} watches")
+    return len(records)
+
+
+def match_payload(match) -> dict:
+    return {
+        'watch': match.watch.name,
+        'kind': match.watch.kind,
+        'value': match.watch.value,
+        'credential_id': match.credential_id,
+        'string': match.string,
+        'file_id': match.file_id,
+        'matched_at': match.matched_at.isoformat() if match.matched_at else None,
+    }
+
+
+def notify_pending() -> int:
+    """
+    Send unnotified matches to the notifier and mark them notified; returns how many were sent.
+
+    Each batch is claimed with `SELECT ... FOR UPDATE SKIP LOCKED` and marked in the same
+    transaction, so concurrent workers never send the same match twice. If the notifier
+    fails, the transaction rolls back and the batch stays pending.
+    """
+    cfg = config()
+    notifier = import_string(cfg['notifier'])
+    sent = 0
+    while True:
+        with transaction.atomic():
+            pending = list(
+                WatchMatch.objects.filter(notified_at__isnull=True)
+                .select_related('watch')
+                .select_for_update(skip_locked=True, of=('self',))
+                .order_by('id')[:cfg['notify_batch']]
+            )
+            if not pending:
+                return sent
+            notifier([match_payload(match) for match in pending])
+            WatchMatch.objects.filter(id__in=[match.id for match in pending]).update(notified_at=timezone.now())
+        sent += len(pending)
+
+
+def log_notifier(matches: list[dict]) -> None:
+    for match in matches:
+        logger.warning(f"Watchlist match for {match['watch']} ({match['kind']} {match['value']}): {match['string']}")
+
+
+def webhook_notifier(matches: list[dict]) -> None:
+    """POST matches as JSON to the configured webhook_url; raises on non-2xx responses."""
+    url = config()['webhook_url']
+    if not url:
+        raise ValueError("WATCHLIST webhook_url is not set")
+    response = urllib3.PoolManager(timeout=urllib3.Timeout(total=30)).request(
+        'POST', url, body=json.dumps({'matches': matches}).encode(), headers={'Content-Type': 'application/json'},
+    )
+    if response.status >= 300:
+        raise RuntimeError(f"Webhook {url} answered {response.status}")